@@ -0,0 +1,3 @@
+# Async (ASGI) versions of the check, tts and session routes, served by app.asgi.
+# They share helpers and services with app.routes; blocking work (Whisper,
+# pyttsx3, Rhubarb, embeddings, the attempt writer) is offloaded to threads.
@@ -0,0 +1,61 @@
+import asyncio
+from functools import wraps
+from quart import request, jsonify
+from .mongo import get_async_db
+from ..utils.jwt_auth import _verify_token_cached, _load_user, _get_redis, _user_cache, _USER_PROJECTION
+from ..utils import metrics
+
+
+async def _load_user_async(user_id):
+    """_load_user() without blocking the event loop."""
+    if not user_id:
+        return None
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    # The shared cache tier is a blocking client; keep its read-through logic in one place
+    if _get_redis() is not None:
+        return await asyncio.to_thread(_load_user, user_id)
+    user = await get_async_db().users.find_one({'user_id': user_id}, _USER_PROJECTION)
+    if user is not None:
+        _user_cache.set(user_id, user)
+    return user
+
+
+async def get_current_user():
+    """Extract current user from JWT token in Authorization header"""
+    auth_header = request.headers.get('Authorization', '')
+    parts = auth_header.split(' ')
+    token = parts[1] if len(parts) == 2 and parts[0].lower() == 'bearer' else None
+
+    if not token:
+        return None
+
+    with metrics.span("auth"):
+        payload = _verify_token_cached(token)
+        if not payload:
+            return None
+        return await _load_user_async(payload.get('user_id'))
+
+
+def require_auth(f):
+    """Decorator to require authentication for an async route"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        user = await get_current_user()
+        if not user:
+            return jsonify({'error': 'unauthorized'}), 401
+        kwargs['current_user'] = user
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+
+def optional_auth(f):
+    """Decorator that optionally extracts user if authenticated"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        kwargs['current_user'] = await get_current_user()
+        return await f(*args, **kwargs)
+
+    return decorated_function
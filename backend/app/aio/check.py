@@ -0,0 +1,114 @@
+import asyncio
+import os
+from quart import Blueprint, request, jsonify
+from .auth import require_auth
+from .mongo import get_async_db
+from ..routes.check import (_short_circuit, _scoring_mode, _finish, _wants_inline_tts,
+                            _empty_tts, _payload)
+from ..services.admission import AdmissionRejected, admit_async, check_rate, client
+from ..services.stt import transcribe_audio, SttBusy
+from ..services.grammar import heuristic_grammar
+from ..services.grammar_providers import score_grammar_async
+from ..services.semantic import semantic_score, overlap_score
+from ..services.scoring import run_stages_async, stage_deadline
+from ..services.tts import synthesize_tts, TtsBusy
+from ..utils import metrics
+
+check_bp = Blueprint('check_async', __name__)
+
+
+async def _score_concurrently(question: str, transcript: str, with_semantic: bool) -> dict:
+    """Async counterpart of routes.check._score_concurrently."""
+    stages = {
+        'grammar': (
+            lambda: score_grammar_async(transcript),
+            lambda: heuristic_grammar(transcript),
+            stage_deadline('grammar', 15),
+        ),
+    }
+    if with_semantic:
+        # Embedding calls go through the blocking client and its cache
+        stages['semantic'] = (
+            lambda: asyncio.to_thread(semantic_score, question, transcript),
+            lambda: overlap_score(question, transcript),
+            stage_deadline('semantic', 5),
+        )
+    return await run_stages_async(stages)
+
+
+def _too_many(e: AdmissionRejected):
+    resp = jsonify({'error': str(e)})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 429
+
+
+async def _inline_tts(speak_text: str, key: str, weight: float) -> dict:
+    try:
+        async with admit_async('tts', key, weight):
+            return await asyncio.to_thread(synthesize_tts, speak_text)
+    except (TtsBusy, AdmissionRejected):
+        return _empty_tts(speak_text)
+
+
+@check_bp.post('/check')
+@require_auth
+async def check_answer(current_user):
+    # Expected multipart/form-data with fields: session_id, question, audio(optional), transcript(optional)
+    form = await request.form
+    files = await request.files
+    session_id = form.get('session_id')
+    question = form.get('question')
+    provided_transcript = form.get('transcript')
+    audio = files.get('audio')
+    if not session_id or not question:
+        return jsonify({'error': 'session_id and question required'}), 400
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('check', key)
+    except AdmissionRejected as e:
+        return _too_many(e)
+
+    # Verify session belongs to current user
+    with metrics.span('session_lookup'):
+        session = await get_async_db().sessions.find_one({'session_id': session_id}, {'user_id': 1})
+    if not session:
+        return jsonify({'error': 'session not found'}), 404
+    if session.get('user_id') != current_user['user_id']:
+        return jsonify({'error': 'unauthorized'}), 403
+
+    # STT: decoding and Whisper inference stay on the replica pool, off the event loop
+    transcript = provided_transcript
+    if not transcript and audio:
+        try:
+            async with admit_async('stt', key, weight):
+                transcript = await asyncio.to_thread(transcribe_audio, audio)
+        except SttBusy as e:
+            return jsonify({'error': str(e)}), 503
+        except AdmissionRejected as e:
+            return _too_many(e)
+
+    if not transcript:
+        return jsonify({'error': 'no transcript provided or derived'}), 400
+
+    # Both store the attempt in MongoDB, which blocks; keep them off the event loop
+    early = await asyncio.to_thread(_short_circuit, session_id, question, transcript)
+    if early is not None:
+        return jsonify(early)
+
+    # If FORCE_GEMINI is enabled but GOOGLE_API_KEY is missing, fail fast
+    if os.getenv('FORCE_GEMINI', '0') == '1' and not os.getenv('GOOGLE_API_KEY'):
+        return jsonify({'error': 'FORCE_GEMINI=1 but GOOGLE_API_KEY is not configured'}), 500
+
+    remote, fast = _scoring_mode()
+    try:
+        async with admit_async('grammar', key, weight):
+            results = await _score_concurrently(question, transcript, with_semantic=not fast)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    # Pronunciation alignment is CPU-bound and save_attempt blocks on MongoDB
+    attempt, feedback_text = await asyncio.to_thread(_finish, session_id, question, transcript, results, fast)
+    if _wants_inline_tts(remote):
+        tts = await _inline_tts(feedback_text, key, weight)
+    else:
+        tts = _empty_tts(feedback_text)
+    return jsonify(_payload(attempt, feedback_text, tts))
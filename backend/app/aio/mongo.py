@@ -0,0 +1,19 @@
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+
+def get_async_client():
+    global _client
+    if _client is None:
+        uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+        _client = AsyncIOMotorClient(uri)
+    return _client
+
+
+def get_async_db():
+    name = os.getenv('MONGODB_DB', 'avatar_assistant')
+    return get_async_client()[name]
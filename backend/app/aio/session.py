@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime
+from bson import ObjectId
+from quart import Blueprint, request, jsonify, make_response
+from .auth import require_auth
+from .mongo import get_async_db
+from ..db.mongo import get_db
+from ..routes.session import SESSION_VIEWS, ATTEMPT_VIEWS, _page_args, _encode_cursor, _decode_cursor
+from ..services.gemini_client import generate_feedback_async
+from ..services.session_stats import initial_aggregates, final_report
+from ..services import attempt_writer
+
+session_bp = Blueprint('session_async', __name__)
+
+
+@session_bp.post('/start')
+@require_auth
+async def start_session(current_user):
+    """Start a new interview session for authenticated user"""
+    body = await request.get_json(silent=True) or {}
+    session_id = f"sess_{uuid.uuid4().hex[:8]}"
+    await get_async_db().sessions.insert_one({
+        'session_id': session_id,
+        'user_id': current_user['user_id'],
+        'email': current_user.get('email'),
+        'avatar_url': body.get('avatar_url'),
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'status': 'active',
+        'agg': initial_aggregates()
+    })
+    return jsonify({'session_id': session_id, 'message': 'session started'})
+
+
+@session_bp.post('/end')
+@require_auth
+async def end_session(current_user):
+    """End an interview session and calculate final scores"""
+    body = await request.get_json(silent=True) or {}
+    session_id = body.get('session_id')
+    if not session_id:
+        return jsonify({'error': 'session_id required'}), 400
+
+    db = get_async_db()
+    # The attempt writer flushes on its own thread; wait for it without blocking the loop
+    await asyncio.to_thread(attempt_writer.flush, session_id)
+
+    session = await db.sessions.find_one({'session_id': session_id})
+    if not session:
+        return jsonify({'error': 'session not found'}), 404
+    if session.get('user_id') != current_user['user_id']:
+        return jsonify({'error': 'unauthorized'}), 403
+
+    # The aggregation fallback in session_summary is shared with the sync routes
+    scores, all_mistakes, total_attempts = await asyncio.to_thread(final_report, get_db(), session)
+    feedback = await generate_feedback_async(scores, all_mistakes)
+
+    await db.sessions.update_one({'session_id': session_id}, {
+        '$set': {
+            'status': 'completed',
+            'ended_at': datetime.utcnow().isoformat() + 'Z',
+            'final_scores': scores,
+            'feedback': feedback,
+            'total_attempts': total_attempts
+        }
+    })
+    return jsonify({'message': 'session ended', 'scores': scores, 'feedback': feedback})
+
+
+@session_bp.get('/history')
+@require_auth
+async def get_session_history(current_user):
+    """Async counterpart of routes.session.get_session_history."""
+    limit, view, cursor = _page_args(request.args, 20, 100, 'summary')
+    if view not in SESSION_VIEWS:
+        return jsonify({'error': 'view must be summary or full'}), 400
+
+    query = {'user_id': current_user['user_id']}
+    if cursor:
+        parts = _decode_cursor(cursor)
+        if not parts:
+            return jsonify({'error': 'invalid cursor'}), 400
+        started_at, last_id = parts
+        query['$or'] = [
+            {'started_at': {'$lt': started_at}},
+            {'started_at': started_at, 'session_id': {'$lt': last_id}},
+        ]
+
+    sessions = await (get_async_db().sessions.find(query, SESSION_VIEWS[view])
+                      .sort([('started_at', -1), ('session_id', -1)])
+                      .limit(limit + 1)
+                      .to_list(length=limit + 1))
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        next_cursor = _encode_cursor(last.get('started_at'), last.get('session_id'))
+
+    return jsonify({'sessions': sessions, 'next_cursor': next_cursor})
+
+
+@session_bp.get('/<session_id>')
+@require_auth
+async def get_session_details(current_user, session_id):
+    """Async counterpart of routes.session.get_session_details."""
+    limit, view, cursor = _page_args(request.args, 100, 500, 'full')
+    if view not in ATTEMPT_VIEWS:
+        return jsonify({'error': 'view must be summary or full'}), 400
+
+    db = get_async_db()
+    session = await db.sessions.find_one({'session_id': session_id}, SESSION_VIEWS['full'])
+    if not session:
+        return jsonify({'error': 'session not found'}), 404
+    if session.get('user_id') != current_user['user_id']:
+        return jsonify({'error': 'unauthorized'}), 403
+
+    etag = None
+    if session.get('status') == 'completed':
+        raw = '|'.join([session_id, str(session.get('ended_at')), str(session.get('rescored_at')),
+                        view, cursor or '', str(limit)])
+        etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        if request.if_none_match.contains(etag):
+            resp = await make_response('', 304)
+            resp.set_etag(etag)
+            return resp
+
+    await asyncio.to_thread(attempt_writer.flush, session_id)
+    query = {'session_id': session_id}
+    if cursor:
+        parts = _decode_cursor(cursor)
+        if not parts or not ObjectId.is_valid(parts[1]):
+            return jsonify({'error': 'invalid cursor'}), 400
+        ts, last_id = parts[0], ObjectId(parts[1])
+        query['$or'] = [
+            {'timestamp': {'$gt': ts}},
+            {'timestamp': ts, '_id': {'$gt': last_id}},
+        ]
+
+    projection = ATTEMPT_VIEWS[view] or None
+    attempts = await (db.attempts.find(query, projection)
+                      .sort([('timestamp', 1), ('_id', 1)])
+                      .limit(limit + 1)
+                      .to_list(length=limit + 1))
+    next_cursor = None
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        last = attempts[-1]
+        next_cursor = _encode_cursor(last.get('timestamp'), str(last['_id']))
+    for a in attempts:
+        a.pop('_id', None)
+
+    resp = jsonify({'session': session, 'attempts': attempts, 'next_cursor': next_cursor})
+    if etag:
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return resp
@@ -0,0 +1,84 @@
+import asyncio
+from quart import Blueprint, request, jsonify, Response
+from .auth import optional_auth
+from ..services.tts import synthesize_tts, synthesize, encode_audio, TtsBusy, AUDIO_FORMATS
+from ..services.admission import AdmissionRejected, admit_async, check_rate, client
+
+# Only the synthesizing endpoints live here; cached audio and viseme polling are
+# cheap lookups and stay on the WSGI app.
+tts_bp = Blueprint('tts_async', __name__)
+
+
+def _busy(e: TtsBusy):
+    resp = jsonify({"error": str(e)})
+    resp.headers['Retry-After'] = '1'
+    return resp, 503
+
+
+def _too_many(e: AdmissionRejected):
+    resp = jsonify({"error": str(e)})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 429
+
+
+@tts_bp.post('/tts')
+@optional_auth
+async def tts_endpoint(current_user):
+    data = await request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not text or not isinstance(text, str):
+        return jsonify({"error": "text is required"}), 400
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('tts', key)
+        # pyttsx3 and Rhubarb run on their own workers; wait for them off the event loop
+        async with admit_async('tts', key, weight):
+            result = await asyncio.to_thread(synthesize_tts, text, bool(data.get('async_visemes')))
+        return jsonify(result)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    except TtsBusy as e:
+        return _busy(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@tts_bp.post('/tts/audio')
+@optional_auth
+async def tts_audio_stream(current_user):
+    """Async counterpart of routes.tts.tts_audio_stream."""
+    data = await request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not text or not isinstance(text, str):
+        return jsonify({"error": "text is required"}), 400
+    fmt = (data.get('format') or request.args.get('format') or 'wav').lower()
+    if fmt not in AUDIO_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(AUDIO_FORMATS)}"}), 400
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('tts', key)
+        async with admit_async('tts', key, weight):
+            result = await asyncio.to_thread(synthesize, text, True)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    except TtsBusy as e:
+        return _busy(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    audio, mime = await asyncio.to_thread(encode_audio, result['key'], result['audio'], fmt)
+    chunk = 32 * 1024
+
+    async def generate():
+        for i in range(0, len(audio), chunk):
+            yield audio[i:i + chunk]
+
+    resp = Response(generate(), mimetype=mime)
+    resp.headers['Content-Length'] = str(len(audio))
+    # The silent fallback is not cached, so there is nothing to point at
+    if result.get('addressable'):
+        resp.headers['X-Audio-Url'] = f"/api/tts/audio/{result['key']}?format={fmt}"
+    if result.get('viseme_job') or result.get('addressable'):
+        resp.headers['X-Visemes-Url'] = f"/api/tts/visemes/{result.get('viseme_job') or result['key']}"
+    resp.headers['Access-Control-Expose-Headers'] = 'X-Audio-Url, X-Visemes-Url'
+    return resp
@@ -0,0 +1,80 @@
+# ASGI entry point: `uvicorn app.asgi:application` (or `python -m app.serve` with
+# SERVER_MODE=asgi). The check, tts and session routes are served natively by a
+# Quart app; every other route is passed through to the Flask app over a2wsgi.
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, g, request
+from quart_cors import cors
+from a2wsgi import WSGIMiddleware
+from werkzeug.exceptions import HTTPException
+from dotenv import load_dotenv
+from .main import app as wsgi_app
+from .aio.check import check_bp
+from .aio.session import session_bp
+from .aio.tts import tts_bp
+from .utils import metrics
+
+
+def create_async_app() -> Quart:
+    load_dotenv()
+    app = Quart(__name__, static_folder=None)
+    app = cors(app, allow_origin='*')
+    # Same prefixes as the Flask blueprints they replace
+    app.register_blueprint(session_bp, url_prefix='/api/session')
+    app.register_blueprint(check_bp, url_prefix='/api')
+    app.register_blueprint(tts_bp, url_prefix='/api')
+
+    server_timing = os.getenv('METRICS_SERVER_TIMING', '0') == '1'
+
+    @app.before_serving
+    async def size_offload_pool():
+        # asyncio.to_thread() runs on the loop's default executor
+        threads = int(os.getenv('ASYNC_OFFLOAD_THREADS', '32'))
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix='aio-offload'))
+
+    @app.before_request
+    async def start_trace():
+        g.metrics_token = metrics.begin_request()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def finish_trace(response):
+        token = getattr(g, 'metrics_token', None)
+        if token is None:
+            return response
+        g.metrics_token = None
+        timings = metrics.end_request(token)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_seconds', time.perf_counter() - g.request_started,
+                        route=route, method=request.method, status=response.status_code)
+        if server_timing and timings:
+            response.headers['Server-Timing'] = metrics.server_timing(timings)
+            response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+    return app
+
+
+async_app = create_async_app()
+_fallback = WSGIMiddleware(wsgi_app, workers=int(os.getenv('ASYNC_WSGI_THREADS', '16')))
+_routes = async_app.url_map.bind('localhost')
+
+
+def _is_async_route(scope) -> bool:
+    try:
+        _routes.match(scope['path'], method=scope['method'])
+        return True
+    except HTTPException:
+        return False
+
+
+async def application(scope, receive, send):
+    """Route lifespan and native routes to Quart, everything else to the Flask app."""
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and _is_async_route(scope)):
+        await async_app(scope, receive, send)
+    else:
+        await _fallback(scope, receive, send)
@@ -0,0 +1,158 @@
+# Index declarations for every collection the routes query, plus a diagnostic
+# that explains each query shape and flags collection scans:
+#
+#   python -m app.db.indexes            # ensure indexes, then explain all query shapes
+#   python -m app.db.indexes --explain  # explain only
+#
+# Unique indexes cannot be built over existing duplicates; missing ones are listed
+# with the aggregation that finds the documents to dedupe.
+
+import sys
+import logging
+import threading
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, DuplicateKeyError, OperationFailure
+
+from .mongo import get_db
+
+# collection -> [(keys, options)]
+INDEXES = {
+    'users': [
+        ([('user_id', ASCENDING)], {'name': 'user_id_unique', 'unique': True}),
+        ([('email', ASCENDING)], {'name': 'email_unique', 'unique': True}),
+    ],
+    'sessions': [
+        ([('session_id', ASCENDING)], {'name': 'session_id_unique', 'unique': True}),
+        ([('user_id', ASCENDING), ('started_at', DESCENDING), ('session_id', DESCENDING)],
+         {'name': 'user_started_at_session'}),
+    ],
+    'attempts': [
+        ([('session_id', ASCENDING), ('timestamp', ASCENDING), ('_id', ASCENDING)],
+         {'name': 'session_timestamp_id'}),
+        # Re-scoring jobs walk attempts by date range
+        ([('timestamp', ASCENDING), ('_id', ASCENDING)], {'name': 'timestamp_id'}),
+    ],
+    'grammar_cache': [
+        # Mongo removes entries once expires_at has passed
+        ([('expires_at', ASCENDING)], {'name': 'expires_at_ttl', 'expireAfterSeconds': 0}),
+    ],
+    'onboarding': [
+        ([('user_id', ASCENDING)], {'name': 'user_id_unique', 'unique': True}),
+    ],
+}
+
+# Every query shape issued by the routes: (label, collection, filter, sort)
+QUERY_SHAPES = [
+    ('jwt_auth.get_current_user', 'users', {'user_id': 'user_x'}, None),
+    ('auth.signup/login', 'users', {'email': 'x@example.com'}, None),
+    ('check/session lookup', 'sessions', {'session_id': 'sess_x'}, None),
+    ('session.history', 'sessions', {'user_id': 'user_x'}, [('started_at', DESCENDING), ('session_id', DESCENDING)]),
+    ('session.end attempts', 'attempts', {'session_id': 'sess_x'}, None),
+    ('session.details attempts', 'attempts', {'session_id': 'sess_x'}, [('timestamp', ASCENDING), ('_id', ASCENDING)]),
+    ('rescoring date range', 'attempts', {'timestamp': {'$gte': '2024-01-01'}}, [('timestamp', ASCENDING), ('_id', ASCENDING)]),
+    ('onboarding', 'onboarding', {'user_id': 'user_x'}, None),
+]
+
+
+def _dedupe_hint(coll: str, keys) -> str:
+    fields = ', '.join(k for k, _ in keys)
+    group = '{' + ', '.join(f"'{k}': '${k}'" for k, _ in keys) + '}'
+    return (f"remove duplicate {coll}.{fields} values first; find them with "
+            f"db.{coll}.aggregate([{{$group: {{_id: {group}, n: {{$sum: 1}}}}}}, {{$match: {{n: {{$gt: 1}}}}}}])")
+
+
+def _is_duplicate_key(e: PyMongoError) -> bool:
+    return isinstance(e, DuplicateKeyError) or (isinstance(e, OperationFailure) and e.code == 11000)
+
+
+def ensure_indexes(db=None):
+    """
+    Create any missing indexes. Existing indexes with the same spec are left alone.
+    Returns [(collection, index name, error)] for the indexes that could not be built.
+    """
+    db = db if db is not None else get_db()
+    failed = []
+    for coll, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                db[coll].create_index(keys, **options)
+            except PyMongoError as e:
+                failed.append((coll, options.get('name'), e))
+                if options.get('unique') and _is_duplicate_key(e):
+                    # The collection already holds duplicates: uniqueness is NOT enforced
+                    logging.error(f"[MONGO] Unique index {coll}.{options.get('name')} not created, "
+                                  f"{_dedupe_hint(coll, keys)}: {e}")
+                else:
+                    print(f"[MONGO] Could not create index {coll}.{options.get('name')}: {e}")
+    return failed
+
+
+def missing_indexes(db=None):
+    """Declared indexes that do not exist on the server: [(collection, keys, options)]."""
+    db = db if db is not None else get_db()
+    missing = []
+    for coll, specs in INDEXES.items():
+        existing = {tuple(tuple(k) for k in info['key']) for info in db[coll].index_information().values()}
+        for keys, options in specs:
+            if tuple(keys) not in existing:
+                missing.append((coll, keys, options))
+    return missing
+
+
+def ensure_indexes_in_background():
+    """Run ensure_indexes() off the startup path so an unreachable Mongo does not block boot."""
+    t = threading.Thread(target=ensure_indexes, name="mongo-indexes", daemon=True)
+    t.start()
+    return t
+
+
+def _plan_stages(plan):
+    stages = [plan.get('stage')]
+    for child in ('inputStage', 'outerStage', 'innerStage'):
+        if child in plan:
+            stages += _plan_stages(plan[child])
+    for child in plan.get('inputStages', []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def explain_query_shapes(db=None):
+    """Explain each query shape; returns [(label, stages, problems)]."""
+    db = db if db is not None else get_db()
+    report = []
+    for label, coll, flt, sort in QUERY_SHAPES:
+        cursor = db[coll].find(flt)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        # Newer servers wrap the classic plan in queryPlan
+        plan = plan.get('queryPlan', plan)
+        stages = [s for s in _plan_stages(plan) if s]
+        problems = []
+        if 'COLLSCAN' in stages:
+            problems.append('collection scan')
+        if 'SORT' in stages:
+            problems.append('in-memory sort')
+        report.append((label, stages, problems))
+    return report
+
+
+def main(argv):
+    if '--explain' not in argv:
+        ensure_indexes()
+    bad = 0
+    for coll, keys, options in missing_indexes():
+        hint = f"; {_dedupe_hint(coll, keys)}" if options.get('unique') else ''
+        print(f"MISSING {coll}.{options.get('name')}{hint}")
+        bad += 1
+    for label, stages, problems in explain_query_shapes():
+        status = 'WARN ' + ', '.join(problems) if problems else 'ok'
+        print(f"{label:<28} {' <- '.join(stages):<40} {status}")
+        bad += bool(problems)
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main(sys.argv[1:]))
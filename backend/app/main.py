@@ -1,14 +1,24 @@
 import os
-from flask import Flask, jsonify
+import time
+from flask import Flask, jsonify, g, Response
 from flask_cors import CORS
 from .routes.session import session_bp
 from .routes.auth import auth_bp
 from .routes.check import check_bp
 from .routes.onboarding import onboarding_bp
 from .routes.tts import tts_bp
-import asyncio
-from aiortc import RTCPeerConnection, RTCSessionDescription
-from aiortc.contrib.media import MediaBlackhole
+from .db.indexes import ensure_indexes_in_background
+from .services.stt import warm_up as warm_up_stt, pool_stats as stt_pool_stats
+from .services.rtc import handle_offer, peer_stats, TooManyPeers
+from .services.tts_cache import get_cache as get_tts_cache
+from .services.attempt_writer import writer_stats
+from .services.grammar_providers import provider_stats as grammar_provider_stats
+from .services.grammar import cache_stats as grammar_cache_stats
+from .services.embeddings import cache_stats as embedding_cache_stats
+from .services.admission import admission_stats
+from .utils.singleflight import all_stats as singleflight_stats
+from .utils import metrics
+from .services.tts import warm_up as warm_up_tts, worker_stats as tts_worker_stats, precompute as precompute_tts
 from flask import request
 from dotenv import load_dotenv
 
@@ -25,11 +35,62 @@ def create_app() -> Flask:
     app.register_blueprint(onboarding_bp, url_prefix='/api/onboarding')
     app.register_blueprint(tts_bp, url_prefix='/api')
 
+    if os.getenv('MONGO_ENSURE_INDEXES', '1') == '1':
+        ensure_indexes_in_background()
+
+    # Load Whisper replicas at startup instead of on the first /api/check
+    if os.getenv('WHISPER_PRELOAD', '1') == '1':
+        warm_up_stt()
+    if os.getenv('TTS_PRELOAD', '1') == '1':
+        warm_up_tts()
+    # Optional file with one phrase per line (questions, stock feedback) to pre-synthesize
+    precompute_file = os.getenv('TTS_PRECOMPUTE_FILE')
+    if precompute_file and os.path.isfile(precompute_file):
+        with open(precompute_file, encoding='utf-8') as f:
+            precompute_tts([ln.strip() for ln in f if ln.strip()])
+
+    def component_stats():
+        return {
+            "stt": stt_pool_stats(),
+            "webrtc": peer_stats(),
+            "attempt_writer": writer_stats(),
+            "tts": tts_worker_stats(),
+            "tts_cache": get_tts_cache().stats(),
+            "grammar_cache": grammar_cache_stats(),
+            "embedding_cache": embedding_cache_stats(),
+            "singleflight": singleflight_stats(),
+            "grammar_providers": grammar_provider_stats(),
+            "admission": admission_stats(),
+        }
+
+    server_timing = os.getenv('METRICS_SERVER_TIMING', '0') == '1'
+
+    @app.before_request
+    def start_trace():
+        g.metrics_token = metrics.begin_request()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_trace(response):
+        token = g.pop('metrics_token', None)
+        if token is None:
+            return response
+        timings = metrics.end_request(token)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_seconds', time.perf_counter() - g.request_started,
+                        route=route, method=request.method, status=response.status_code)
+        if server_timing and timings:
+            response.headers['Server-Timing'] = metrics.server_timing(timings)
+            response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
     @app.get('/health')
     def health():
-        return jsonify({"status": "ok"})
+        return jsonify(dict({"status": "ok"}, **component_stats()))
 
-    pcs = set()
+    @app.get('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(component_stats()), mimetype='text/plain; version=0.0.4')
 
     @app.post('/webrtc/offer')
     def webrtc_offer():
@@ -43,36 +104,10 @@ def create_app() -> Flask:
         if not sdp or not type_:
             return jsonify({"error": "missing sdp/type"}), 400
 
-        offer = RTCSessionDescription(sdp=sdp, type=type_)
-        pc = RTCPeerConnection()
-        pcs.add(pc)
-        media_blackhole = MediaBlackhole()
-
-        @pc.on("track")
-        async def on_track(track):
-            # Consume incoming audio tracks to keep pipeline alive
-            await media_blackhole.start()
-            media_blackhole.addTrack(track)
-
-        @pc.on("datachannel")
-        def on_datachannel(channel):
-            # Echo messages for connectivity test
-            @channel.on("message")
-            def on_message(message):
-                try:
-                    channel.send(message)
-                except Exception:
-                    pass
-
-        async def process():
-            await pc.setRemoteDescription(offer)
-            # Ensure we can receive audio from client
-            pc.addTransceiver("audio", direction="recvonly")
-            answer = await pc.createAnswer()
-            await pc.setLocalDescription(answer)
-            return pc.localDescription
-
-        local = asyncio.run(process())
+        try:
+            local = handle_offer(sdp, type_)
+        except TooManyPeers as e:
+            return jsonify({"error": str(e)}), 503
         return jsonify({"sdp": local.sdp, "type": local.type})
 
     # Ensure SECRET_KEY exists for future session-based features
@@ -84,4 +119,5 @@ app = create_app()
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Development server; use `python -m app.serve` in production
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', '1') == '1')
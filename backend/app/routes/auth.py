@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from ..db.mongo import get_db
-from ..utils.jwt_auth import create_jwt_token, require_auth
+from ..utils.jwt_auth import create_jwt_token, require_auth, invalidate_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 from datetime import datetime
@@ -39,6 +39,7 @@ def signup():
         'created_at': datetime.utcnow().isoformat() + 'Z'
     }
     db.users.insert_one(user)
+    invalidate_user(user_id)
 
     # Create JWT token for auto-login after signup
     token = create_jwt_token(user_id, email)
@@ -3,18 +3,173 @@ import os
 from datetime import datetime
 from ..db.mongo import get_db
 from ..utils.jwt_auth import require_auth
-from ..services.stt import transcribe_audio
+from ..services.stt import transcribe_audio, SttBusy
 from ..services.moderation import is_allowed
-from ..services.grammar import analyze_grammar
-from ..services.semantic import semantic_score
+from ..services.grammar import heuristic_grammar
+from ..services.grammar_providers import score_grammar, provider_order
+from ..services.semantic import semantic_score, overlap_score
+from ..services.scoring import run_stages, stage_deadline
 from ..services.aligner import pronunciation_score
-from ..services.tts import synthesize_tts
-import json
-import requests
+from ..services.tts import synthesize_tts, TtsBusy
+from ..services.attempt_writer import save_attempt, flush as flush_attempts
+from ..services.rescoring import score_items, rescore_attempts
+from ..services.admission import AdmissionRejected, admit, check_rate, client
+from ..utils import metrics
 
 check_bp = Blueprint('check', __name__)
 
 
+def _score_concurrently(question: str, transcript: str, grammar_fn, with_semantic: bool) -> dict:
+    """
+    Run grammar analysis and (optionally) semantic scoring at the same time.
+    A stage that fails or misses its deadline falls back to its local heuristic.
+    """
+    stages = {
+        'grammar': (
+            lambda: grammar_fn(transcript),
+            lambda: heuristic_grammar(transcript),
+            stage_deadline('grammar', 15),
+        ),
+    }
+    if with_semantic:
+        stages['semantic'] = (
+            lambda: semantic_score(question, transcript),
+            lambda: overlap_score(question, transcript),
+            stage_deadline('semantic', 5),
+        )
+    return run_stages(stages)
+
+
+def _inline_tts(speak_text: str, key: str, weight: float) -> dict:
+    # Under TTS backpressure, answer without audio; the frontend fetches it from /tts
+    try:
+        with admit('tts', key, weight):
+            return synthesize_tts(speak_text)
+    except (TtsBusy, AdmissionRejected):
+        return _empty_tts(speak_text)
+
+
+def _too_many(e: AdmissionRejected):
+    resp = jsonify({'error': str(e)})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 429
+
+
+def _empty_tts(text: str) -> dict:
+    return { 'audio_b64': '', 'mime': 'audio/wav', 'visemes': [], 'text': text }
+
+
+def _feedback_text(corr_text: str, score: int, mistakes_list) -> str:
+    """Spoken feedback line based on the grammar score and mistakes."""
+    try:
+        mcount = len(mistakes_list or [])
+    except Exception:
+        mcount = 0
+    if score >= 85 and mcount == 0:
+        prefix = "Great job! That sounds good."
+    elif score >= 70:
+        prefix = "Good attempt—you can improve."
+    else:
+        prefix = "Let's improve this."
+    corr_text = corr_text or ""
+    return f"{prefix} Try this: {corr_text}".strip()
+
+
+def _save(session_id, question, transcript, correction, mistakes, scores) -> dict:
+    attempt = {
+        'session_id': session_id,
+        'question': question,
+        'transcript': transcript,
+        'correction': correction,
+        'mistakes': mistakes,
+        'scores': scores,
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }
+    save_attempt(attempt)
+    return attempt
+
+
+def _payload(attempt: dict, feedback_text: str, tts: dict) -> dict:
+    return {
+        'transcript': attempt['transcript'],
+        'correction': attempt['correction'],
+        'mistakes': attempt['mistakes'],
+        'scores': attempt['scores'],
+        'tts': tts,
+        'feedback_text': feedback_text
+    }
+
+
+def _short_circuit(session_id: str, question: str, transcript: str):
+    """
+    Answers that never reach the models: moderation refusals and STATIC_MODE.
+    Returns the response payload, or None to continue with scoring.
+    """
+    # Moderation: if profanity/inappropriate language is detected, return a
+    # deterministic polite refusal and set ALL scores to 0. Do not pass to models.
+    with metrics.span('moderation'):
+        allowed = is_allowed(transcript)
+    if not allowed:
+        metrics.inc('moderation_blocks')
+        correction = "I am not sure about that, please retry."
+        attempt = _save(session_id, question, transcript, correction, ["inappropriate language"],
+                        {'grammar': 0, 'pronunciation': 0, 'semantic': 0, 'fluency': 0})
+        # Return fast; let frontend call /tts for audio+visemes if needed
+        return _payload(attempt, correction, _empty_tts(correction))
+
+    # Static mode: echo user transcript and use fixed scores
+    if os.getenv('STATIC_MODE') == '1':
+        scores = {
+            'grammar': int(os.getenv('STATIC_GRAMMAR', '85')),
+            'pronunciation': int(os.getenv('STATIC_PRONUNCIATION', '75')),
+            'semantic': int(os.getenv('STATIC_SEMANTIC', '80')),
+            'fluency': int(os.getenv('STATIC_FLUENCY', '80'))
+        }
+        attempt = _save(session_id, question, transcript, transcript, [], scores)
+        # Return fast; frontend will fetch TTS separately
+        feedback_text = _feedback_text(transcript, scores['grammar'], [])
+        return _payload(attempt, feedback_text, _empty_tts(feedback_text))
+    return None
+
+
+def _scoring_mode():
+    """(remote, fast): whether a remote grammar provider is configured, and FAST_MODE applies."""
+    # Remote providers (Gemini, local Llama) are hedged and failed over inside
+    # score_grammar; with none configured the deterministic heuristics are used.
+    remote = bool(provider_order())
+    # FAST_MODE skips heavy services for quick response
+    return remote, remote and os.getenv('FAST_MODE', '1') == '1'
+
+
+def _finish(session_id: str, question: str, transcript: str, results: dict, fast: bool):
+    """Turn stage results into scores and store the attempt. Returns (attempt, feedback_text)."""
+    analysis = results['grammar']
+    correction = analysis['correction']
+    mistakes = analysis.get('mistakes', [])
+    if fast:
+        # Lightweight heuristics
+        sem_score = 75 if any(w in transcript.lower() for w in (question or '').lower().split()[:3]) else 65
+        pron_score = 75
+    else:
+        sem_score = results['semantic']
+        # Pronunciation scoring (placeholder forced alignment)
+        with metrics.span('pronunciation'):
+            pron_score = pronunciation_score(transcript, correction)
+    scores = {
+        'grammar': analysis['score'],
+        'pronunciation': pron_score,
+        'semantic': sem_score,
+        'fluency': analysis.get('fluency', 70)
+    }
+    attempt = _save(session_id, question, transcript, correction, mistakes, scores)
+    return attempt, _feedback_text(correction, scores['grammar'], mistakes)
+
+
+def _wants_inline_tts(remote: bool) -> bool:
+    # Without a remote provider answers return fast; the frontend calls /tts for lip sync
+    return remote and os.getenv('DISABLE_TTS') != '1'
+
+
 @check_bp.post('/check')
 @require_auth
 def check_answer(current_user):
@@ -25,10 +180,16 @@ def check_answer(current_user):
     audio = request.files.get('audio')
     if not session_id or not question:
         return jsonify({'error': 'session_id and question required'}), 400
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('check', key)
+    except AdmissionRejected as e:
+        return _too_many(e)
     
     # Verify session belongs to current user
     db = get_db()
-    session = db.sessions.find_one({'session_id': session_id})
+    with metrics.span('session_lookup'):
+        session = db.sessions.find_one({'session_id': session_id}, {'user_id': 1})
     if not session:
         return jsonify({'error': 'session not found'}), 404
     if session.get('user_id') != current_user['user_id']:
@@ -37,294 +198,108 @@ def check_answer(current_user):
     # STT
     transcript = provided_transcript
     if not transcript and audio:
-        transcript = transcribe_audio(audio)
+        try:
+            with admit('stt', key, weight):
+                transcript = transcribe_audio(audio)
+        except SttBusy as e:
+            return jsonify({'error': str(e)}), 503
+        except AdmissionRejected as e:
+            return _too_many(e)
 
     if not transcript:
         return jsonify({'error': 'no transcript provided or derived'}), 400
 
-    # Moderation: if profanity/inappropriate language is detected, return a
-    # deterministic polite refusal and set ALL scores to 0. Do not pass to models.
-    if not is_allowed(transcript):
-        print("[CHECK] Inappropriate language detected. Returning refusal with zeroed scores.")
-        correction = "I am not sure about that, please retry."
-        mistakes = ["inappropriate language"]
-        grammar_score = 0
-        fluency = 0
-        sem_score = 0
-        pron_score = 0
-
-        attempt = {
-            'session_id': session_id,
-            'question': question,
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': {
-                'grammar': grammar_score,
-                'pronunciation': pron_score,
-                'semantic': sem_score,
-                'fluency': fluency
-            },
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
-        db.attempts.insert_one(attempt)
-
-        # Return fast; let frontend call /tts for audio+visemes if needed
-        feedback_text = correction
-        tts = { 'audio_b64': '', 'mime': 'audio/wav', 'visemes': [], 'text': feedback_text }
-        return jsonify({
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': attempt['scores'],
-            'tts': tts,
-            'feedback_text': feedback_text
-        })
-
-    print(f"[CHECK] Processing transcript: '{transcript}'")
-
-    # Local helper to generate a spoken feedback line based on scores/mistakes
-    def make_feedback_text(corr_text: str, score: int, mistakes_list):
-        try:
-            mcount = len(mistakes_list or [])
-        except Exception:
-            mcount = 0
-        if score >= 85 and mcount == 0:
-            prefix = "Great job! That sounds good."
-        elif score >= 70:
-            prefix = "Good attempt—you can improve."
-        else:
-            prefix = "Let's improve this."
-        corr_text = corr_text or ""
-        return f"{prefix} Try this: {corr_text}".strip()
-
-    # Static mode: echo user transcript and use fixed scores
-    if os.getenv('STATIC_MODE') == '1':
-        correction = transcript
-        grammar_score = int(os.getenv('STATIC_GRAMMAR', '85'))
-        fluency = int(os.getenv('STATIC_FLUENCY', '80'))
-        sem_score = int(os.getenv('STATIC_SEMANTIC', '80'))
-        pron_score = int(os.getenv('STATIC_PRONUNCIATION', '75'))
-        mistakes = []
-
-        attempt = {
-            'session_id': session_id,
-            'question': question,
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': {
-                'grammar': grammar_score,
-                'pronunciation': pron_score,
-                'semantic': sem_score,
-                'fluency': fluency
-            },
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
-        db.attempts.insert_one(attempt)
-
-        # Return fast; frontend will fetch TTS separately
-        feedback_text = make_feedback_text(correction, grammar_score, mistakes)
-        speak_text = f"{feedback_text}"
-        tts = { 'audio_b64': '', 'mime': 'audio/wav', 'visemes': [], 'text': speak_text }
-        return jsonify({
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': attempt['scores'],
-            'tts': tts,
-            'feedback_text': feedback_text
-        })
-
-    # Prefer Gemini path when GOOGLE_API_KEY is configured (bypass Llama)
-    if os.getenv('GOOGLE_API_KEY'):
-        analysis = analyze_grammar(transcript)
-        correction = analysis['correction']
-        grammar_score = analysis['score']
-        fluency = analysis.get('fluency', 70)
-        mistakes = analysis.get('mistakes', [])
-        diff_html = analysis.get('diff_html', '')
-        # FAST_MODE skips heavy services for quick response
-        FAST = os.getenv('FAST_MODE', '1') == '1'
-        if FAST:
-            # Lightweight heuristics
-            sem_score = 75 if any(w in transcript.lower() for w in (question or '').lower().split()[:3]) else 65
-            pron_score = 75
-        else:
-            sem_score = semantic_score(question, transcript)
-            pron_score = pronunciation_score(transcript, correction)
-
-        db = get_db()
-        attempt = {
-            'session_id': session_id,
-            'question': question,
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': {
-                'grammar': grammar_score,
-                'pronunciation': pron_score,
-                'semantic': sem_score,
-                'fluency': fluency
-            },
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
-        db.attempts.insert_one(attempt)
-
-        feedback_text = make_feedback_text(correction, grammar_score, mistakes)
-        speak_text = f"{feedback_text}"
-        if os.getenv('DISABLE_TTS') == '1':
-            tts = { 'audio_b64': '', 'mime': 'audio/wav', 'visemes': [], 'text': speak_text }
-        else:
-            tts = synthesize_tts(speak_text)
-        return jsonify({
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': attempt['scores'],
-            'tts': tts,
-            'feedback_text': feedback_text
-        })
+    early = _short_circuit(session_id, question, transcript)
+    if early is not None:
+        return jsonify(early)
 
     # If FORCE_GEMINI is enabled but GOOGLE_API_KEY is missing, fail fast
     if os.getenv('FORCE_GEMINI', '0') == '1' and not os.getenv('GOOGLE_API_KEY'):
         return jsonify({'error': 'FORCE_GEMINI=1 but GOOGLE_API_KEY is not configured'}), 500
 
-    # Llama mode via local Ollama server (only when not forcing Gemini and no Google key)
-    if os.getenv('LLAMA_MODE', '1') == '1' and os.getenv('FORCE_GEMINI', '0') != '1' and not os.getenv('GOOGLE_API_KEY'):
-        llama_url = os.getenv('LLAMA_URL', 'http://localhost:11434/api/generate')
-        llama_model = os.getenv('LLAMA_MODEL', 'llama3.1')
-        base_prompt = (
-            "You are an English grammar editor. Give a answer based on the grammar and semantics of input, output STRICT JSON only with keys:\n"
-            "Correct the grammer and semantics of input and return it.\n"
-            "correction: string (a rewritten, corrected answer of user input; NEVER identical to input),\n"
-            "score: integer 0-100 (grammar quality),\n"
-            "fluency: integer 0-100,\n"
-            "mistakes: array of short strings (what you fixed).\n"
-            "Always rewrite even if the input seems correct by slightly improving phrasing.\n\n"
-            "IMPORTANT: If the input contains ANY profanity, swear words, or inappropriate language:\n"
-            "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
-            "- Set score to 0\n"
-            "- Set mistakes to ['inappropriate language']\n"
-            "- Do NOT provide the actual corrected profane sentence\n\n"
-            "If user asks questions unrelated to English learning:\n"
-            "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
-            "- Set score to 0\n\n"
-            "Don't extend more than number in lines given in the input.\n"
-            f"Answer: {transcript}\n"
-            "Output:"
-        )
-        payload = {
-            'model': llama_model,
-            'prompt': base_prompt,
-            'format': 'json',
-            'options': {
-                'temperature': 0.2,
-                'num_ctx': 4096
-            },
-            'stream': False
-        }
-        correction = transcript
-        grammar_score = 85
-        fluency = 80
-        mistakes = []
-        try:
-            resp = requests.post(llama_url, json=payload, timeout=8)
-            if resp.ok:
-                text = resp.json().get('response', '')
-                cleaned = "\n".join([ln for ln in text.splitlines() if not ln.strip().startswith('```')]).strip()
-                data = json.loads(cleaned)
-                corr = str(data.get('correction', transcript)) or transcript
-                correction = corr
-                grammar_score = int(float(data.get('score', grammar_score)))
-                fluency = int(float(data.get('fluency', fluency)))
-                m = data.get('mistakes')
-                mistakes = m if isinstance(m, list) else mistakes
-        except Exception:
-            # If parsing fails repeatedly, ensure we at least tweak the sentence minimally
-            if correction == transcript and correction:
-                if not correction.endswith('.'):
-                    correction = correction + '.'
-
-        # Semantic and pronunciation
-        FAST = os.getenv('FAST_MODE', '1') == '1'
-        if FAST:
-            sem_score = 70
-            pron_score = 75
-        else:
-            sem_score = semantic_score(question, transcript)
-            pron_score = pronunciation_score(transcript, correction)
-
-        db = get_db()
-        attempt = {
-            'session_id': session_id,
-            'question': question,
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': {
-                'grammar': grammar_score,
-                'pronunciation': pron_score,
-                'semantic': sem_score,
-                'fluency': fluency
-            },
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
-        db.attempts.insert_one(attempt)
-
-        feedback_text = make_feedback_text(correction, grammar_score, mistakes)
-        speak_text = f"{feedback_text}"
-        tts = synthesize_tts(speak_text)
-        return jsonify({
-            'transcript': transcript,
-            'correction': correction,
-            'mistakes': mistakes,
-            'scores': attempt['scores'],
-            'tts': tts,
-            'feedback_text': feedback_text
-        })
-
-    # Grammar + correction
-    analysis = analyze_grammar(transcript)
-    correction = analysis['correction']
-    grammar_score = analysis['score']
-    fluency = analysis.get('fluency', 70)
-    mistakes = analysis.get('mistakes', [])
-    diff_html = analysis.get('diff_html', '')
+    remote, fast = _scoring_mode()
+    try:
+        with admit('grammar', key, weight):
+            results = _score_concurrently(question, transcript, score_grammar, with_semantic=not fast)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    attempt, feedback_text = _finish(session_id, question, transcript, results, fast)
+    if _wants_inline_tts(remote):
+        tts = _inline_tts(feedback_text, key, weight)
+    else:
+        tts = _empty_tts(feedback_text)
+    return jsonify(_payload(attempt, feedback_text, tts))
 
-    # Semantic similarity against question intent (placeholder)
-    sem_score = semantic_score(question, transcript)
 
-    # Pronunciation scoring (placeholder forced alignment)
-    pron_score = pronunciation_score(transcript, correction)
+@check_bp.post('/check/batch')
+@require_auth
+def check_batch(current_user):
+    """
+    Score many answers in one request.
+    JSON body, one of:
+      { "items": [{"question": str, "transcript": str}, ...], "semantic": bool }
+        -> scores returned, nothing stored
+      { "session_id": str, "job_id": str (optional), "semantic": bool }
+        -> re-score and update the stored attempts of one of the caller's sessions,
+           at most RESCORE_REQUEST_LIMIT per request; while the returned status is
+           "paused", post again with the returned job_id to continue
+    """
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('check', key)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    # Every item's grammar call queues through the same fair limiter as /check
+    guard = lambda: admit('grammar', key, weight)
+    body = request.get_json(silent=True) or {}
+    with_semantic = bool(body.get('semantic', True))
+    items = body.get('items')
+    session_id = body.get('session_id')
 
-    # Save attempt
-    attempt = {
-        'session_id': session_id,
-        'question': question,
-        'transcript': transcript,
-        'correction': correction,
-        'mistakes': mistakes,
-        'scores': {
-            'grammar': grammar_score,
-            'pronunciation': pron_score,
-            'semantic': sem_score,
-            'fluency': fluency
-        },
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
-    }
-    db.attempts.insert_one(attempt)
+    if items is not None:
+        max_items = int(os.getenv('RESCORE_MAX_ITEMS', '500'))
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            return jsonify({'error': 'items must be a list of {question, transcript}'}), 400
+        if len(items) > max_items:
+            return jsonify({'error': f'at most {max_items} items per request'}), 413
+        invalid = [{'index': i, 'error': 'question and transcript must be strings'}
+                   for i, item in enumerate(items)
+                   if not all(isinstance(item.get(k), (str, type(None))) for k in ('question', 'transcript'))]
+        if invalid:
+            return jsonify({'error': 'invalid items', 'items': invalid}), 400
+        try:
+            results = score_items(items, with_semantic=with_semantic, guard=guard)
+        except AdmissionRejected as e:
+            return _too_many(e)
+        return jsonify({'results': results})
 
-    # Return fast without inline TTS; frontend can call /tts for perfect lip sync
-    feedback_text = make_feedback_text(correction, grammar_score, mistakes)
-    speak_text = f"{feedback_text}"
-    tts = { 'audio_b64': '', 'mime': 'audio/wav', 'visemes': [], 'text': speak_text }
+    if not session_id:
+        return jsonify({'error': 'items or session_id required'}), 400
+    db = get_db()
+    session = db.sessions.find_one({'session_id': session_id}, {'user_id': 1})
+    if not session:
+        return jsonify({'error': 'session not found'}), 404
+    if session.get('user_id') != current_user['user_id']:
+        return jsonify({'error': 'unauthorized'}), 403
 
+    flush_attempts(session_id)
+    job_id = body.get('job_id') or f"{session_id}:{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+    # Bounded per request so a large session cannot hold the worker past proxy timeouts;
+    # one session means at most one feedback regeneration, on the request that completes it
+    limit = int(os.getenv('RESCORE_REQUEST_LIMIT', '200'))
+    try:
+        job = rescore_attempts(job_id, session_id=session_id, with_semantic=with_semantic, db=db, guard=guard,
+                               limit=limit, feedback=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except AdmissionRejected as e:
+        # The job is checkpointed; retrying with the same job_id resumes it
+        resp = jsonify({'error': str(e), 'job_id': job_id})
+        resp.headers['Retry-After'] = str(e.retry_after)
+        return resp, 429
     return jsonify({
-        'transcript': transcript,
-        'correction': correction,
-        'mistakes': mistakes,
-        'scores': attempt['scores'],
-        'tts': tts,  # empty; frontend will fetch via /tts
-        'feedback_text': feedback_text
+        'job_id': job['_id'],
+        'status': job['status'],
+        'processed': job['processed'],
+        'updated': job['updated'],
     })
@@ -1,9 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from ..db.mongo import get_db
 from ..utils.jwt_auth import require_auth, optional_auth
 from datetime import datetime
 import uuid
+import base64
+import hashlib
+import json
+from bson import ObjectId
 from ..services.gemini_client import generate_feedback
+from ..services.session_stats import initial_aggregates, final_report
+from ..services import attempt_writer
   
 session_bp = Blueprint('session', __name__)
 
@@ -25,7 +31,8 @@ def start_session(current_user):
         'email': current_user.get('email'),
         'avatar_url': avatar_url,
         'started_at': datetime.utcnow().isoformat() + 'Z',
-        'status': 'active'
+        'status': 'active',
+        'agg': initial_aggregates()
     }
     db.sessions.insert_one(session_doc)
 
@@ -45,6 +52,8 @@ def end_session(current_user):
         return jsonify({'error': 'session_id required'}), 400
 
     db = get_db()
+    # Attempts are written behind the /check response; make this session's durable first
+    attempt_writer.flush(session_id)
     
     # Verify session belongs to current user
     session = db.sessions.find_one({'session_id': session_id})
@@ -54,26 +63,8 @@ def end_session(current_user):
     if session.get('user_id') != current_user['user_id']:
         return jsonify({'error': 'unauthorized'}), 403
 
-    # Aggregate scores
-    attempts = list(db.attempts.find({'session_id': session_id}))
-    def avg(key):
-        vals = [a.get('scores', {}).get(key) for a in attempts if a.get('scores', {}).get(key) is not None]
-        return round(sum(vals) / len(vals), 2) if vals else 0
-
-    scores = {
-        'grammar': avg('grammar'),
-        'pronunciation': avg('pronunciation'),
-        'semantic': avg('semantic'),
-        'fluency': avg('fluency')
-    }
-    scores['final'] = round(sum(scores.values()) / 4, 2) if any(scores.values()) else 0
-
-    # Aggregate mistakes
-    all_mistakes = []
-    for a in attempts:
-        ms = a.get('mistakes') or []
-        if isinstance(ms, list):
-            all_mistakes.extend(ms)
+    # Aggregate scores from the running totals kept by /check
+    scores, all_mistakes, total_attempts = final_report(db, session)
 
     # Generate feedback text
     feedback = generate_feedback(scores, all_mistakes)
@@ -85,50 +76,148 @@ def end_session(current_user):
             'ended_at': datetime.utcnow().isoformat() + 'Z',
             'final_scores': scores,
             'feedback': feedback,
-            'total_attempts': len(attempts)
+            'total_attempts': total_attempts
         }
     })
 
     return jsonify({'message': 'session ended', 'scores': scores, 'feedback': feedback})
 
 
+# Field projections for list/detail views. Summary views drop the long Gemini
+# feedback and full transcripts that dashboard lists never render.
+SESSION_VIEWS = {
+    'summary': {'_id': 0, 'session_id': 1, 'status': 1, 'started_at': 1, 'ended_at': 1,
+                'final_scores': 1, 'total_attempts': 1},
+    'full': {'_id': 0, 'agg': 0},
+}
+ATTEMPT_VIEWS = {
+    'summary': {'question': 1, 'scores': 1, 'timestamp': 1},
+    'full': {},
+}
+
+
+def _page_args(args, default_limit: int, max_limit: int, default_view: str):
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        limit = default_limit
+    limit = max(1, min(limit, max_limit))
+    view = args.get('view', default_view)
+    return limit, view, args.get('cursor')
+
+
+def _encode_cursor(*parts) -> str:
+    return base64.urlsafe_b64encode(json.dumps(parts).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return parts if isinstance(parts, list) and len(parts) == 2 else None
+    except Exception:
+        return None
+
+
 @session_bp.get('/history')
 @require_auth
 def get_session_history(current_user):
-    """Get all sessions for the authenticated user"""
+    """
+    Get the authenticated user's sessions, most recent first.
+    Query params: limit (default 20, max 100), cursor (from next_cursor), view=summary|full.
+    """
+    limit, view, cursor = _page_args(request.args, 20, 100, 'summary')
+    if view not in SESSION_VIEWS:
+        return jsonify({'error': 'view must be summary or full'}), 400
+
+    query = {'user_id': current_user['user_id']}
+    if cursor:
+        parts = _decode_cursor(cursor)
+        if not parts:
+            return jsonify({'error': 'invalid cursor'}), 400
+        started_at, last_id = parts
+        query['$or'] = [
+            {'started_at': {'$lt': started_at}},
+            {'started_at': started_at, 'session_id': {'$lt': last_id}},
+        ]
+
     db = get_db()
-    
-    # Get all sessions for this user, sorted by most recent first
-    sessions = list(db.sessions.find(
-        {'user_id': current_user['user_id']},
-        {'_id': 0}  # Exclude MongoDB _id field
-    ).sort('started_at', -1))
-    
-    return jsonify({'sessions': sessions})
+    sessions = list(db.sessions.find(query, SESSION_VIEWS[view])
+                    .sort([('started_at', -1), ('session_id', -1)])
+                    .limit(limit + 1))
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        next_cursor = _encode_cursor(last.get('started_at'), last.get('session_id'))
+
+    return jsonify({'sessions': sessions, 'next_cursor': next_cursor})
 
 
 @session_bp.get('/<session_id>')
 @require_auth
 def get_session_details(current_user, session_id):
-    """Get detailed information about a specific session"""
+    """
+    Get a session and a page of its attempts in chronological order.
+    Query params: limit (default 100, max 500), cursor (from next_cursor), view=full|summary.
+    Completed sessions never change, so their responses carry an ETag.
+    """
+    limit, view, cursor = _page_args(request.args, 100, 500, 'full')
+    if view not in ATTEMPT_VIEWS:
+        return jsonify({'error': 'view must be summary or full'}), 400
+
     db = get_db()
     
     # Get session
-    session = db.sessions.find_one({'session_id': session_id}, {'_id': 0})
+    session = db.sessions.find_one({'session_id': session_id}, SESSION_VIEWS['full'])
     if not session:
         return jsonify({'error': 'session not found'}), 404
     
     # Verify session belongs to current user
     if session.get('user_id') != current_user['user_id']:
         return jsonify({'error': 'unauthorized'}), 403
-    
-    # Get all attempts for this session
-    attempts = list(db.attempts.find(
-        {'session_id': session_id},
-        {'_id': 0}
-    ).sort('timestamp', 1))
-    
-    return jsonify({
+
+    etag = None
+    if session.get('status') == 'completed':
+        raw = '|'.join([session_id, str(session.get('ended_at')), str(session.get('rescored_at')),
+                        view, cursor or '', str(limit)])
+        etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        if request.if_none_match.contains(etag):
+            resp = make_response('', 304)
+            resp.set_etag(etag)
+            return resp
+
+    attempt_writer.flush(session_id)
+    query = {'session_id': session_id}
+    if cursor:
+        parts = _decode_cursor(cursor)
+        if not parts or not ObjectId.is_valid(parts[1]):
+            return jsonify({'error': 'invalid cursor'}), 400
+        ts, last_id = parts[0], ObjectId(parts[1])
+        query['$or'] = [
+            {'timestamp': {'$gt': ts}},
+            {'timestamp': ts, '_id': {'$gt': last_id}},
+        ]
+
+    # _id is kept for the cursor tie-breaker and stripped before responding
+    projection = ATTEMPT_VIEWS[view] or None
+    attempts = list(db.attempts.find(query, projection)
+                    .sort([('timestamp', 1), ('_id', 1)])
+                    .limit(limit + 1))
+    next_cursor = None
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        last = attempts[-1]
+        next_cursor = _encode_cursor(last.get('timestamp'), str(last['_id']))
+    for a in attempts:
+        a.pop('_id', None)
+
+    resp = jsonify({
         'session': session,
-        'attempts': attempts
+        'attempts': attempts,
+        'next_cursor': next_cursor
     })
+    if etag:
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return resp
@@ -1,18 +1,114 @@
-from flask import Blueprint, request, jsonify
-from ..services.tts import synthesize_tts
+import io
+from flask import Blueprint, request, jsonify, Response, send_file
+from ..services.tts import synthesize_tts, synthesize, encode_audio, cached_audio, TtsBusy, AUDIO_FORMATS
+from ..services import lipsync
+from ..services.admission import AdmissionRejected, admit, check_rate, client
+from ..utils.jwt_auth import optional_auth
 
 
 tts_bp = Blueprint('tts', __name__)
 
 
+def _too_many(e: AdmissionRejected):
+    resp = jsonify({"error": str(e)})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 429
+
+
 @tts_bp.post('/tts')
-def tts_endpoint():
+@optional_auth
+def tts_endpoint(current_user):
     data = request.get_json(silent=True) or {}
     text = data.get('text')
     if not text or not isinstance(text, str):
         return jsonify({"error": "text is required"}), 400
+    # Anonymous callers are rate limited and queued by IP
+    key, weight = client(current_user, request.remote_addr)
     try:
-        result = synthesize_tts(text)
+        check_rate('tts', key)
+        # async_visemes: return audio now, poll /tts/visemes/<viseme_job> for lip-sync cues
+        with admit('tts', key, weight):
+            result = synthesize_tts(text, async_visemes=bool(data.get('async_visemes')))
         return jsonify(result)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    except TtsBusy as e:
+        resp = jsonify({"error": str(e)})
+        resp.headers['Retry-After'] = '1'
+        return resp, 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@tts_bp.post('/tts/audio')
+@optional_auth
+def tts_audio_stream(current_user):
+    """
+    Streaming variant of /tts: the body is raw audio (format=wav|ogg|mp3), not base64 JSON.
+    Visemes are fetched separately from the URL in the X-Visemes-Url header; the
+    audio itself stays addressable (with Range support) at X-Audio-Url.
+    """
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not text or not isinstance(text, str):
+        return jsonify({"error": "text is required"}), 400
+    fmt = (data.get('format') or request.args.get('format') or 'wav').lower()
+    if fmt not in AUDIO_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(AUDIO_FORMATS)}"}), 400
+    key, weight = client(current_user, request.remote_addr)
+    try:
+        check_rate('tts', key)
+        with admit('tts', key, weight):
+            result = synthesize(text, async_visemes=True)
+    except AdmissionRejected as e:
+        return _too_many(e)
+    except TtsBusy as e:
+        resp = jsonify({"error": str(e)})
+        resp.headers['Retry-After'] = '1'
+        return resp, 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+    audio, mime = encode_audio(result['key'], result['audio'], fmt)
+    chunk = 32 * 1024
+
+    def generate():
+        for i in range(0, len(audio), chunk):
+            yield audio[i:i + chunk]
+
+    resp = Response(generate(), mimetype=mime)
+    resp.headers['Content-Length'] = str(len(audio))
+    # The silent fallback is not cached, so there is nothing to point at
+    if result.get('addressable'):
+        resp.headers['X-Audio-Url'] = f"/api/tts/audio/{result['key']}?format={fmt}"
+    if result.get('viseme_job') or result.get('addressable'):
+        resp.headers['X-Visemes-Url'] = f"/api/tts/visemes/{result.get('viseme_job') or result['key']}"
+    resp.headers['Access-Control-Expose-Headers'] = 'X-Audio-Url, X-Visemes-Url'
+    return resp
+
+
+@tts_bp.get('/tts/audio/<key>')
+def tts_cached_audio(key):
+    """Serve previously synthesized audio by cache key; supports Range and If-None-Match."""
+    fmt = (request.args.get('format') or 'wav').lower()
+    if fmt not in AUDIO_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(AUDIO_FORMATS)}"}), 400
+    cached = cached_audio(key)
+    if cached is None:
+        return jsonify({"error": "audio not cached"}), 404
+    audio, mime = encode_audio(key, cached[0], fmt)
+    return send_file(io.BytesIO(audio), mimetype=mime, conditional=True,
+                     etag=f"{key}-{fmt}", max_age=86400)
+
+
+@tts_bp.get('/tts/visemes/<job_id>')
+def tts_visemes(job_id):
+    job = lipsync.get_job(job_id)
+    if job is None:
+        # Finished jobs may have expired; completed results live in the TTS cache
+        cached = cached_audio(job_id)
+        if cached is not None:
+            # visemes is None when Rhubarb produced no cues for the cached audio
+            return jsonify({"status": "done" if cached[1] is not None else "absent", "visemes": cached[1] or []})
+        return jsonify({"error": "unknown or expired viseme job"}), 404
+    return jsonify(job)
@@ -0,0 +1,59 @@
+# Production launcher.
+#
+#   python -m app.serve                      # SERVER_MODE=wsgi: waitress, thread pool
+#   python -m app.serve --mode asgi          # uvicorn workers running app.asgi:application
+#   python -m app.serve --mode asgi --workers 4 --port 8000
+#
+# Each ASGI worker is a separate process with its own Whisper replicas and caches;
+# size SERVER_WORKERS against memory, and the pools inside each worker with
+# WHISPER_REPLICAS, ASYNC_OFFLOAD_THREADS and ASYNC_WSGI_THREADS.
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+
+def _serve_wsgi(args):
+    from waitress import serve
+    from .main import app
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          connection_limit=int(os.getenv('SERVER_CONNECTION_LIMIT', '1000')),
+          channel_timeout=int(os.getenv('SERVER_TIMEOUT_SEC', '120')))
+
+
+def _serve_asgi(args):
+    import uvicorn
+    if args.workers > 1 and os.getenv('ATTEMPT_WRITE_BEHIND', '1') == '1':
+        # flush() only drains this process's queue, so /session/end on one worker would
+        # miss attempts still queued on another; workers inherit this environment
+        print("[SERVE] Multiple workers: disabling ATTEMPT_WRITE_BEHIND (attempts are written synchronously)")
+        os.environ['ATTEMPT_WRITE_BEHIND'] = '0'
+    limit = os.getenv('SERVER_LIMIT_CONCURRENCY')
+    uvicorn.run('app.asgi:application', host=args.host, port=args.port, workers=args.workers,
+                limit_concurrency=int(limit) if limit else None,
+                timeout_keep_alive=int(os.getenv('SERVER_KEEPALIVE_SEC', '5')),
+                log_level=os.getenv('SERVER_LOG_LEVEL', 'info'))
+
+
+def main(argv):
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the backend with a production server.")
+    parser.add_argument("--mode", choices=("wsgi", "asgi"), default=os.getenv('SERVER_MODE', 'wsgi'))
+    parser.add_argument("--host", default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument("--workers", type=int, default=int(os.getenv('SERVER_WORKERS', '1')),
+                        help="ASGI worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.getenv('SERVER_THREADS', '16')),
+                        help="WSGI request threads")
+    args = parser.parse_args(argv)
+    size = f"{args.workers} workers" if args.mode == 'asgi' else f"{args.threads} threads"
+    print(f"[SERVE] {args.mode} on {args.host}:{args.port} ({size})")
+    if args.mode == 'asgi':
+        _serve_asgi(args)
+    else:
+        _serve_wsgi(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,286 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from ..utils.cache import LRUCache
+from ..utils import metrics
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is rate limited or shed; `retry_after` is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted", "cancelled")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+
+
+class _Stage:
+    """
+    Concurrency limit for one expensive stage (STT, grammar, TTS) with a weighted
+    fair queue in front of it. Waiters are ordered by virtual finish time
+    (start-time fair queuing), so a client with many queued requests only gets its
+    weighted share of freed slots. A request whose estimated wait, counting only
+    the waiters that fair queuing puts ahead of it, exceeds the latency budget is
+    rejected up front instead of queuing; a flooding client is shed first.
+    """
+
+    def __init__(self, name: str, limit: int, budget: float, max_queue: int, service_estimate: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.budget = budget
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._heap = []      # (virtual finish, seq, waiter)
+        self._finish = {}    # client key -> virtual finish of its last queued request
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._in_flight = 0
+        self._queued = 0
+        self._service = service_estimate  # EWMA of time a slot is held
+        self._admitted = 0
+        self._queued_total = 0
+        self._shed = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+
+    def _estimated_wait(self, ahead: int = None) -> float:
+        if ahead is None:
+            ahead = self._queued
+        return (ahead + 1) * self._service / self.limit
+
+    def enqueue(self, key: str, weight: float, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or queue the waiter (False). Raises AdmissionRejected."""
+        with self._lock:
+            if self._in_flight < self.limit and not self._queued:
+                self._in_flight += 1
+                self._admitted += 1
+                return True
+            tag = max(self._vtime, self._finish.get(key, 0.0)) + 1.0 / max(weight, 0.01)
+            ahead = sum(1 for t, _, w in self._heap if t <= tag and not w.cancelled)
+            wait = self._estimated_wait(ahead)
+            if self._queued >= self.max_queue or wait > self.budget:
+                self._shed += 1
+                shed = True
+            else:
+                shed = False
+                self._finish[key] = tag
+                heapq.heappush(self._heap, (tag, next(self._seq), waiter))
+                self._queued += 1
+                self._queued_total += 1
+        if shed:
+            metrics.inc("admission_rejected", stage=self.name, reason="shed")
+            raise AdmissionRejected(f"{self.name} is overloaded, please retry", retry_after=wait)
+        return False
+
+    def cancel(self, waiter: _Waiter, reason: str = "timeout") -> bool:
+        """Withdraw a queued waiter. Returns False if it was granted a slot in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            self._queued -= 1
+            if reason == "timeout":
+                self._timeouts += 1
+        metrics.inc("admission_rejected", stage=self.name, reason=reason)
+        return True
+
+    def granted(self, waited: float):
+        with self._lock:
+            self._wait_total += waited
+        metrics.observe("admission_wait_seconds", waited, stage=self.name)
+
+    def release(self, held: float):
+        with self._lock:
+            self._service = 0.8 * self._service + 0.2 * held
+            self._in_flight -= 1
+            while self._in_flight < self.limit and self._heap:
+                tag, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                self._queued -= 1
+                self._vtime = tag
+                self._in_flight += 1
+                self._admitted += 1
+                waiter.granted = True
+                waiter.wake()
+            if not self._heap:
+                # Finish tags only order requests that are queued together
+                self._finish.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "budget_sec": self.budget,
+                "est_wait_ms": round(1000 * self._estimated_wait(), 1),
+                "admitted": self._admitted,
+                "queued_total": self._queued_total,
+                "shed": self._shed,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(1000 * self._wait_total / self._queued_total, 2) if self._queued_total else 0.0,
+            }
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+
+
+def _enabled() -> bool:
+    return os.getenv("ADMISSION_ENABLED", "1") == "1"
+
+
+_STAGE_DEFAULTS = {
+    # stage: (limit, latency budget in seconds, initial service time estimate);
+    # STT defaults to one slot per Whisper replica
+    "stt": (None, 10.0, 2.0),
+    "grammar": (16, 10.0, 2.0),
+    "tts": (2, 8.0, 1.5),
+}
+_RATE_DEFAULTS = {
+    # endpoint: (requests per minute, burst)
+    "check": (30, 10),
+    "tts": (60, 20),
+}
+
+_stages = {}
+_stages_lock = threading.Lock()
+_buckets = LRUCache(int(os.getenv("ADMISSION_MAX_CLIENTS", "100000")), ttl=3600)
+_buckets_lock = threading.Lock()
+
+
+def _get_stage(name: str) -> _Stage:
+    stage = _stages.get(name)
+    if stage is None:
+        with _stages_lock:
+            stage = _stages.get(name)
+            if stage is None:
+                limit, budget, service = _STAGE_DEFAULTS[name]
+                limit = limit or int(os.getenv("WHISPER_REPLICAS", "1"))
+                env = name.upper()
+                stage = _stages[name] = _Stage(
+                    name,
+                    limit=int(os.getenv(f"ADMISSION_{env}_LIMIT") or limit),
+                    budget=float(os.getenv(f"ADMISSION_{env}_BUDGET_SEC", str(budget))),
+                    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+                    service_estimate=service,
+                )
+    return stage
+
+
+def client(user, remote_addr) -> tuple:
+    """(key, weight) identifying the caller for rate limits and fair queuing."""
+    if user and user.get("user_id"):
+        return f"user:{user['user_id']}", 1.0
+    # Anonymous callers (e.g. /tts without a token) share less of each stage
+    return f"ip:{remote_addr or 'unknown'}", float(os.getenv("ADMISSION_ANON_WEIGHT", "0.5"))
+
+
+def check_rate(endpoint: str, key: str):
+    """Take one token from the caller's bucket for `endpoint`. Raises AdmissionRejected."""
+    if not _enabled():
+        return
+    per_min, burst = _RATE_DEFAULTS[endpoint]
+    env = endpoint.upper()
+    rate = float(os.getenv(f"ADMISSION_{env}_RATE_PER_MIN", str(per_min))) / 60.0
+    burst = float(os.getenv(f"ADMISSION_{env}_BURST", str(burst)))
+    if rate <= 0:
+        return
+    bucket_key = f"{endpoint}|{key}"
+    with _buckets_lock:
+        bucket = _buckets.get(bucket_key)
+        if bucket is None:
+            bucket = _Bucket(burst)
+            _buckets.set(bucket_key, bucket)
+        now = time.monotonic()
+        bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return
+        retry_after = (1 - bucket.tokens) / rate
+    metrics.inc("admission_rejected", stage=endpoint, reason="rate")
+    raise AdmissionRejected("too many requests, please slow down", retry_after=retry_after)
+
+
+@contextmanager
+def admit(stage_name: str, key: str, weight: float = 1.0):
+    """
+    Hold one slot of `stage_name` for the duration of the block, queuing fairly
+    behind other clients. Raises AdmissionRejected when shed or when the wait
+    exceeds the stage's latency budget.
+    """
+    if not _enabled():
+        yield
+        return
+    stage = _get_stage(stage_name)
+    event = threading.Event()
+    waiter = _Waiter(event.set)
+    t0 = time.perf_counter()
+    if not stage.enqueue(key, weight, waiter):
+        if not event.wait(stage.budget) and stage.cancel(waiter):
+            raise AdmissionRejected(f"timed out waiting for {stage_name}", retry_after=stage.budget)
+    start = time.perf_counter()
+    stage.granted(start - t0)
+    try:
+        yield
+    finally:
+        stage.release(time.perf_counter() - start)
+
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+@asynccontextmanager
+async def admit_async(stage_name: str, key: str, weight: float = 1.0):
+    """admit() for the async routes; waiting does not block the event loop."""
+    if not _enabled():
+        yield
+        return
+    stage = _get_stage(stage_name)
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, fut))
+    t0 = time.perf_counter()
+    if not stage.enqueue(key, weight, waiter):
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), stage.budget)
+        except asyncio.TimeoutError:
+            if stage.cancel(waiter):
+                raise AdmissionRejected(f"timed out waiting for {stage_name}", retry_after=stage.budget)
+        except asyncio.CancelledError:
+            # Client went away: give back a slot that was granted concurrently
+            if not stage.cancel(waiter, reason="cancelled"):
+                stage.release(0.0)
+            raise
+    start = time.perf_counter()
+    stage.granted(start - t0)
+    try:
+        yield
+    finally:
+        stage.release(time.perf_counter() - start)
+
+
+def admission_stats() -> dict:
+    return {name: _get_stage(name).stats() for name in _STAGE_DEFAULTS}
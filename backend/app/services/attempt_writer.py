@@ -0,0 +1,238 @@
+# Write-behind persistence for /check attempts.
+# Attempts are queued in memory and written with insert_many from a background
+# thread once ATTEMPT_BATCH_SIZE documents are pending or the oldest has waited
+# ATTEMPT_FLUSH_MS. Session aggregates are applied after their attempts are stored.
+# Readers that need the attempts (session end/details) call flush() first. The queue
+# is per process, so write-behind is only safe with a single server process;
+# app.serve turns it off when it starts several workers.
+
+import os
+import time
+import atexit
+import threading
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from ..db.mongo import get_db
+from .session_stats import aggregate_ops
+from ..utils import metrics
+
+_DUPLICATE_KEY = 11000
+# Write errors worth retrying; any other per-document error (validation, document
+# too large, ...) fails the same way every time and is dropped instead
+_TRANSIENT_CODES = {50, 91, 112, 189, 10107, 11600, 11602, 13435, 13436}
+
+
+class AttemptWriter:
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int, max_retries: int = 5):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max(0, max_retries)
+        self._pending = []      # [(enqueued_at, attempt, tries)]
+        self._agg_pending = []  # aggregate ops whose attempts are already stored
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self.metrics = {"enqueued": 0, "written": 0, "sync_writes": 0, "failed_batches": 0, "dropped": 0,
+                        "last_batch_size": 0, "last_flush_ms": 0.0, "max_lag_ms": 0.0}
+        self._thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, attempt: dict):
+        with self._cond:
+            overloaded = len(self._pending) >= self.max_queue
+            if not overloaded:
+                self._pending.append((time.monotonic(), attempt, 0))
+                self.metrics["enqueued"] += 1
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify()
+        if overloaded:
+            # Backpressure: the writer is not keeping up, so write on the caller's thread
+            self.metrics["sync_writes"] += 1
+            self._write([(time.monotonic(), attempt, 0)])
+
+    def flush(self, session_id: str = None):
+        """
+        Synchronously write everything pending. When nothing is queued for `session_id`,
+        only wait for a batch that may already be in flight.
+        """
+        with self._cond:
+            queued = self._agg_pending or any(
+                session_id is None or a.get('session_id') == session_id for _, a, _ in self._pending)
+        if queued:
+            self._flush()
+        else:
+            with self._flush_lock:
+                pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if len(self._pending) >= self.batch_size:
+                        break
+                    if self._pending or self._agg_pending:
+                        oldest = self._pending[0][0] if self._pending else time.monotonic()
+                        wait = self.flush_interval - (time.monotonic() - oldest)
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                stopped = self._stopped
+            self._flush()
+            if stopped:
+                return
+
+    def _flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write(batch)
+            self._apply_aggregates()
+
+    def _write(self, batch):
+        t0 = time.perf_counter()
+        docs = [a for _, a, _ in batch]
+        db = get_db()
+        try:
+            # _id is assigned client-side, so a retried batch only hits duplicate-key errors
+            db.attempts.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every document without a write error was stored (duplicates were
+            # stored by an earlier try). Retry transient failures, drop permanent ones.
+            retry, failed = [], set()
+            for err in e.details.get('writeErrors', []):
+                if err.get('code') == _DUPLICATE_KEY:
+                    continue
+                failed.add(err['index'])
+                if err.get('code') in _TRANSIENT_CODES:
+                    retry.append(batch[err['index']])
+                else:
+                    self._drop(batch[err['index']], err.get('errmsg', err.get('code')))
+            if retry:
+                self._requeue(retry, e)
+            batch = [item for i, item in enumerate(batch) if i not in failed]
+            docs = [a for _, a, _ in batch]
+            if not batch:
+                return
+        except PyMongoError as e:
+            self._requeue(batch, e)
+            return
+        now = time.monotonic()
+        metrics.record("mongo.insert_attempts", time.perf_counter() - t0)
+        metrics.observe("attempt_write_lag_seconds", now - batch[0][0])
+        with self._cond:
+            for a in docs:
+                self._agg_pending.extend(aggregate_ops(a['session_id'], a['scores'], a['mistakes']))
+            self.metrics["written"] += len(docs)
+            self.metrics["last_batch_size"] = len(docs)
+            self.metrics["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            self.metrics["max_lag_ms"] = max(self.metrics["max_lag_ms"], round((now - batch[0][0]) * 1000, 2))
+
+    def _apply_aggregates(self):
+        with self._cond:
+            ops, self._agg_pending = self._agg_pending, []
+        if not ops:
+            return
+        try:
+            get_db().sessions.bulk_write(ops, ordered=True)
+        except BulkWriteError as e:
+            # Ordered: ops before the failing one are applied and must not be re-sent,
+            # or their $inc would be counted twice
+            err = (e.details.get('writeErrors') or [{}])[0]
+            index = err.get('index', 0)
+            if err.get('code') not in _TRANSIENT_CODES:
+                print(f"[ATTEMPTS] Dropping session aggregate update: {err.get('errmsg', err.get('code'))}")
+                index += 1
+            self._retry_aggregates(ops[index:], e)
+        except PyMongoError as e:
+            # Not a per-op failure (e.g. connection lost); the driver's retryable writes
+            # already re-sent the in-flight op once, so the batch is retried as a whole
+            self._retry_aggregates(ops, e)
+
+    def _retry_aggregates(self, ops, err):
+        with self._cond:
+            self.metrics["failed_batches"] += 1
+            self._agg_pending = ops + self._agg_pending
+        if ops:
+            print(f"[ATTEMPTS] Session aggregate update failed, will retry {len(ops)} ops: {err}")
+            time.sleep(0.5)
+
+    def _requeue(self, batch, err):
+        retry = []
+        for enqueued_at, attempt, tries in batch:
+            if tries >= self.max_retries:
+                self._drop((enqueued_at, attempt, tries), f"gave up after {tries + 1} tries: {err}")
+            else:
+                retry.append((enqueued_at, attempt, tries + 1))
+        if not retry:
+            return
+        print(f"[ATTEMPTS] Batch of {len(retry)} attempts failed, will retry: {err}")
+        with self._cond:
+            self.metrics["failed_batches"] += 1
+            self._pending = retry + self._pending
+        time.sleep(0.5)
+
+    def _drop(self, item, reason):
+        attempt = item[1]
+        print(f"[ATTEMPTS] Dropping attempt for session {attempt.get('session_id')}: {reason}")
+        metrics.inc("attempts_dropped")
+        with self._cond:
+            self.metrics["dropped"] += 1
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            lag = (time.monotonic() - self._pending[0][0]) * 1000 if self._pending else 0.0
+            return dict(self.metrics, queued=len(self._pending),
+                        queued_aggregates=len(self._agg_pending), oldest_lag_ms=round(lag, 2))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> AttemptWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AttemptWriter(
+                    batch_size=int(os.getenv("ATTEMPT_BATCH_SIZE", "100")),
+                    flush_interval=float(os.getenv("ATTEMPT_FLUSH_MS", "200")) / 1000.0,
+                    max_queue=int(os.getenv("ATTEMPT_QUEUE_MAX", "10000")),
+                    max_retries=int(os.getenv("ATTEMPT_MAX_RETRIES", "5")),
+                )
+    return _writer
+
+
+def save_attempt(attempt: dict):
+    """Persist an attempt and fold it into its session's aggregates."""
+    if os.getenv("ATTEMPT_WRITE_BEHIND", "1") != "1":
+        db = get_db()
+        db.attempts.insert_one(attempt)
+        db.sessions.bulk_write(aggregate_ops(attempt['session_id'], attempt['scores'], attempt['mistakes']), ordered=True)
+        return
+    get_writer().submit(attempt)
+
+
+def flush(session_id: str = None):
+    if _writer is not None:
+        _writer.flush(session_id)
+
+
+def writer_stats() -> dict:
+    return _writer.stats() if _writer is not None else {"queued": 0}
+
+
+@atexit.register
+def _shutdown():
+    if _writer is not None:
+        _writer.stop()
@@ -0,0 +1,148 @@
+# Text embeddings with batching and a persistent cache.
+# Interview questions repeat constantly, so their vectors are cached in memory
+# (LRU) and in Mongo, keyed by embedding model + text hash. Vectors are kept as
+# float32 arrays and stored as raw bytes.
+
+import os
+import hashlib
+from datetime import datetime
+from typing import List
+import numpy as np
+import google.generativeai as genai
+
+from ..utils.cache import LRUCache
+from ..utils.singleflight import SingleFlight
+from ..utils import metrics
+
+_embeddings_model = None
+_mem_cache = LRUCache(int(os.getenv("EMBED_CACHE_SIZE", "4096")))
+_flight = SingleFlight("embeddings")
+
+
+def get_embeddings_model():
+    global _embeddings_model
+    if _embeddings_model is None:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            # Without API key, callers fall back to heuristics
+            return None
+        genai.configure(api_key=api_key)
+        _embeddings_model = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+    return _embeddings_model
+
+
+def _cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+def _store():
+    # Persistent tier; EMBED_CACHE_STORE=none keeps the cache in memory only
+    if os.getenv("EMBED_CACHE_STORE", "mongo") != "mongo":
+        return None
+    from ..db.mongo import get_db
+    return get_db().embedding_cache
+
+
+def _load_cached(model: str, text: str):
+    key = _cache_key(model, text)
+    vec = _mem_cache.get(key)
+    if vec is not None:
+        metrics.inc("cache_requests", cache="embedding", result="memory")
+        return vec
+    store = _store()
+    if store is None:
+        metrics.inc("cache_requests", cache="embedding", result="miss")
+        return None
+    try:
+        doc = store.find_one({"_id": key}, {"vec": 1})
+    except Exception as e:
+        print(f"[EMBED] Cache lookup failed: {e}")
+        return None
+    metrics.inc("cache_requests", cache="embedding", result="store" if doc else "miss")
+    if not doc:
+        return None
+    vec = np.frombuffer(doc["vec"], dtype=np.float32)
+    _mem_cache.set(key, vec)
+    return vec
+
+
+def _save_cached(model: str, text: str, vec: np.ndarray):
+    key = _cache_key(model, text)
+    _mem_cache.set(key, vec)
+    store = _store()
+    if store is None:
+        return
+    try:
+        store.update_one(
+            {"_id": key},
+            {"$setOnInsert": {
+                "model": model,
+                "dim": int(vec.shape[0]),
+                "vec": vec.tobytes(),
+                "created_at": datetime.utcnow().isoformat() + "Z",
+            }},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"[EMBED] Cache write failed: {e}")
+
+
+def embed_texts(texts: List[str], model: str = None) -> List[np.ndarray]:
+    """Embed several texts with a single API request. Returns float32 vectors."""
+    model = model or get_embeddings_model()
+    if not texts:
+        return []
+    with metrics.span("embedding.request"):
+        resp = genai.embed_content(model=model, content=list(texts))
+    vectors = resp["embedding"]
+    if len(texts) == 1 and vectors and not isinstance(vectors[0], (list, tuple)):
+        vectors = [vectors]
+    return [np.asarray(v, dtype=np.float32) for v in vectors]
+
+
+def embed_cached(texts: List[str], model: str = None) -> List[np.ndarray]:
+    """Embed texts, serving repeated ones from the cache and batching the rest."""
+    model = model or get_embeddings_model()
+    out = [None] * len(texts)
+    missing = []
+    for i, text in enumerate(texts):
+        vec = _load_cached(model, text)
+        if vec is None:
+            missing.append(i)
+        else:
+            out[i] = vec
+    if missing:
+        vectors = embed_texts([texts[i] for i in missing], model)
+        for i, vec in zip(missing, vectors):
+            out[i] = vec
+            _save_cached(model, texts[i], vec)
+    return out
+
+
+def embed_question_answer(question: str, answer: str):
+    """
+    Return (question_vec, answer_vec). The question side is cached; the answer is
+    always embedded fresh, in the same request as the question on a cache miss.
+    Concurrent requests for the same question (or answer) share one upstream call.
+    """
+    model = get_embeddings_model()
+    q_vec = _load_cached(model, question)
+    if q_vec is None:
+        batched = {}
+
+        def lead():
+            qv, av = embed_texts([question, answer], model)
+            _save_cached(model, question, qv)
+            batched["answer"] = av
+            return qv
+
+        q_vec = _flight.do(_cache_key(model, question), lead)
+        if "answer" in batched:
+            return q_vec, batched["answer"]
+    a_vec = _flight.do(_cache_key(model, answer), lambda: embed_texts([answer], model)[0])
+    return q_vec, a_vec
+
+
+def cache_stats() -> dict:
+    return _mem_cache.stats()
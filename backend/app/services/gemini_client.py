@@ -18,6 +18,31 @@ def _get_model():
     _model = genai.GenerativeModel(name)
     return _model
 
+_NO_MODEL_FEEDBACK = (
+    "Great job completing the interview! Focus on the areas mentioned in the report and keep practicing. "
+    "With steady effort, your fluency and confidence will grow!"
+)
+_DEFAULT_FEEDBACK = (
+    "Great job completing the interview! Focus on adding missing articles and smoothing your phrasing. "
+    "Practice pronouncing tricky words and aim for steady, natural pacing. Your ideas are clear—keep it up!"
+)
+
+
+def _feedback_prompt(scores: dict, mistakes: list) -> str:
+    return textwrap.dedent(
+        f"""
+        You are a supportive English coach. Based on the assessment below, write a concise, encouraging
+        feedback paragraph (3-4 sentences). Mention 1-2 key strengths and 2-3 specific, actionable tips.
+        Keep the tone positive and practical.
+        If user speaks any censored words, profanity, or any other inappropriate language, please politely ignore and reply with "I am not sure about that retry.
+        If user asks any other question unrelated to english, please politely ignore and reply with "I am not sure about that retry.
+        
+        Scores (0-100): {scores}
+        Common mistakes: {mistakes}
+        """
+    ).strip()
+
+
 def generate_feedback(scores: dict, mistakes: list) -> str:
     """
     Generate a short, motivational feedback paragraph personalized to the user's performance.
@@ -25,32 +50,31 @@ def generate_feedback(scores: dict, mistakes: list) -> str:
     """
     model = _get_model()
     if model is None:
-        return (
-            "Great job completing the interview! Focus on the areas mentioned in the report and keep practicing. "
-            "With steady effort, your fluency and confidence will grow!"
-        )
+        return _NO_MODEL_FEEDBACK
+
+    try:
+        resp = model.generate_content(_feedback_prompt(scores, mistakes))
+        text = (resp.text or "").strip() if resp else ""
+        if text:
+            return text
+    except Exception:
+        pass
+
+    return _DEFAULT_FEEDBACK
+
+
+async def generate_feedback_async(scores: dict, mistakes: list) -> str:
+    """generate_feedback() through the SDK's async client."""
+    model = _get_model()
+    if model is None:
+        return _NO_MODEL_FEEDBACK
 
     try:
-        prompt = textwrap.dedent(
-            f"""
-            You are a supportive English coach. Based on the assessment below, write a concise, encouraging
-            feedback paragraph (3-4 sentences). Mention 1-2 key strengths and 2-3 specific, actionable tips.
-            Keep the tone positive and practical.
-            If user speaks any censored words, profanity, or any other inappropriate language, please politely ignore and reply with "I am not sure about that retry.
-            If user asks any other question unrelated to english, please politely ignore and reply with "I am not sure about that retry.
-            
-            Scores (0-100): {scores}
-            Common mistakes: {mistakes}
-            """
-        ).strip()
-        resp = model.generate_content(prompt)
+        resp = await model.generate_content_async(_feedback_prompt(scores, mistakes))
         text = (resp.text or "").strip() if resp else ""
         if text:
             return text
     except Exception:
         pass
 
-    return (
-        "Great job completing the interview! Focus on adding missing articles and smoothing your phrasing. "
-        "Practice pronouncing tricky words and aim for steady, natural pacing. Your ideas are clear—keep it up!"
-    )
+    return _DEFAULT_FEEDBACK
@@ -3,11 +3,25 @@
  
 import os
 import json
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
 from typing import Dict
  
 import google.generativeai as genai
+
+from ..utils.cache import LRUCache
+from ..utils.singleflight import SingleFlight, AsyncSingleFlight
+from ..utils import metrics
  
 _gen_model = None
+
+# Bump whenever the Gemini prompt below changes so cached analyses are not reused
+PROMPT_VERSION = "1"
+_result_cache = LRUCache(int(os.getenv("GRAMMAR_CACHE_SIZE", "20000")),
+                         ttl=float(os.getenv("GRAMMAR_CACHE_TTL_SEC", "86400")))
+_flight = SingleFlight("gemini_grammar")
+_async_flight = AsyncSingleFlight("gemini_grammar_async")
  
  
 def _get_model():
@@ -39,72 +53,186 @@ def _safe_parse_json(s: str):
        return None
  
  
-def analyze_grammar(text: str) -> Dict:
-    """
-    Analyze grammar using Google Generative AI if configured. Expected output:
-    {
-      "correction": str,
-      "score": int (0-100),
-      "fluency": int (0-100),
-      "mistakes": [str]
-    }
-    Falls back to simple rule-based correction if API is not configured or fails.
-    """
-    model = _get_model()
-    if model is not None and text:
-        try:
-            import time
-            t0 = time.time()
-            prompt = (
-                "You are an English grammar evaluator. Given a student's answer, return STRICT JSON ONLY with keys:\n"
-                "correction: string (rewritten, corrected answer),\n"
-                "score: integer 0-100 (grammar quality),\n"
-                "fluency: integer 0-100 (speech fluency guess),\n"
-                "mistakes: array of short strings (what was wrong).\n\n"
-                "IMPORTANT: If the input contains ANY profanity, swear words, or inappropriate language:\n"
-                "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
-                "- Set score to 0\n"
-                "- Set mistakes to ['inappropriate language']\n"
-                "- Do NOT provide the actual corrected profane sentence\n\n"
-                "If user asks questions unrelated to English learning:\n"
-                "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
-                "- Set score to 0\n\n"
-                f"Original: {text}\n"
-                "Output:"
-            )
-            # Add request timeout to avoid hangs
+def normalize_transcript(text: str) -> str:
+    """Collapse whitespace and case so trivially different transcripts share a cache entry."""
+    return " ".join((text or "").split()).casefold()
+
+
+def _cache_key(text: str) -> str:
+    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    raw = f"{model_name}|{PROMPT_VERSION}|{normalize_transcript(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_store():
+    # Persistent tier shared by all workers; GRAMMAR_CACHE_STORE=none disables it
+    if os.getenv("GRAMMAR_CACHE_STORE", "mongo") != "mongo":
+        return None
+    from ..db.mongo import get_db
+    return get_db().grammar_cache
+
+
+def _cache_get(key: str):
+    result = _result_cache.get(key)
+    if result is not None:
+        metrics.inc("cache_requests", cache="grammar", result="memory")
+        return result
+    return _store_get(key)
+
+
+def _store_get(key: str):
+    store = _cache_store()
+    if store is None:
+        metrics.inc("cache_requests", cache="grammar", result="miss")
+        return None
+    try:
+        doc = store.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"result": 1})
+    except Exception as e:
+        print(f"[GRAMMAR] Cache lookup failed: {e}")
+        return None
+    metrics.inc("cache_requests", cache="grammar", result="store" if doc else "miss")
+    if not doc:
+        return None
+    _result_cache.set(key, doc["result"])
+    return doc["result"]
+
+
+def _cache_put(key: str, result: Dict):
+    _result_cache.set(key, result)
+    store = _cache_store()
+    if store is None:
+        return
+    try:
+        ttl = float(os.getenv("GRAMMAR_CACHE_TTL_SEC", "86400"))
+        store.replace_one(
+            {"_id": key},
+            {"_id": key, "result": result, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"[GRAMMAR] Cache write failed: {e}")
+
+
+def cache_stats() -> Dict:
+    return _result_cache.stats()
+
+
+def _build_prompt(text: str) -> str:
+    return (
+        "You are an English grammar evaluator. Given a student's answer, return STRICT JSON ONLY with keys:\n"
+        "correction: string (rewritten, corrected answer),\n"
+        "score: integer 0-100 (grammar quality),\n"
+        "fluency: integer 0-100 (speech fluency guess),\n"
+        "mistakes: array of short strings (what was wrong).\n\n"
+        "IMPORTANT: If the input contains ANY profanity, swear words, or inappropriate language:\n"
+        "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
+        "- Set score to 0\n"
+        "- Set mistakes to ['inappropriate language']\n"
+        "- Do NOT provide the actual corrected profane sentence\n\n"
+        "If user asks questions unrelated to English learning:\n"
+        "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
+        "- Set score to 0\n\n"
+        f"Original: {text}\n"
+        "Output:"
+    )
+
+
+def _parse_result(resp, text: str):
+    """Turn a Gemini response into an analysis dict, or None when it is unusable."""
+    raw_response = (resp.text or "") if resp else ""
+    data = _safe_parse_json(raw_response)
+    if not isinstance(data, dict):
+        metrics.inc("gemini_unparseable")
+        return None
+    if "correction" not in data:
+        return None
+    correction = str(data.get("correction", "")).strip() or text
+    score = int(float(data.get("score", 80)))
+    fluency = int(float(data.get("fluency", 75)))
+    mistakes = data.get("mistakes") or []
+    if not isinstance(mistakes, list):
+        mistakes = [str(mistakes)]
+
+    # Safety check: if correction still contains profanity, override it. Transcripts are
+    # moderated before analysis, so an unchanged correction needs no second scan.
+    from .moderation import is_allowed
+    if correction not in (text, "I am not sure about that, please retry.") and not is_allowed(correction):
+        print(f"[GRAMMAR] Safety override: correction contained profanity")
+        correction = "I am not sure about that, please retry."
+        score = 0
+        mistakes = ["inappropriate language"]
+    return {"correction": correction, "score": score, "fluency": fluency, "mistakes": mistakes}
+
+
+def _gemini_analyze(model, text: str, key: str):
+    """One Gemini round trip; returns the parsed result (and caches it) or None on failure."""
+    try:
+        prompt = _build_prompt(text)
+        # Add request timeout to avoid hangs
+        with metrics.span("gemini.request"):
             try:
                 resp = model.generate_content(prompt, request_options={"timeout": float(os.getenv("GEMINI_TIMEOUT_SEC", "12"))})
             except TypeError:
                 # Older SDKs may not support request_options; fall back without it
                 resp = model.generate_content(prompt)
-            raw_response = (resp.text or "") if resp else ""
-            print(f"[GRAMMAR] Raw Gemini response: {raw_response}")
-            data = _safe_parse_json(raw_response)
-            print(f"[GRAMMAR] Parsed data: {data}")
-            if isinstance(data, dict) and "correction" in data:
-                correction = str(data.get("correction", "")).strip() or text
-                score = int(float(data.get("score", 80)))
-                fluency = int(float(data.get("fluency", 75)))
-                mistakes = data.get("mistakes") or []
-                if not isinstance(mistakes, list):
-                    mistakes = [str(mistakes)]
-                
-                # Safety check: if correction still contains profanity, override it
-                from .moderation import is_allowed
-                if not is_allowed(correction) and correction != "I am not sure about that, please retry.":
-                    print(f"[GRAMMAR] Safety override: correction contained profanity")
-                    correction = "I am not sure about that, please retry."
-                    score = 0
-                    mistakes = ["inappropriate language"]
-                
-                dt = time.time() - t0
-                print(f"[GRAMMAR] Gemini analysis completed in {dt:.2f}s")
-                return {"correction": correction, "score": score, "fluency": fluency, "mistakes": mistakes}
-        except Exception as e:
-            print(f"[GRAMMAR] Gemini analysis failed: {e}")
- 
-    # Fallback heuristic
+        result = _parse_result(resp, text)
+        if result is not None:
+            _cache_put(key, result)
+            return result
+    except Exception as e:
+        print(f"[GRAMMAR] Gemini analysis failed: {e}")
+    return None
+
+
+async def _gemini_analyze_async(model, text: str, key: str):
+    try:
+        with metrics.span("gemini.request"):
+            resp = await model.generate_content_async(
+                _build_prompt(text), request_options={"timeout": float(os.getenv("GEMINI_TIMEOUT_SEC", "12"))})
+        result = _parse_result(resp, text)
+        if result is not None:
+            await asyncio.to_thread(_cache_put, key, result)
+            return result
+    except Exception as e:
+        print(f"[GRAMMAR] Gemini analysis failed: {e}")
+    return None
+
+
+def analyze_gemini(text: str):
+    """Gemini analysis (cached, coalesced); None when Gemini is unconfigured or fails."""
+    model = _get_model()
+    if model is None or not text:
+        return None
+    key = _cache_key(text)
+    result = _cache_get(key)
+    if result is None:
+        result = _flight.do(key, lambda: _gemini_analyze(model, text, key))
+    if result is None:
+        return None
+    # Copy so callers cannot mutate the shared cached result
+    return dict(result, mistakes=list(result.get("mistakes") or []))
+
+
+async def analyze_gemini_async(text: str):
+    """analyze_gemini() for the async serving mode, using the SDK's async client."""
+    model = _get_model()
+    if model is None or not text:
+        return None
+    key = _cache_key(text)
+    result = _result_cache.get(key)
+    if result is not None:
+        metrics.inc("cache_requests", cache="grammar", result="memory")
+    else:
+        result = await asyncio.to_thread(_store_get, key)
+    if result is None:
+        result = await _async_flight.do(key, lambda: _gemini_analyze_async(model, text, key))
+    if result is None:
+        return None
+    return dict(result, mistakes=list(result.get("mistakes") or []))
+
+
+def heuristic_grammar(text: str) -> Dict:
+    """Deterministic rule-based analysis used when no model is available or in time."""
     correction = text.replace("I am student", "I am a student").replace("and like", "and I like")
     score = 75 if correction != text else 90
     fluency = 72
@@ -0,0 +1,271 @@
+# Pluggable grammar providers with hedging and circuit breakers.
+# Providers are tried in configured order. If the active provider has not
+# answered by its recent p95 latency, the next provider is started in parallel
+# (a hedge) and the first usable answer wins. Providers that keep failing are
+# skipped for a cooldown period. The deterministic heuristic is always last.
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict
+
+from .grammar import analyze_gemini, analyze_gemini_async, heuristic_grammar
+from .llama import generate_analysis as analyze_llama, generate_analysis_async as analyze_llama_async
+from ..utils import metrics
+
+
+class Provider:
+    """A named grammar backend plus its latency window and circuit-breaker state."""
+
+    def __init__(self, name: str, fn, enabled=None, afn=None):
+        self.name = name
+        self.fn = fn
+        self.afn = afn
+        self.enabled = enabled or (lambda: True)
+        self.latencies = deque(maxlen=int(os.getenv("GRAMMAR_LATENCY_WINDOW", "200")))
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.counters = {"calls": 0, "ok": 0, "failed": 0, "hedged": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def p95(self):
+        with self._lock:
+            if len(self.latencies) < 10:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def try_acquire(self) -> bool:
+        """True when a call may go to this provider (breaker closed or half-open trial)."""
+        with self._lock:
+            if self.open_until == 0.0:
+                return True
+            if time.monotonic() >= self.open_until and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.counters["skipped"] += 1
+            return False
+
+    def record(self, ok: bool, latency: float):
+        threshold = int(os.getenv("GRAMMAR_BREAKER_FAILURES", "5"))
+        cooldown = float(os.getenv("GRAMMAR_BREAKER_COOLDOWN_SEC", "30"))
+        with self._lock:
+            self.counters["calls"] += 1
+            self.trial_in_flight = False
+            if ok:
+                self.counters["ok"] += 1
+                self.latencies.append(latency)
+                self.failures = 0
+                self.open_until = 0.0
+                return
+            self.counters["failed"] += 1
+            self.failures += 1
+            if self.failures >= threshold:
+                if self.open_until == 0.0 or time.monotonic() >= self.open_until:
+                    print(f"[GRAMMAR] Circuit open for provider '{self.name}' ({self.failures} failures)")
+                self.open_until = time.monotonic() + cooldown
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        with self._lock:
+            return dict(self.counters, p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+                        open=self.open_until > time.monotonic(), consecutive_failures=self.failures)
+
+
+_providers = {}
+_executor = None
+_executor_lock = threading.Lock()
+_background = set()
+
+
+def register(name: str, fn, enabled=None, afn=None):
+    """
+    Register a provider; fn(text) returns an analysis dict, or None/raises on failure.
+    afn is an optional coroutine function with the same contract for the async
+    serving mode; without it fn runs on a worker thread there.
+    """
+    _providers[name] = Provider(name, fn, enabled, afn)
+
+
+register("gemini", analyze_gemini, enabled=lambda: bool(os.getenv("GOOGLE_API_KEY")),
+         afn=analyze_gemini_async)
+register("llama", analyze_llama,
+         enabled=lambda: os.getenv("LLAMA_MODE", "1") == "1" and os.getenv("FORCE_GEMINI", "0") != "1",
+         afn=analyze_llama_async)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.getenv("GRAMMAR_PROVIDER_WORKERS", "32")),
+                                               thread_name_prefix="grammar-provider")
+    return _executor
+
+
+def provider_order():
+    """
+    Providers to use, in order. GRAMMAR_PROVIDERS (e.g. "gemini,llama") overrides the
+    default, which keeps the historical choice: Gemini alone when a Google key is set,
+    otherwise the local Llama server. With a Google key, Llama is only added as the
+    fallback when LLAMA_URL or LLAMA_MODE is set explicitly.
+    """
+    configured = os.getenv("GRAMMAR_PROVIDERS")
+    if configured:
+        names = [n.strip() for n in configured.split(",") if n.strip()]
+    elif os.getenv("GOOGLE_API_KEY"):
+        names = ["gemini", "llama"] if (os.getenv("LLAMA_URL") or os.getenv("LLAMA_MODE")) else ["gemini"]
+    else:
+        names = ["llama"]
+    return [_providers[n] for n in names if n in _providers and _providers[n].enabled()]
+
+
+def _call(provider: Provider, text: str):
+    t0 = time.perf_counter()
+    try:
+        result = provider.fn(text)
+    except Exception as e:
+        print(f"[GRAMMAR] Provider '{provider.name}' failed: {e}")
+        result = None
+    return _finish_call(provider, result, time.perf_counter() - t0)
+
+
+async def _call_async(provider: Provider, text: str):
+    t0 = time.perf_counter()
+    try:
+        if provider.afn is not None:
+            result = await provider.afn(text)
+        else:
+            result = await asyncio.to_thread(provider.fn, text)
+    except Exception as e:
+        print(f"[GRAMMAR] Provider '{provider.name}' failed: {e}")
+        result = None
+    return _finish_call(provider, result, time.perf_counter() - t0)
+
+
+def _finish_call(provider: Provider, result, elapsed: float):
+    provider.record(result is not None, elapsed)
+    metrics.record(f"grammar.{provider.name}", elapsed)
+    metrics.inc("grammar_provider_calls", provider=provider.name, outcome="ok" if result is not None else "error")
+    return result
+
+
+def _hedge_delay(provider: Provider) -> float:
+    p95 = provider.p95()
+    if p95 is None:
+        p95 = float(os.getenv("GRAMMAR_HEDGE_DEFAULT_MS", "3000")) / 1000.0
+    lo = float(os.getenv("GRAMMAR_HEDGE_MIN_MS", "250")) / 1000.0
+    return max(lo, p95)
+
+
+def score_grammar(text: str) -> Dict:
+    """
+    Analyze `text` with the configured providers, hedging slow ones and failing over
+    on errors, within GRAMMAR_DEADLINE_SEC. The result carries a `provider` key.
+    """
+    if not text:
+        return dict(heuristic_grammar(text), provider="heuristic")
+    deadline = time.monotonic() + float(os.getenv("GRAMMAR_DEADLINE_SEC", "12"))
+    hedging = os.getenv("GRAMMAR_HEDGING", "1") == "1"
+    queue = list(provider_order())
+    running = {}
+
+    def launch():
+        while queue:
+            provider = queue.pop(0)
+            if provider.try_acquire():
+                running[_get_executor().submit(metrics.wrap(_call), provider, text)] = provider
+                return provider
+        return None
+
+    current = launch()
+    while running:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = min(remaining, _hedge_delay(current)) if (hedging and queue) else remaining
+        done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # The active provider is slower than its p95: start the next one alongside it
+            hedge = launch()
+            if hedge is not None:
+                with current._lock:
+                    current.counters["hedged"] += 1
+                metrics.inc("grammar_hedges", provider=current.name)
+                current = hedge
+            continue
+        for fut in done:
+            provider = running.pop(fut)
+            result = fut.result()
+            if result is not None:
+                # Losing hedges keep running in the background and still feed their stats
+                metrics.inc("grammar_results", provider=provider.name)
+                return dict(result, provider=provider.name)
+        if not running:
+            # Every in-flight provider failed: fail over to the next one
+            current = launch() or current
+
+    metrics.inc("grammar_results", provider="heuristic")
+    return dict(heuristic_grammar(text), provider="heuristic")
+
+
+async def score_grammar_async(text: str) -> Dict:
+    """score_grammar() on the running event loop, with the same hedging and failover."""
+    if not text:
+        return dict(heuristic_grammar(text), provider="heuristic")
+    deadline = time.monotonic() + float(os.getenv("GRAMMAR_DEADLINE_SEC", "12"))
+    hedging = os.getenv("GRAMMAR_HEDGING", "1") == "1"
+    queue = list(provider_order())
+    running = {}
+
+    def launch():
+        while queue:
+            provider = queue.pop(0)
+            if provider.try_acquire():
+                running[asyncio.ensure_future(_call_async(provider, text))] = provider
+                return provider
+        return None
+
+    def detach():
+        # Losing hedges keep running so their latency and failures still feed the breaker
+        for task in running:
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+    current = launch()
+    while running:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = min(remaining, _hedge_delay(current)) if (hedging and queue) else remaining
+        done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            hedge = launch()
+            if hedge is not None:
+                with current._lock:
+                    current.counters["hedged"] += 1
+                metrics.inc("grammar_hedges", provider=current.name)
+                current = hedge
+            continue
+        for task in done:
+            provider = running.pop(task)
+            result = task.result()
+            if result is not None:
+                detach()
+                metrics.inc("grammar_results", provider=provider.name)
+                return dict(result, provider=provider.name)
+        if not running:
+            current = launch() or current
+
+    detach()
+    metrics.inc("grammar_results", provider="heuristic")
+    return dict(heuristic_grammar(text), provider="heuristic")
+
+
+def provider_stats() -> dict:
+    return {name: p.stats() for name, p in _providers.items()}
@@ -0,0 +1,150 @@
+# Rhubarb lip-sync: resolves the executable once, reads cues from stdout,
+# and runs a bounded number of Rhubarb processes in parallel. Jobs can be
+# awaited inline or polled later by id so audio is not held back by visemes.
+
+import os
+import json
+import time
+import uuid
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from ..utils import metrics
+
+_rhubarb_path = None
+_pool = None
+_pool_lock = threading.Lock()
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _resolve_rhubarb() -> str:
+    global _rhubarb_path
+    if _rhubarb_path is not None:
+        return _rhubarb_path
+    rhubarb_path = os.getenv("RHUBARB_PATH", "rhubarb")  # Use PATH by default
+    # Resolve Windows-specific cases: if a folder is provided, append rhubarb.exe
+    try:
+        rp = rhubarb_path.strip().strip('"').strip("'")
+        if os.path.isdir(rp):
+            candidate = os.path.join(rp, "rhubarb.exe")
+            if os.path.isfile(candidate):
+                rhubarb_path = candidate
+        else:
+            # If file without extension but .exe exists next to it, use that
+            root, ext = os.path.splitext(rp)
+            if ext == "" and os.path.isfile(root + ".exe"):
+                rhubarb_path = root + ".exe"
+            elif not os.path.isfile(rp):
+                rhubarb_path = shutil.which(rp) or rhubarb_path
+    except Exception:
+        pass
+    print(f"[Rhubarb] Resolved path: {rhubarb_path}")
+    _rhubarb_path = rhubarb_path
+    return _rhubarb_path
+
+
+def run_rhubarb(wav_path: str) -> List[Dict]:
+    rhubarb_path = _resolve_rhubarb()
+    # Rhubarb only reads audio from a file path (it has no stdin input), so the WAV
+    # stays on disk; without -o it prints the JSON cues to stdout, so no output file
+    cmd = [rhubarb_path, "-f", "json", "--quiet"]
+    recognizer = os.getenv("RHUBARB_RECOGNIZER")
+    if recognizer:
+        cmd += ["-r", recognizer]
+    cmd.append(wav_path)
+    try:
+        with metrics.span("rhubarb"):
+            proc = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=float(os.getenv("RHUBARB_TIMEOUT_SEC", "20")))
+        data = json.loads(proc.stdout or "{}")
+        cues = data.get("mouthCues") or []
+        cleaned = []
+        for c in cues:
+            try:
+                cleaned.append({
+                    "start": float(c.get("start",0.0)),
+                    "end": float(c.get("end",0.0)),
+                    "value": str(c.get("value","X"))
+                })
+            except Exception:
+                continue
+        return cleaned
+    except FileNotFoundError:
+        metrics.inc("rhubarb_failures", reason="not_found")
+        print(f"[Rhubarb] ERROR: Rhubarb executable not found. RHUBARB_PATH='{rhubarb_path}'. Set RHUBARB_PATH to full path of rhubarb.exe or ensure it's in PATH.")
+        return []
+    except subprocess.TimeoutExpired:
+        metrics.inc("rhubarb_failures", reason="timeout")
+        print("[Rhubarb] ERROR: Rhubarb timed out. Increase RHUBARB_TIMEOUT_SEC or check the executable path and WAV file.")
+        return []
+    except subprocess.CalledProcessError as e:
+        metrics.inc("rhubarb_failures", reason="exit_code")
+        print(f"[Rhubarb] ERROR: Rhubarb process failed with exit code {e.returncode}.")
+        print(f"[Rhubarb] STDOUT: {e.stdout}")
+        print(f"[Rhubarb] STDERR: {e.stderr}")
+        return []
+    except Exception as e:
+        print(f"[Rhubarb] ERROR: An unexpected error occurred while running Rhubarb: {e}")
+        return []
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = int(os.getenv("RHUBARB_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rhubarb")
+    return _pool
+
+
+def submit(wav_path: str, on_done=None):
+    """
+    Queue Rhubarb for `wav_path` on the bounded pool and return a Future of the cues.
+    The WAV file is deleted once Rhubarb has read it. `on_done(visemes)` runs on the
+    pool thread after a successful run.
+    """
+    def job():
+        try:
+            visemes = run_rhubarb(wav_path)
+        finally:
+            try:
+                os.remove(wav_path)
+            except Exception:
+                pass
+        if on_done is not None:
+            try:
+                on_done(visemes)
+            except Exception as e:
+                print(f"[Rhubarb] Completion callback failed: {e}")
+        return visemes
+    return _get_pool().submit(job)
+
+
+def register_job(future, job_id: str = None) -> str:
+    """Track a lip-sync Future so clients can poll for it by id."""
+    ttl = float(os.getenv("RHUBARB_JOB_TTL_SEC", "300"))
+    now = time.time()
+    job_id = job_id or uuid.uuid4().hex
+    with _jobs_lock:
+        for jid in [j for j, (_, created) in _jobs.items() if now - created > ttl]:
+            del _jobs[jid]
+        _jobs[job_id] = (future, now)
+    return job_id
+
+
+def get_job(job_id: str):
+    """Return {"status": "pending"|"done"|"error", "visemes": [...]} or None if unknown."""
+    with _jobs_lock:
+        entry = _jobs.get(job_id)
+    if entry is None:
+        return None
+    future = entry[0]
+    if not future.done():
+        return {"status": "pending", "visemes": []}
+    if future.exception() is not None:
+        return {"status": "error", "visemes": []}
+    return {"status": "done", "visemes": future.result()}
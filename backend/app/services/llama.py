@@ -0,0 +1,345 @@
+# Grammar analysis through a local Ollama (Llama) server.
+# Uses one pooled keep-alive HTTP session, retries with jittered backoff, limits
+# concurrent generations to the server's slots, and can consume the streaming
+# API so a response is used as soon as its JSON object is complete.
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..utils.singleflight import SingleFlight, AsyncSingleFlight
+
+# httpx is only needed by the async serving mode (app.asgi)
+try:
+    import httpx  # type: ignore
+    _HAS_HTTPX = True
+except Exception:
+    _HAS_HTTPX = False
+
+_session = None
+_session_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, int(os.getenv("LLAMA_SLOTS", "4"))))
+
+_flight = SingleFlight("llama_grammar")
+_async_flight = AsyncSingleFlight("llama_grammar_async")
+_async_client = None
+_async_slots = None
+
+_CORRECTION_RE = re.compile(r'"correction"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                size = max(1, int(os.getenv("LLAMA_SLOTS", "4"))) * 2
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+def _build_prompt(transcript: str) -> str:
+    return (
+        "You are an English grammar editor. Give a answer based on the grammar and semantics of input, output STRICT JSON only with keys:\n"
+        "Correct the grammer and semantics of input and return it.\n"
+        "correction: string (a rewritten, corrected answer of user input; NEVER identical to input),\n"
+        "score: integer 0-100 (grammar quality),\n"
+        "fluency: integer 0-100,\n"
+        "mistakes: array of short strings (what you fixed).\n"
+        "Always rewrite even if the input seems correct by slightly improving phrasing.\n\n"
+        "IMPORTANT: If the input contains ANY profanity, swear words, or inappropriate language:\n"
+        "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
+        "- Set score to 0\n"
+        "- Set mistakes to ['inappropriate language']\n"
+        "- Do NOT provide the actual corrected profane sentence\n\n"
+        "If user asks questions unrelated to English learning:\n"
+        "- Set correction to EXACTLY: 'I am not sure about that, please retry.'\n"
+        "- Set score to 0\n\n"
+        "Don't extend more than number in lines given in the input.\n"
+        f"Answer: {transcript}\n"
+        "Output:"
+    )
+
+
+class _JsonObjectScanner:
+    """Tracks string/escape state and brace depth to tell when a streamed JSON object closes."""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; return True once the top-level object is complete."""
+        for ch in chunk:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return True
+        return False
+
+
+def _parse_output(text: str):
+    cleaned = "\n".join([ln for ln in text.splitlines() if not ln.strip().startswith('```')]).strip()
+    return json.loads(cleaned)
+
+
+def _generate_stream(url: str, payload: dict, timeout: float, early_return: bool, deadline: float):
+    """
+    Read Ollama's NDJSON stream, stopping as soon as the answer is usable.
+    `timeout` only bounds each read, so the stream is also cut off at `deadline`
+    (time.monotonic()); leaving the block closes the response and frees the slot.
+    """
+    scanner = _JsonObjectScanner()
+    buf = []
+    with _get_session().post(url, json=dict(payload, stream=True), stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if time.monotonic() > deadline:
+                raise requests.Timeout("Llama generation exceeded its deadline")
+            if not line:
+                continue
+            event = json.loads(line)
+            piece = event.get("response", "")
+            buf.append(piece)
+            if early_return:
+                m = _CORRECTION_RE.search("".join(buf))
+                if m:
+                    # Closing the response stops generation on the server and frees the slot
+                    return {"correction": json.loads(f'"{m.group(1)}"')}
+            if scanner.feed(piece) or event.get("done"):
+                # format=json models may keep emitting whitespace after the object closes
+                break
+    return _parse_output("".join(buf))
+
+
+def _generate(url: str, payload: dict, timeout: float):
+    resp = _get_session().post(url, json=dict(payload, stream=False), timeout=timeout)
+    resp.raise_for_status()
+    return _parse_output(resp.json().get("response", ""))
+
+
+def _is_retryable(err: Exception) -> bool:
+    if isinstance(err, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code == 429 or err.response.status_code >= 500
+    return False
+
+
+def generate_analysis(transcript: str):
+    """
+    Grammar analysis through a local Ollama server. Returns
+    {"correction", "score", "fluency", "mistakes"}, or None when Llama gives no
+    usable answer. Concurrent calls with an identical prompt share one generation.
+    """
+    model = os.getenv('LLAMA_MODEL', 'llama3.1')
+    key = hashlib.sha256(f"{model}|{transcript}".encode("utf-8")).hexdigest()
+    result = _flight.do(key, lambda: _analyze(transcript))
+    if result is None:
+        return None
+    return dict(result, mistakes=list(result['mistakes']))
+
+
+def _request_payload(transcript: str) -> dict:
+    return {
+        'model': os.getenv('LLAMA_MODEL', 'llama3.1'),
+        'prompt': _build_prompt(transcript),
+        'format': 'json',
+        'options': {
+            'temperature': 0.2,
+            'num_ctx': 4096
+        },
+        'keep_alive': os.getenv('LLAMA_KEEP_ALIVE', '30m'),
+    }
+
+
+def _deadline() -> float:
+    # Overall budget for one analysis, retries included; defaults to the provider deadline
+    return time.monotonic() + float(os.getenv('LLAMA_DEADLINE_SEC', os.getenv('GRAMMAR_DEADLINE_SEC', '12')))
+
+
+def _analyze(transcript: str):
+    url = os.getenv('LLAMA_URL', 'http://localhost:11434/api/generate')
+    payload = _request_payload(transcript)
+    deadline = _deadline()
+    timeout = float(os.getenv('LLAMA_TIMEOUT_SEC', '8'))
+    retries = int(os.getenv('LLAMA_RETRIES', '2'))
+    backoff = float(os.getenv('LLAMA_BACKOFF_SEC', '0.2'))
+    stream = os.getenv('LLAMA_STREAM', '1') == '1'
+    early_return = os.getenv('LLAMA_EARLY_RETURN', '0') == '1'
+
+    data = None
+    if _slots.acquire(timeout=float(os.getenv('LLAMA_QUEUE_TIMEOUT_SEC', '10'))):
+        try:
+            for attempt in range(retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print("[LLAMA] Deadline reached")
+                    break
+                try:
+                    if stream:
+                        data = _generate_stream(url, payload, min(timeout, remaining), early_return, deadline)
+                    else:
+                        data = _generate(url, payload, min(timeout, remaining))
+                    break
+                except Exception as e:
+                    if attempt >= retries or not _is_retryable(e) or time.monotonic() >= deadline:
+                        print(f"[LLAMA] Request failed: {e}")
+                        break
+                    # Full jitter keeps a burst of retries from hitting the server in lockstep
+                    time.sleep(random.uniform(0, backoff * (2 ** attempt)))
+        finally:
+            _slots.release()
+    else:
+        print("[LLAMA] All model slots busy")
+        return None
+    return _to_result(data, transcript)
+
+
+def _to_result(data, transcript: str):
+    if not isinstance(data, dict):
+        return None
+    correction = str(data.get('correction', transcript)) or transcript
+    m = data.get('mistakes')
+    mistakes = m if isinstance(m, list) else []
+    try:
+        grammar_score = int(float(data['score']))
+        fluency = int(float(data['fluency']))
+    except (KeyError, TypeError, ValueError):
+        # Early return (correction only) or malformed scores: keep Llama's correction but
+        # score with the deterministic heuristic rather than inventing numbers
+        from .grammar import heuristic_grammar
+        fallback = heuristic_grammar(transcript)
+        grammar_score = int(float(data['score'])) if _is_number(data.get('score')) else fallback['score']
+        fluency = int(float(data['fluency'])) if _is_number(data.get('fluency')) else fallback['fluency']
+        if 'mistakes' not in data:
+            mistakes = fallback['mistakes']
+    return {'correction': correction, 'score': grammar_score, 'fluency': fluency, 'mistakes': mistakes}
+
+
+def _is_number(value) -> bool:
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _get_async_client():
+    global _async_client, _async_slots
+    if _async_client is None:
+        slots = max(1, int(os.getenv("LLAMA_SLOTS", "4")))
+        _async_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=slots * 2,
+                                                               max_keepalive_connections=slots * 2))
+        _async_slots = asyncio.Semaphore(slots)
+    return _async_client
+
+
+async def _generate_stream_async(client, url: str, payload: dict, timeout: float, early_return: bool,
+                                 deadline: float):
+    scanner = _JsonObjectScanner()
+    buf = []
+    async with client.stream("POST", url, json=dict(payload, stream=True), timeout=timeout) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if time.monotonic() > deadline:
+                raise httpx.ReadTimeout("Llama generation exceeded its deadline")
+            if not line:
+                continue
+            event = json.loads(line)
+            piece = event.get("response", "")
+            buf.append(piece)
+            if early_return:
+                m = _CORRECTION_RE.search("".join(buf))
+                if m:
+                    return {"correction": json.loads(f'"{m.group(1)}"')}
+            if scanner.feed(piece) or event.get("done"):
+                break
+    return _parse_output("".join(buf))
+
+
+def _is_retryable_async(err: Exception) -> bool:
+    if isinstance(err, httpx.TransportError):
+        return True
+    if isinstance(err, httpx.HTTPStatusError):
+        return err.response.status_code == 429 or err.response.status_code >= 500
+    return False
+
+
+async def _analyze_async(transcript: str):
+    url = os.getenv('LLAMA_URL', 'http://localhost:11434/api/generate')
+    payload = _request_payload(transcript)
+    deadline = _deadline()
+    timeout = float(os.getenv('LLAMA_TIMEOUT_SEC', '8'))
+    retries = int(os.getenv('LLAMA_RETRIES', '2'))
+    backoff = float(os.getenv('LLAMA_BACKOFF_SEC', '0.2'))
+    stream = os.getenv('LLAMA_STREAM', '1') == '1'
+    early_return = os.getenv('LLAMA_EARLY_RETURN', '0') == '1'
+    client = _get_async_client()
+
+    try:
+        await asyncio.wait_for(_async_slots.acquire(), float(os.getenv('LLAMA_QUEUE_TIMEOUT_SEC', '10')))
+    except asyncio.TimeoutError:
+        print("[LLAMA] All model slots busy")
+        return None
+    data = None
+    try:
+        for attempt in range(retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print("[LLAMA] Deadline reached")
+                break
+            try:
+                if stream:
+                    data = await _generate_stream_async(client, url, payload, min(timeout, remaining),
+                                                        early_return, deadline)
+                else:
+                    resp = await client.post(url, json=dict(payload, stream=False), timeout=min(timeout, remaining))
+                    resp.raise_for_status()
+                    data = _parse_output(resp.json().get("response", ""))
+                break
+            except Exception as e:
+                if attempt >= retries or not _is_retryable_async(e) or time.monotonic() >= deadline:
+                    print(f"[LLAMA] Request failed: {e}")
+                    break
+                await asyncio.sleep(random.uniform(0, backoff * (2 ** attempt)))
+    finally:
+        _async_slots.release()
+    return _to_result(data, transcript)
+
+
+async def generate_analysis_async(transcript: str):
+    """Async generate_analysis() over httpx; requires the httpx package."""
+    if not _HAS_HTTPX:
+        return await asyncio.to_thread(generate_analysis, transcript)
+    model = os.getenv('LLAMA_MODEL', 'llama3.1')
+    key = hashlib.sha256(f"{model}|{transcript}".encode("utf-8")).hexdigest()
+    result = await _async_flight.do(key, lambda: _analyze_async(transcript))
+    if result is None:
+        return None
+    return dict(result, mistakes=list(result['mistakes']))
@@ -1,8 +1,171 @@
-# Simple profanity/negativity filter placeholder
+# Profanity filter.
+# Lexicon terms (single words, `prefix*` stems and multi-word phrases) are compiled
+# into one trie-shaped regular expression, so a scan is a single left-to-right pass
+# in the regex engine regardless of lexicon size. Text is first normalized without
+# changing its length (case, accents, leetspeak, spelled-out letters), so match
+# spans index straight into the original text. The pattern itself tolerates
+# masked vowels ("f*ck"), separators between letters ("f.u.c.k") and stretched
+# letters ("fuuuck").
+
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List
 
 BANNED = {"damn", "shit", "fuck"}
 
+# Leetspeak and look-alike characters; every replacement is one character
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s", "+": "t"})
+# "!" and "|" read as "i" only inside a word ("sh!t"), not as punctuation
+_BANG_I = re.compile(r"[!|](?=[a-z*])")
+# Three or more single letters separated by single spaces ("f u c k")
+_SPELLED = re.compile(r"(?<![\w*])(?:[a-z*] ){2,}[a-z*](?![\w*])")
+
+_VOWELS = set("aeiouy")
+_SEP = r"[.\-_~]?"
+_GAP = r"[\W_]+"
+
+
+def normalize(text: str) -> str:
+    """Lowercased, accent-free, de-leeted copy of `text` with the same length."""
+    low = text.lower()
+    if len(low) != len(text) or not low.isascii():
+        chars = []
+        for ch in text:
+            c = ch.lower()
+            c = c if len(c) == 1 else ch
+            if not c.isascii():
+                c = unicodedata.normalize("NFKD", c)[0]
+            chars.append(c)
+        low = "".join(chars)
+    low = _BANG_I.sub("i", low.translate(_LEET))
+    if " " in low:
+        low = _SPELLED.sub(lambda m: m.group(0).replace(" ", "."), low)
+    return low
+
+
+def _units(term: str):
+    """Trie keys for a lexicon term: ('w', letter, first_in_word) and ('gap',) between words."""
+    prefix = term.endswith("*")
+    words = re.findall(r"[a-z0-9*]+", normalize(term.rstrip("*")))
+    units = []
+    for i, word in enumerate(words):
+        if i:
+            units.append(("gap",))
+        units.extend(("w", ch, j == 0) for j, ch in enumerate(word))
+    return tuple(units), prefix
+
+
+def _unit_pattern(unit) -> str:
+    if unit[0] == "gap":
+        return _GAP
+    _, ch, first = unit
+    letter = f"[{ch}*]" if ch in _VOWELS else re.escape(ch)
+    # One occurrence, or a stretched run of three or more
+    return ("" if first else _SEP) + f"{letter}(?:{re.escape(ch)}{{2,}})?"
+
+
+class Moderator:
+    """Compiled lexicon. scan() returns match spans; is_allowed() stops at the first match."""
+
+    def __init__(self, terms):
+        self.terms = []
+        trie = {}
+        for raw in terms:
+            term = raw.strip().lower()
+            units, prefix = _units(term)
+            if not units:
+                continue
+            node = trie
+            for unit in units:
+                node = node.setdefault(unit, {})
+            # A node can end an exact term and a prefix term; the prefix one is looser
+            node[None] = (term, prefix or node.get(None, ("", False))[1])
+        body = self._emit(trie)
+        self.pattern = re.compile(rf"(?<![\w*])(?:{body})") if body else None
+
+    def _emit(self, node) -> str:
+        alts = []
+        for unit, child in node.items():
+            if unit is not None:
+                alts.append(_unit_pattern(unit) + self._emit(child))
+        end = node.get(None)
+        if end is not None:
+            term, prefix = end
+            self.terms.append(term)
+            # Empty group whose index identifies the term; exact terms must end a word
+            alts.append(r"()[\w*]*" if prefix else r"()(?![\w*])")
+        if not alts:
+            return ""
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    def scan(self, text: str) -> List[Dict]:
+        """[{"term", "start", "end", "text"}] for every lexicon match in `text`."""
+        if not text or self.pattern is None:
+            return []
+        return [{"term": self.terms[m.lastindex - 1], "start": m.start(), "end": m.end(),
+                 "text": text[m.start():m.end()]}
+                for m in self.pattern.finditer(normalize(text))]
+
+    def is_allowed(self, text: str) -> bool:
+        if not text or self.pattern is None:
+            return True
+        return self.pattern.search(normalize(text)) is None
+
+    def __len__(self):
+        return len(self.terms)
+
+
+def load_lexicon(path: str) -> List[str]:
+    """One term or phrase per line; `#` starts a comment, a trailing `*` matches word stems."""
+    with open(path, encoding="utf-8") as f:
+        return [ln.split("#", 1)[0].strip() for ln in f if ln.split("#", 1)[0].strip()]
+
+
+_moderator = None
+_moderator_lock = threading.Lock()
+
+
+def get_moderator() -> Moderator:
+    """
+    Lexicon from MODERATION_LEXICON (comma-separated files) plus the built-in BANNED
+    words unless MODERATION_BUILTIN=0. Compiled once per process.
+    """
+    global _moderator
+    if _moderator is None:
+        with _moderator_lock:
+            if _moderator is None:
+                terms = set(BANNED) if os.getenv("MODERATION_BUILTIN", "1") == "1" else set()
+                for path in filter(None, (p.strip() for p in os.getenv("MODERATION_LEXICON", "").split(","))):
+                    try:
+                        terms.update(load_lexicon(path))
+                    except OSError as e:
+                        print(f"[MODERATION] Could not read lexicon {path}: {e}")
+                _moderator = Moderator(sorted(terms))
+    return _moderator
+
+
+def reload():
+    """Recompile the lexicon on the next call (e.g. after editing the lexicon file)."""
+    global _moderator
+    with _moderator_lock:
+        _moderator = None
+
+
+def scan(text: str) -> List[Dict]:
+    return get_moderator().scan(text)
+
 
 def is_allowed(text: str) -> bool:
-    tokens = {t.strip('.,!?').lower() for t in text.split()}
-    return not (tokens & BANNED)
+    return get_moderator().is_allowed(text)
+
+
+def scan_many(texts) -> List[List[Dict]]:
+    moderator = get_moderator()
+    return [moderator.scan(t) for t in texts]
+
+
+def is_allowed_many(texts) -> List[bool]:
+    moderator = get_moderator()
+    return [moderator.is_allowed(t) for t in texts]
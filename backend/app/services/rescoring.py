@@ -0,0 +1,285 @@
+# Batch scoring and offline re-scoring of stored attempts.
+# Items are scored with the same stages as /api/check: grammar through the
+# provider registry on a bounded worker pool, semantic similarity from batched
+# embedding requests, and pronunciation against the correction. Re-scoring
+# jobs walk db.attempts in (timestamp, _id) order, write results back with
+# unordered bulk writes and checkpoint their position in db.rescore_jobs, so an
+# interrupted job resumes where it stopped. Completed sessions touched by a job
+# get their final report recomputed once, when the job completes:
+#
+#   python -m app.services.rescoring --job prompt-v2 [--session ID]
+#       [--since ISO] [--until ISO] [--batch 200] [--limit N] [--no-semantic] [--feedback]
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from pymongo import UpdateOne, ASCENDING, ReturnDocument
+
+from ..db.mongo import get_db
+from .moderation import is_allowed_many
+from .grammar import heuristic_grammar
+from .grammar_providers import score_grammar
+from .semantic import overlap_score, similarity_to_score, _cosine_sim
+from .embeddings import get_embeddings_model, embed_cached, embed_texts
+from .aligner import pronunciation_score
+from .session_stats import final_report
+from .gemini_client import generate_feedback
+
+REFUSAL = "I am not sure about that, please retry."
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("RESCORE_WORKERS", "8"))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rescore")
+    return _executor
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _grammar(text: str, guard=None) -> Dict:
+    if guard is not None:
+        # Admission errors from the guard propagate; only scoring failures fall back
+        with guard():
+            return _grammar(text)
+    try:
+        return score_grammar(text)
+    except Exception as e:
+        print(f"[RESCORE] Grammar failed, using heuristic: {e}")
+        return dict(heuristic_grammar(text), provider="heuristic")
+
+
+def semantic_scores(pairs) -> List[int]:
+    """
+    Semantic scores for many (question, answer) pairs. Distinct questions go through
+    the embedding cache; answers are embedded fresh in EMBED_BATCH_SIZE requests.
+    """
+    model = get_embeddings_model()
+    if model is None:
+        return [overlap_score(q, a) for q, a in pairs]
+    batch = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+    try:
+        questions = sorted({q for q, a in pairs if q and a})
+        answers = sorted({a for q, a in pairs if q and a})
+        q_vecs, a_vecs = {}, {}
+        for chunk in _chunks(questions, batch):
+            q_vecs.update(zip(chunk, embed_cached(chunk, model)))
+        for chunk in _chunks(answers, batch):
+            a_vecs.update(zip(chunk, embed_texts(chunk, model)))
+    except Exception as e:
+        print(f"[RESCORE] Batched embeddings failed, using overlap: {e}")
+        return [overlap_score(q, a) for q, a in pairs]
+    return [similarity_to_score(_cosine_sim(q_vecs[q], a_vecs[a])) if q and a else 0 for q, a in pairs]
+
+
+def score_items(items: List[Dict], with_semantic: bool = True, guard=None) -> List[Dict]:
+    """
+    Score (question, transcript) items. Returns one dict per item with correction,
+    mistakes, scores and the grammar provider that answered. `guard`, if given, is a
+    context manager factory entered around each item's grammar call (admission control).
+    """
+    results = [None] * len(items)
+    pending = []
+    allowed = is_allowed_many([item.get("transcript") or "" for item in items])
+    for i, item in enumerate(items):
+        transcript = item.get("transcript") or ""
+        if not transcript or not allowed[i]:
+            # Same deterministic refusal /check returns for inappropriate answers
+            results[i] = {
+                "correction": REFUSAL if transcript else "",
+                "mistakes": ["inappropriate language"] if transcript else [],
+                "scores": {"grammar": 0, "pronunciation": 0, "semantic": 0, "fluency": 0},
+                "provider": "moderation" if transcript else "none",
+            }
+        else:
+            pending.append(i)
+
+    analyses = list(_get_executor().map(lambda t: _grammar(t, guard), [items[i]["transcript"] for i in pending]))
+    pairs = [(items[i].get("question") or "", items[i]["transcript"]) for i in pending]
+    if with_semantic:
+        sem = semantic_scores(pairs)
+    else:
+        sem = [overlap_score(q, a) for q, a in pairs]
+
+    for i, analysis, sem_score in zip(pending, analyses, sem):
+        transcript = items[i]["transcript"]
+        correction = analysis["correction"]
+        results[i] = {
+            "correction": correction,
+            "mistakes": analysis.get("mistakes", []),
+            "scores": {
+                "grammar": analysis["score"],
+                "pronunciation": pronunciation_score(transcript, correction),
+                "semantic": sem_score,
+                "fluency": analysis.get("fluency", 70),
+            },
+            "provider": analysis.get("provider", "heuristic"),
+        }
+    return results
+
+
+def _job_filter(session_id=None, since=None, until=None) -> Dict:
+    flt = {}
+    if session_id:
+        flt["session_id"] = session_id
+    if since or until:
+        flt["timestamp"] = {}
+        if since:
+            flt["timestamp"]["$gte"] = since
+        if until:
+            flt["timestamp"]["$lt"] = until
+    return flt
+
+
+def _after(flt: Dict, job: Dict) -> Dict:
+    """`flt` restricted to attempts after the job's checkpoint."""
+    if job.get("last_id") is None:
+        return dict(flt)
+    after = {"$or": [{"timestamp": {"$gt": job["last_ts"]}},
+                     {"timestamp": job["last_ts"], "_id": {"$gt": job["last_id"]}}]}
+    return {"$and": [flt, after]} if flt else after
+
+
+def _refresh_completed(db, session_ids, stamp: str, feedback: bool = False):
+    """
+    Recompute the final report of completed sessions whose attempts were re-scored.
+    The feedback paragraph is an LLM call per session, so it is only regenerated
+    when `feedback` is set; otherwise the stored text is kept.
+    """
+    batch = int(os.getenv("RESCORE_REFRESH_BATCH", "500"))
+    for chunk in _chunks(list(session_ids), batch):
+        for session in db.sessions.find({"session_id": {"$in": chunk}, "status": "completed"},
+                                        {"session_id": 1}):
+            scores, all_mistakes, total_attempts = final_report(db, session)
+            # rescored_at is part of the session detail ETag, so cached copies are revalidated
+            update = {"final_scores": scores, "total_attempts": total_attempts, "rescored_at": stamp}
+            if feedback:
+                update["feedback"] = generate_feedback(scores, all_mistakes)
+            db.sessions.update_one({"session_id": session["session_id"]}, {"$set": update})
+
+
+def rescore_attempts(job_id: str, session_id: str = None, since: str = None, until: str = None,
+                     batch_size: int = 200, limit: int = None, with_semantic: bool = True,
+                     db=None, progress=None, guard=None, feedback: bool = False) -> Dict:
+    """
+    Re-score stored attempts matching the session/date range and write the new scores
+    back. Progress is checkpointed per batch under `job_id`; calling again with the
+    same job_id continues after the last written attempt. At most `limit` attempts
+    are processed per call; the job is "paused" while attempts remain. Sessions the
+    job touched are collected in the job document and their final reports refreshed
+    once it completes (see _refresh_completed for `feedback`). Returns the job document.
+    """
+    db = db if db is not None else get_db()
+    jobs = db.rescore_jobs
+    base = _job_filter(session_id, since, until)
+    now = datetime.utcnow().isoformat() + "Z"
+    jobs.update_one(
+        {"_id": job_id},
+        {"$setOnInsert": {"filter": base, "processed": 0, "updated": 0, "started_at": now,
+                          "last_ts": None, "last_id": None},
+         "$set": {"status": "running", "updated_at": now}},
+        upsert=True,
+    )
+    job = jobs.find_one({"_id": job_id})
+    if job.get("filter") != base:
+        raise ValueError(f"job '{job_id}' was started with a different filter: {job.get('filter')}")
+
+    done = 0
+    exhausted = False
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        page = list(db.attempts.find(_after(base, job), {"question": 1, "transcript": 1, "session_id": 1,
+                                                         "timestamp": 1})
+                    .sort([("timestamp", ASCENDING), ("_id", ASCENDING)]).limit(size))
+        if not page:
+            exhausted = True
+            break
+
+        t0 = time.perf_counter()
+        results = score_items(page, with_semantic=with_semantic, guard=guard)
+        stamp = datetime.utcnow().isoformat() + "Z"
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "correction": r["correction"],
+                "mistakes": r["mistakes"],
+                "scores": r["scores"],
+                "rescored_at": stamp,
+                "rescore_job": job_id,
+            }})
+            for doc, r in zip(page, results)
+        ]
+        updated = db.attempts.bulk_write(ops, ordered=False).modified_count
+        # Running session aggregates no longer match the stored attempts; dropping them
+        # makes session_summary recompute from the attempts themselves
+        touched = sorted({doc.get("session_id") for doc in page if doc.get("session_id")})
+        if touched:
+            db.sessions.update_many({"session_id": {"$in": touched}}, {"$unset": {"agg": ""}})
+
+        last = page[-1]
+        job = jobs.find_one_and_update(
+            {"_id": job_id},
+            {"$set": {"last_ts": last.get("timestamp"), "last_id": last["_id"],
+                      "updated_at": stamp},
+             "$inc": {"processed": len(page), "updated": updated},
+             "$addToSet": {"touched_sessions": {"$each": touched}}},
+            return_document=ReturnDocument.AFTER,
+        )
+        done += len(page)
+        if progress:
+            progress(job, len(page) / max(1e-9, time.perf_counter() - t0))
+        if len(page) < size:
+            exhausted = True
+            break
+
+    if not exhausted:
+        # Stopped at `limit` on a full page: completed only if nothing is left after it
+        exhausted = db.attempts.find_one(_after(base, job), {"_id": 1}) is None
+    now = datetime.utcnow().isoformat() + "Z"
+    if exhausted and job.get("touched_sessions"):
+        _refresh_completed(db, job["touched_sessions"], now, feedback=feedback)
+    update = {"$set": {"status": "completed" if exhausted else "paused", "updated_at": now}}
+    if exhausted:
+        # Refreshed above; resuming a completed job does not refresh them again
+        update["$unset"] = {"touched_sessions": ""}
+    return jobs.find_one_and_update({"_id": job_id}, update, return_document=ReturnDocument.AFTER)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.services.rescoring",
+                                     description="Re-score stored attempts with resumable checkpoints.")
+    parser.add_argument("--job", required=True, help="job id; reuse it to resume")
+    parser.add_argument("--session", help="only attempts of this session")
+    parser.add_argument("--since", help="ISO timestamp, inclusive")
+    parser.add_argument("--until", help="ISO timestamp, exclusive")
+    parser.add_argument("--batch", type=int, default=int(os.getenv("RESCORE_BATCH_SIZE", "200")))
+    parser.add_argument("--limit", type=int, help="stop after this many attempts")
+    parser.add_argument("--no-semantic", action="store_true", help="use word overlap instead of embeddings")
+    parser.add_argument("--feedback", action="store_true",
+                        help="also regenerate the feedback of completed sessions (one LLM call each)")
+    args = parser.parse_args(argv)
+
+    def report(job, rate):
+        print(f"[RESCORE] {job['_id']}: processed={job['processed']} updated={job['updated']} "
+              f"last={job['last_ts']} ({rate:.0f} attempts/s)")
+
+    job = rescore_attempts(args.job, session_id=args.session, since=args.since, until=args.until,
+                           batch_size=args.batch, limit=args.limit,
+                           with_semantic=not args.no_semantic, progress=report, feedback=args.feedback)
+    print(f"[RESCORE] {job['_id']} {job['status']}: processed={job['processed']} updated={job['updated']}")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main(sys.argv[1:]))
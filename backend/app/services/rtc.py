@@ -0,0 +1,154 @@
+# WebRTC peer management on a single long-lived asyncio event loop.
+# Flask handlers are synchronous, so they submit coroutines to the loop thread
+# through run_coroutine_threadsafe instead of creating a loop per request.
+
+import os
+import asyncio
+import atexit
+import json
+import threading
+import logging
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.contrib.media import MediaBlackhole
+
+from .stream_stt import StreamingTranscriber
+
+
+class TooManyPeers(Exception):
+    """Raised when the concurrent peer connection cap is reached."""
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_pcs = set()
+_stats = {"created": 0, "closed": 0, "failed": 0, "rejected": 0}
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                t = threading.Thread(target=loop.run_forever, name="webrtc-loop", daemon=True)
+                t.start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro, timeout: float = None):
+    """Run a coroutine on the WebRTC loop from any thread and wait for its result."""
+    if timeout is None:
+        timeout = float(os.getenv("RTC_SUBMIT_TIMEOUT_SEC", "15"))
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
+
+
+async def _close_peer(pc, reason: str):
+    if pc not in _pcs:
+        return
+    _pcs.discard(pc)
+    _stats["failed" if reason == "failed" else "closed"] += 1
+    try:
+        await pc.close()
+    except Exception as e:
+        logging.error(f"[WebRTC] Error while closing peer: {e}")
+
+
+async def _expire_if_unconnected(pc, delay: float):
+    # Offers whose ICE never completes would otherwise hold sockets forever
+    await asyncio.sleep(delay)
+    if pc in _pcs and pc.connectionState in ("new", "connecting"):
+        await _close_peer(pc, "failed")
+
+
+async def _handle_offer(sdp: str, type_: str):
+    max_peers = int(os.getenv("RTC_MAX_PEERS", "100"))
+    if len(_pcs) >= max_peers:
+        _stats["rejected"] += 1
+        raise TooManyPeers(f"too many active WebRTC sessions ({max_peers})")
+
+    offer = RTCSessionDescription(sdp=sdp, type=type_)
+    pc = RTCPeerConnection()
+    _pcs.add(pc)
+    _stats["created"] += 1
+    media_blackhole = MediaBlackhole()
+    channels = []
+
+    def send_transcript(message):
+        # Push partial/final transcripts to the client over its data channel
+        for channel in channels:
+            if channel.readyState == "open":
+                try:
+                    channel.send(json.dumps(message))
+                except Exception:
+                    pass
+
+    @pc.on("connectionstatechange")
+    async def on_connectionstatechange():
+        if pc.connectionState in ("failed", "closed"):
+            await _close_peer(pc, pc.connectionState)
+
+    @pc.on("track")
+    async def on_track(track):
+        if track.kind == "audio" and os.getenv('STREAM_STT', '1') == '1':
+            transcriber = StreamingTranscriber(send_transcript)
+            asyncio.ensure_future(transcriber.run(track))
+            return
+        # Consume other tracks to keep pipeline alive
+        await media_blackhole.start()
+        media_blackhole.addTrack(track)
+
+    @pc.on("datachannel")
+    def on_datachannel(channel):
+        channels.append(channel)
+
+        # Echo messages for connectivity test
+        @channel.on("message")
+        def on_message(message):
+            try:
+                channel.send(message)
+            except Exception:
+                pass
+
+    try:
+        await pc.setRemoteDescription(offer)
+        # Ensure we can receive audio from client
+        pc.addTransceiver("audio", direction="recvonly")
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+    except (Exception, asyncio.CancelledError):
+        # CancelledError comes from submit() timing out; without this the peer leaks in _pcs
+        await _close_peer(pc, "failed")
+        raise
+
+    asyncio.ensure_future(_expire_if_unconnected(pc, float(os.getenv("RTC_CONNECT_TIMEOUT_SEC", "30"))))
+    return pc.localDescription
+
+
+def handle_offer(sdp: str, type_: str):
+    """Negotiate a new peer connection on the loop thread and return its local description."""
+    return submit(_handle_offer(sdp, type_))
+
+
+def peer_stats() -> dict:
+    return dict(_stats, active=len(_pcs))
+
+
+async def _close_all():
+    await asyncio.gather(*[_close_peer(pc, "closed") for pc in list(_pcs)], return_exceptions=True)
+
+
+@atexit.register
+def _shutdown():
+    if _loop is None or not _loop.is_running():
+        return
+    try:
+        submit(_close_all(), timeout=5)
+    except Exception:
+        pass
+    _loop.call_soon_threadsafe(_loop.stop)
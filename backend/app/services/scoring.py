@@ -0,0 +1,106 @@
+# Concurrent execution of independent scoring stages for /api/check.
+# Each stage gets its own deadline; a stage that errors or misses its deadline
+# is replaced by its (cheap, local) fallback so the request never waits on it.
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from ..utils import metrics
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("SCORING_WORKERS", "16"))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scoring")
+    return _executor
+
+
+def stage_deadline(name: str, default: float) -> float:
+    """Per-stage deadline in seconds, e.g. SCORING_GRAMMAR_DEADLINE_SEC."""
+    return float(os.getenv(f"SCORING_{name.upper()}_DEADLINE_SEC", str(default)))
+
+
+def run_stages(stages: dict, timings: dict = None) -> dict:
+    """
+    Run stages concurrently and return {name: result}.
+    `stages` maps name -> (fn, fallback, deadline_sec); fn and fallback take no arguments.
+    Per-stage timing is written into `timings` as {name: {"ms": float, "status": str}}
+    where status is "ok", "timeout" or "error".
+    """
+    if timings is None:
+        timings = {}
+    t0 = time.perf_counter()
+    executor = _get_executor()
+    # Stages run on pool threads but their spans still belong to this request
+    futures = {name: executor.submit(metrics.wrap(_timed), fn) for name, (fn, _, _) in stages.items()}
+
+    results = {}
+    for name, (_, fallback, deadline) in stages.items():
+        fut = futures[name]
+        remaining = max(0.0, deadline - (time.perf_counter() - t0))
+        try:
+            results[name], elapsed = fut.result(timeout=remaining)
+            timings[name] = {"ms": round(elapsed * 1000, 1), "status": "ok"}
+            metrics.record(name, elapsed)
+            continue
+        except FutureTimeout:
+            # The worker cannot be interrupted; stop waiting and let it finish in the background
+            fut.cancel()
+            status = "timeout"
+        except Exception as e:
+            print(f"[SCORING] Stage '{name}' failed: {e}")
+            status = "error"
+        timings[name] = {"ms": round((time.perf_counter() - t0) * 1000, 1), "status": status}
+        metrics.record(name, time.perf_counter() - t0)
+        metrics.inc("stage_fallbacks", stage=name, reason=status)
+        results[name] = fallback()
+    return results
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+async def run_stages_async(stages: dict, timings: dict = None) -> dict:
+    """
+    run_stages() for the async serving mode: `fn` returns an awaitable and stages run
+    as tasks on the current event loop. A stage past its deadline is cancelled.
+    """
+    if timings is None:
+        timings = {}
+    t0 = time.perf_counter()
+    tasks = {name: asyncio.ensure_future(_timed_async(fn)) for name, (fn, _, _) in stages.items()}
+
+    results = {}
+    for name, (_, fallback, deadline) in stages.items():
+        task = tasks[name]
+        remaining = max(0.0, deadline - (time.perf_counter() - t0))
+        try:
+            results[name], elapsed = await asyncio.wait_for(asyncio.shield(task), remaining)
+            timings[name] = {"ms": round(elapsed * 1000, 1), "status": "ok"}
+            metrics.record(name, elapsed)
+            continue
+        except asyncio.TimeoutError:
+            task.cancel()
+            status = "timeout"
+        except Exception as e:
+            print(f"[SCORING] Stage '{name}' failed: {e}")
+            status = "error"
+        timings[name] = {"ms": round((time.perf_counter() - t0) * 1000, 1), "status": status}
+        metrics.record(name, time.perf_counter() - t0)
+        metrics.inc("stage_fallbacks", stage=name, reason=status)
+        results[name] = fallback()
+    return results
+
+
+async def _timed_async(fn):
+    t0 = time.perf_counter()
+    result = await fn()
+    return result, time.perf_counter() - t0
@@ -1,19 +1,6 @@
-import os
 import numpy as np
-import google.generativeai as genai
 
-_embeddings_model = None
-
-def _get_embeddings_model():
-    global _embeddings_model
-    if _embeddings_model is None:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            # Without API key, fallback to heuristic
-            return None
-        genai.configure(api_key=api_key)
-        _embeddings_model = "text-embedding-004"
-    return _embeddings_model
+from .embeddings import get_embeddings_model, embed_question_answer
 
 def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     denom = (np.linalg.norm(a) * np.linalg.norm(b))
@@ -21,29 +8,31 @@ def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
         return 0.0
     return float(np.dot(a, b) / denom)
 
+def overlap_score(question: str, answer: str) -> int:
+    """Word-overlap (Jaccard) heuristic used when embeddings are unavailable."""
+    if not answer or not question:
+        return 0
+    qs = set(question.lower().split())
+    as_ = set(answer.lower().split())
+    overlap = len(qs & as_)
+    denom = len(qs | as_) or 1
+    return int(round(100 * overlap / denom))
+
+def similarity_to_score(sim: float) -> int:
+    return int(round(max(0.0, min(1.0, (sim + 1) / 2)) * 100))
+
 def semantic_score(question: str, answer: str) -> int:
     if not answer or not question:
         return 0
 
-    model = _get_embeddings_model()
+    model = get_embeddings_model()
     if model is None:
         # Fallback simple overlap heuristic
-        qs = set(question.lower().split())
-        as_ = set(answer.lower().split())
-        overlap = len(qs & as_)
-        denom = len(qs | as_) or 1
-        return int(round(100 * overlap / denom))
+        return overlap_score(question, answer)
 
     try:
-        q_emb = genai.embed_content(model=model, content=question)["embedding"]
-        a_emb = genai.embed_content(model=model, content=answer)["embedding"]
-        sim = _cosine_sim(np.array(q_emb, dtype=float), np.array(a_emb, dtype=float))
-        score = int(round(max(0.0, min(1.0, (sim + 1) / 2)) * 100))
-        return score
+        q_emb, a_emb = embed_question_answer(question, answer)
+        return similarity_to_score(_cosine_sim(q_emb, a_emb))
     except Exception:
         # On any failure, fallback
-        qs = set(question.lower().split())
-        as_ = set(answer.lower().split())
-        overlap = len(qs & as_)
-        denom = len(qs | as_) or 1
-        return int(round(100 * overlap / denom))
+        return overlap_score(question, answer)
@@ -0,0 +1,106 @@
+# Running per-session score aggregates.
+# Each attempt atomically $inc's score sums/counts and a bounded mistake-frequency
+# map on its session document, so ending a session reads one document instead of
+# every attempt. Sessions created before aggregates existed are summarized with a
+# server-side aggregation pipeline instead.
+
+import os
+import hashlib
+from pymongo import UpdateOne
+
+SCORE_KEYS = ('grammar', 'pronunciation', 'semantic', 'fluency')
+AGG_VERSION = 1
+MAX_MISTAKE_KINDS = int(os.getenv('SESSION_MAX_MISTAKE_KINDS', '50'))
+
+
+def initial_aggregates() -> dict:
+    """Value for the `agg` field of a newly created session."""
+    return {'v': AGG_VERSION, 'n': 0, 'kinds': 0}
+
+
+def _mistake_id(text: str) -> str:
+    return hashlib.sha1(' '.join(text.lower().split()).encode('utf-8')).hexdigest()[:12]
+
+
+def aggregate_ops(session_id: str, scores: dict, mistakes) -> list:
+    """Bulk-write operations that fold one attempt into its session's aggregates."""
+    flt = {'session_id': session_id, 'agg.v': AGG_VERSION}
+    inc = {'agg.n': 1}
+    for key in SCORE_KEYS:
+        val = (scores or {}).get(key)
+        if val is not None:
+            inc[f'agg.sum.{key}'] = val
+            inc[f'agg.cnt.{key}'] = 1
+    ops = [UpdateOne(flt, {'$inc': inc})]
+
+    seen = set()
+    for m in (mistakes if isinstance(mistakes, list) else []):
+        text = str(m).strip()
+        mid = _mistake_id(text) if text else None
+        if not mid or mid in seen:
+            continue
+        seen.add(mid)
+        path = f'agg.mistakes.{mid}'
+        # Create the entry at n=0 only while under the cap, then increment it if it exists.
+        # Running the insert first keeps concurrent first occurrences from losing counts.
+        ops.append(UpdateOne(
+            dict(flt, **{path: {'$exists': False}, 'agg.kinds': {'$not': {'$gte': MAX_MISTAKE_KINDS}}}),
+            {'$set': {path: {'t': text, 'n': 0}}, '$inc': {'agg.kinds': 1}},
+        ))
+        ops.append(UpdateOne(dict(flt, **{path: {'$exists': True}}), {'$inc': {f'{path}.n': 1}}))
+    return ops
+
+
+def _from_aggregates(agg: dict):
+    sums = agg.get('sum') or {}
+    counts = agg.get('cnt') or {}
+    scores = {}
+    for key in SCORE_KEYS:
+        cnt = counts.get(key) or 0
+        scores[key] = round(sums.get(key, 0) / cnt, 2) if cnt else 0
+    mistakes = sorted(((v.get('t'), v.get('n', 0)) for v in (agg.get('mistakes') or {}).values()),
+                      key=lambda x: -x[1])
+    return scores, [(t, n) for t, n in mistakes if n > 0], agg.get('n', 0)
+
+
+def _from_pipeline(db, session_id: str):
+    pipeline = [
+        {'$match': {'session_id': session_id}},
+        {'$facet': {
+            'scores': [{'$group': dict(
+                {'_id': None, 'n': {'$sum': 1}},
+                **{key: {'$avg': f'$scores.{key}'} for key in SCORE_KEYS}
+            )}],
+            'mistakes': [
+                {'$match': {'mistakes.0': {'$exists': True}}},
+                {'$unwind': '$mistakes'},
+                {'$group': {'_id': '$mistakes', 'n': {'$sum': 1}}},
+                {'$sort': {'n': -1}},
+                {'$limit': MAX_MISTAKE_KINDS},
+            ],
+        }},
+    ]
+    result = next(db.attempts.aggregate(pipeline), {}) or {}
+    row = (result.get('scores') or [{}])[0]
+    scores = {key: round(row[key], 2) if row.get(key) is not None else 0 for key in SCORE_KEYS}
+    mistakes = [(str(m['_id']), m['n']) for m in result.get('mistakes') or []]
+    return scores, mistakes, row.get('n', 0)
+
+
+def session_summary(db, session: dict):
+    """
+    Return (scores, mistakes, total_attempts) for a session, where mistakes is a list of
+    (text, count) sorted by frequency.
+    """
+    agg = session.get('agg')
+    if agg and agg.get('v') == AGG_VERSION:
+        return _from_aggregates(agg)
+    return _from_pipeline(db, session['session_id'])
+
+
+def final_report(db, session: dict):
+    """(scores incl. final, mistakes most frequent first, total_attempts) for ending a session."""
+    scores, mistake_counts, total_attempts = session_summary(db, session)
+    scores['final'] = round(sum(scores.values()) / 4, 2) if any(scores.values()) else 0
+    all_mistakes = [f"{text} (x{n})" if n > 1 else text for text, n in mistake_counts]
+    return scores, all_mistakes, total_attempts
@@ -0,0 +1,145 @@
+# Incremental transcription of a live WebRTC audio track.
+# Audio is resampled to 16 kHz mono, split into utterances with a simple
+# energy-based voice activity detector, and fed to the pooled Whisper models.
+
+import os
+import asyncio
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from av import AudioResampler
+from aiortc.mediastreams import MediaStreamError
+
+from .stt import SAMPLE_RATE, SttBusy, transcribe_array
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # One worker per Whisper replica; more would only queue inside the pool
+    global _executor
+    if _executor is None:
+        workers = max(1, int(os.getenv("WHISPER_REPLICAS", "1")))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stream-stt")
+    return _executor
+
+
+class StreamingTranscriber:
+    """
+    Consume an aiortc audio track and push transcripts through `send(message)`.
+    Messages are dicts: {"type": "partial"|"final", "segment": int, "text": str}.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.frame_ms = 30
+        self.frame_len = SAMPLE_RATE * self.frame_ms // 1000
+        self.threshold = float(os.getenv("STREAM_VAD_THRESHOLD", "0.015"))
+        self.start_frames = max(1, int(os.getenv("STREAM_VAD_START_MS", "90")) // self.frame_ms)
+        self.end_frames = max(1, int(os.getenv("STREAM_VAD_SILENCE_MS", "700")) // self.frame_ms)
+        self.preroll_frames = int(os.getenv("STREAM_VAD_PREROLL_MS", "300")) // self.frame_ms
+        self.partial_interval = float(os.getenv("STREAM_PARTIAL_INTERVAL_MS", "1000")) / 1000.0
+        self.max_segment = float(os.getenv("STREAM_MAX_SEGMENT_SEC", "25"))
+
+        self._resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll = []
+        self._speech = []
+        self._in_speech = False
+        self._voiced = 0
+        self._silent = 0
+        self._segment = 0
+        self._last_partial = 0.0
+        self._partial_task = None
+        self._final_tasks = set()
+
+    async def run(self, track):
+        try:
+            while True:
+                try:
+                    frame = await track.recv()
+                except MediaStreamError:
+                    break
+                for out in self._resampler.resample(frame):
+                    pcm = out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0
+                    await self._feed(pcm)
+        finally:
+            if self._in_speech:
+                await self._finalize()
+            if self._final_tasks:
+                await asyncio.gather(*self._final_tasks, return_exceptions=True)
+
+    async def _feed(self, pcm):
+        buf = np.concatenate((self._pending, pcm)) if len(self._pending) else pcm
+        n = len(buf) // self.frame_len
+        for i in range(n):
+            await self._on_frame(buf[i * self.frame_len:(i + 1) * self.frame_len])
+        self._pending = buf[n * self.frame_len:]
+
+    async def _on_frame(self, frame):
+        voiced = float(np.sqrt(np.mean(frame * frame))) >= self.threshold
+        if not self._in_speech:
+            self._preroll.append(frame)
+            if len(self._preroll) > self.preroll_frames + self.start_frames:
+                self._preroll.pop(0)
+            self._voiced = self._voiced + 1 if voiced else 0
+            if self._voiced >= self.start_frames:
+                self._in_speech = True
+                self._silent = 0
+                self._speech = list(self._preroll)
+                self._preroll = []
+                self._last_partial = time.monotonic()
+            return
+
+        self._speech.append(frame)
+        self._silent = 0 if voiced else self._silent + 1
+        duration = len(self._speech) * self.frame_ms / 1000.0
+        if self._silent >= self.end_frames or duration >= self.max_segment:
+            await self._finalize()
+        elif time.monotonic() - self._last_partial >= self.partial_interval:
+            self._last_partial = time.monotonic()
+            if self._partial_task is None or self._partial_task.done():
+                segment = self._segment
+                samples = np.concatenate(self._speech)
+                self._partial_task = asyncio.ensure_future(self._transcribe_partial(segment, samples))
+
+    async def _transcribe(self, samples) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), transcribe_array, samples)
+
+    async def _transcribe_partial(self, segment: int, samples):
+        try:
+            text = await self._transcribe(samples)
+        except SttBusy:
+            # Partials are best effort; the final transcript will still be produced
+            return
+        except Exception as e:
+            logging.error(f"[StreamSTT] Partial transcription failed: {e}")
+            return
+        if text and segment == self._segment:
+            self.send({"type": "partial", "segment": segment, "text": text})
+
+    async def _finalize(self):
+        # Drop trailing silence so Whisper does not hallucinate on it
+        speech = self._speech[:len(self._speech) - self._silent] if self._silent else self._speech
+        segment = self._segment
+        self._segment += 1
+        self._in_speech = False
+        self._speech = []
+        self._voiced = 0
+        self._silent = 0
+        if not speech:
+            return
+        # Keep reading frames while the utterance is transcribed
+        task = asyncio.ensure_future(self._transcribe_final(segment, np.concatenate(speech)))
+        self._final_tasks.add(task)
+        task.add_done_callback(self._final_tasks.discard)
+
+    async def _transcribe_final(self, segment: int, samples):
+        try:
+            text = await self._transcribe(samples)
+        except Exception as e:
+            logging.error(f"[StreamSTT] Final transcription failed: {e}")
+            text = ""
+        self.send({"type": "final", "segment": segment, "text": text})
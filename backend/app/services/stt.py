@@ -1,65 +1,259 @@
-# Placeholder STT using faster-whisper (to be implemented)
-  # For now, return a static transcript if audio provided
+# Speech-to-text using faster-whisper.
+# Model replicas are loaded once into a process-wide pool and handed out per request.
 
+import io
 import os
-import tempfile
+import threading
+import queue
+import time
+import numpy as np
+import soundfile as sf
 from faster_whisper import WhisperModel
 import subprocess
 import shutil
 import logging
+from math import gcd
 
-_model = None
+from ..utils import metrics
 
-def _get_model():
-    global _model
-    if _model is None:
+# scipy is optional: without it, non-16 kHz audio is resampled by ffmpeg/PyAV instead
+try:
+    from scipy.signal import resample_poly  # type: ignore
+    _HAS_SCIPY = True
+except Exception:
+    _HAS_SCIPY = False
+
+
+class SttBusy(Exception):
+    """Raised when the Whisper pool cannot serve a request in time."""
+
+
+class _ModelPool:
+    """
+    Bounded pool of WhisperModel replicas.
+    Callers borrow a replica with acquire()/release(); at most `max_waiters`
+    callers may queue for a replica before new requests are rejected.
+    """
+
+    def __init__(self, size: int, max_waiters: int, timeout: float):
+        self.size = max(1, size)
+        self.max_waiters = max(0, max_waiters)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._loaded = 0
+        self._waiting = 0
+        self._in_use = 0
+        self._served = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+
+    def load(self):
+        """Build every replica that has not been loaded yet."""
         model_name = os.getenv("WHISPER_MODEL", "base")
         compute_type = os.getenv("WHISPER_COMPUTE_TYPE", "auto")
-        _model = WhisperModel(model_name, compute_type=compute_type)
-    return _model
+        device = os.getenv("WHISPER_DEVICE", "auto")
+        cpu_threads = int(os.getenv("WHISPER_CPU_THREADS", "0"))
+        num_workers = int(os.getenv("WHISPER_NUM_WORKERS", "1"))
+        while True:
+            with self._lock:
+                if self._loaded >= self.size:
+                    return
+                self._loaded += 1
+                index = self._loaded
+            t0 = time.time()
+            try:
+                model = WhisperModel(
+                    model_name,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=cpu_threads,
+                    num_workers=num_workers,
+                )
+            except Exception:
+                with self._lock:
+                    self._loaded -= 1
+                raise
+            self._idle.put(model)
+            print(f"[STT] Loaded Whisper replica {index}/{self.size} ({model_name}, {compute_type}) in {time.time() - t0:.2f}s")
+
+    def acquire(self):
+        with self._lock:
+            if self._idle.empty() and self._waiting >= self.max_waiters:
+                self._rejected += 1
+                raise SttBusy("speech recognition is busy, please retry")
+            self._waiting += 1
+        t0 = time.time()
+        try:
+            model = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise SttBusy("timed out waiting for speech recognition")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._in_use += 1
+            self._wait_total += time.time() - t0
+        return model
+
+    def release(self, model):
+        with self._lock:
+            self._in_use -= 1
+            self._served += 1
+        self._idle.put(model)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "replicas": self._loaded,
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "max_waiters": self.max_waiters,
+                "served": self._served,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(1000 * self._wait_total / self._served, 2) if self._served else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> _ModelPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _ModelPool(
+                    size=int(os.getenv("WHISPER_REPLICAS", "1")),
+                    max_waiters=int(os.getenv("WHISPER_MAX_WAITERS", "16")),
+                    timeout=float(os.getenv("WHISPER_ACQUIRE_TIMEOUT_SEC", "30")),
+                )
+    pool = _pool
+    if pool._loaded < pool.size:
+        pool.load()
+    return pool
+
+
+def warm_up():
+    """Load all Whisper replicas up front so the first request does not pay for it."""
+    try:
+        _get_pool()
+    except Exception as e:
+        logging.error(f"Failed to preload Whisper models: {e}")
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {"replicas": 0}
+    return _pool.stats()
+
+
+SAMPLE_RATE = 16000
+
+
+def _to_mono_16k(samples, sr: int):
+    """
+    Downmix a (frames, channels) float32 array to mono and resample to 16 kHz with a
+    polyphase anti-aliasing filter. Requires scipy when sr is not already 16 kHz.
+    """
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    if sr != SAMPLE_RATE and len(samples):
+        g = gcd(SAMPLE_RATE, sr)
+        samples = resample_poly(samples, SAMPLE_RATE // g, sr // g)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def _decode_with_ffmpeg(data: bytes):
+    """Decode compressed audio (webm/opus, mp3, m4a...) through a single piped ffmpeg process."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    cmd = [
+        ffmpeg, "-nostdin", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    proc = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          timeout=float(os.getenv("FFMPEG_TIMEOUT_SEC", "30")))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {proc.returncode}")
+    return np.frombuffer(proc.stdout, dtype=np.float32)
+
+
+def decode_audio(audio_file):
+    """
+    Decode an uploaded audio file (werkzeug FileStorage or file-like object)
+    into a 16 kHz mono float32 NumPy array, without touching the disk.
+    WAV/FLAC/OGG are read with soundfile; other formats are piped through ffmpeg,
+    or PyAV (bundled with faster-whisper) when ffmpeg is not installed.
+    """
+    stream = getattr(audio_file, 'stream', audio_file)
+    data = stream.read()
+    if not data:
+        return np.zeros(0, dtype=np.float32)
+
+    try:
+        samples, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        if sr == SAMPLE_RATE or _HAS_SCIPY:
+            return _to_mono_16k(samples, sr)
+        # No polyphase resampler here; let ffmpeg/PyAV resample with a proper filter
+    except Exception:
+        # Not a container libsndfile understands (e.g. webm/opus from MediaRecorder)
+        pass
+
+    samples = _decode_with_ffmpeg(data)
+    if samples is None:
+        from faster_whisper.audio import decode_audio as av_decode
+        samples = av_decode(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def transcribe_array(samples) -> str:
+    """
+    Transcribe a 16 kHz mono float32 array with a pooled Whisper replica.
+    Raises SttBusy when no Whisper replica becomes available in time.
+    """
+    if samples is None or len(samples) == 0:
+        return ""
+    pool = _get_pool()
+    try:
+        with metrics.span("stt.queue"):
+            model = pool.acquire()
+    except SttBusy:
+        metrics.inc("stt_rejected")
+        raise
+    try:
+        with metrics.span("stt.inference"):
+            segments, _ = model.transcribe(samples, language=os.getenv("WHISPER_LANG"))
+            # Segments are generated lazily; decode while we still hold the replica
+            parts = [seg.text.strip() for seg in segments if getattr(seg, 'text', '').strip()]
+    finally:
+        pool.release(model)
+    return " ".join(parts)
+
 
 def transcribe_audio(audio_file) -> str:
     """
     Transcribe an uploaded audio file (werkzeug FileStorage) using faster-whisper.
     Returns the combined transcript text.
+    Raises SttBusy when no Whisper replica becomes available in time.
     """
     if not audio_file:
         return ""
 
-    # Persist the upload to a temporary file
-    suffix = os.path.splitext(getattr(audio_file, 'filename', '') or "audio.webm")[1] or ".webm"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        audio_path = tmp.name
-        audio_file.save(audio_path)
-
     try:
-        model = _get_model()
-        try:
-            # Try direct transcription (requires ffmpeg when format is webm/opus)
-            segments, _ = model.transcribe(audio_path, language=os.getenv("WHISPER_LANG"))
-        except Exception as e:
-            # If direct transcription fails (likely due to missing ffmpeg), try converting to wav if ffmpeg is available
-            ffmpeg = shutil.which("ffmpeg")
-            if ffmpeg:
-                wav_path = audio_path + ".wav"
-                cmd = [ffmpeg, "-y", "-i", audio_path, "-ar", "16000", "-ac", "1", wav_path]
-                try:
-                    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    segments, _ = model.transcribe(wav_path, language=os.getenv("WHISPER_LANG"))
-                    try:
-                        os.remove(wav_path)
-                    except Exception:
-                        pass
-                except Exception as e2:
-                    logging.error(f"Failed to convert {audio_path} to wav: {e2}")
-            else:
-                # No ffmpeg available and direct transcription failed
-                logging.error(f"Failed to transcribe {audio_path}: {e}")
-                return ""
-        parts = [seg.text.strip() for seg in segments if getattr(seg, 'text', '').strip()]
-        return " ".join(parts)
-    finally:
-        try:
-            os.remove(audio_path)
-        except Exception:
-            pass
+        with metrics.span("stt.decode"):
+            samples = decode_audio(audio_file)
+    except Exception as e:
+        logging.error(f"Failed to decode {getattr(audio_file, 'filename', '') or 'upload'}: {e}")
+        return ""
+    return transcribe_array(samples)
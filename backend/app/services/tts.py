@@ -1,11 +1,25 @@
 import base64
 import os
 import io
+import queue
+import threading
+import time
+import shutil
+import subprocess
+from concurrent.futures import Future
 from typing import Dict, List
 import soundfile as sf
 
+from .tts_cache import get_cache, cache_key
+from . import lipsync
+from ..utils.cache import LRUCache
+from ..utils import metrics
+
 # Edge-TTS removed
 
+# Bump when synthesis or lip-sync output changes so cached audio is not reused
+TTS_ENGINE_VERSION = os.getenv("TTS_CACHE_VERSION", "pyttsx3+rhubarb-1")
+
 # pyttsx3 (local Windows TTS)
 try:
     import pyttsx3  # type: ignore
@@ -13,6 +27,129 @@ try:
 except Exception:
     _HAS_PYTTSX3 = False
 
+
+class TtsBusy(Exception):
+    """Raised when the TTS worker queue is full."""
+
+
+_FEMALE_HINTS = [
+    'female', 'zira', 'jenny', 'aria', 'susan', 'heather', 'eva', 'salli', 'kimberly', 'michelle', 'amy', 'emma'
+]
+
+
+def _resolve_voice(engine):
+    voice_name = os.getenv("PYTTSX3_VOICE")
+    voices = engine.getProperty('voices') or []
+    if voice_name:
+        for v in voices:
+            vn = (v.name or '').lower()
+            vid = (getattr(v, 'id', '') or '').lower()
+            if voice_name.lower() in vn or voice_name.lower() in vid:
+                return v.id
+    # Heuristics to prefer common female voices on Windows SAPI5 and others
+    for hint in _FEMALE_HINTS:
+        for v in voices:
+            vn = (v.name or '').lower()
+            vid = (getattr(v, 'id', '') or '').lower()
+            if hint in vn or hint in vid:
+                return v.id
+    return None
+
+
+class _TtsWorker(threading.Thread):
+    """
+    Owns the single pyttsx3 engine. The engine is initialized and its voice resolved
+    once; synthesis jobs arrive through a bounded queue and run one at a time, since
+    pyttsx3 is not safe to drive from several threads.
+    """
+
+    def __init__(self, max_queue: int):
+        super().__init__(name="tts-worker", daemon=True)
+        self.jobs = queue.Queue(maxsize=max(1, max_queue))
+        self.voice_id = None
+        self.ready = threading.Event()
+        self.init_error = None
+
+    def submit(self, text: str, out_path: str) -> Future:
+        if self.init_error is not None:
+            raise RuntimeError(f"pyttsx3 unavailable: {self.init_error}")
+        fut = Future()
+        try:
+            self.jobs.put_nowait((text, out_path, fut))
+        except queue.Full:
+            raise TtsBusy("speech synthesis is busy, please retry")
+        return fut
+
+    def run(self):
+        try:
+            engine = pyttsx3.init()
+            resolved = _resolve_voice(engine)
+            if resolved:
+                engine.setProperty('voice', resolved)
+            # The voice actually spoken with (the engine default when nothing matched)
+            self.voice_id = resolved or engine.getProperty('voice')
+            print(f"[TTS] pyttsx3 engine ready (voice: {self.voice_id or 'default'})")
+        except Exception as e:
+            self.init_error = e
+            print(f"[pyttsx3] Engine init failed: {e}")
+        finally:
+            self.ready.set()
+        while True:
+            text, out_path, fut = self.jobs.get()
+            if self.init_error is not None:
+                fut.set_exception(RuntimeError(f"pyttsx3 unavailable: {self.init_error}"))
+                continue
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                engine.save_to_file(text, out_path)
+                engine.runAndWait()
+                fut.set_result(out_path)
+            except Exception as e:
+                fut.set_exception(e)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker() -> _TtsWorker:
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                w = _TtsWorker(int(os.getenv("TTS_QUEUE_SIZE", "32")))
+                w.start()
+                _worker = w
+    return _worker
+
+
+def warm_up():
+    """Start the TTS worker so engine init and voice lookup happen before the first request."""
+    if _HAS_PYTTSX3:
+        get_worker().ready.wait(timeout=float(os.getenv("TTS_INIT_TIMEOUT_SEC", "10")))
+
+
+def _voice_id() -> str:
+    """Voice id the worker resolved, for cache keys; PYTTSX3_VOICE when pyttsx3 is unavailable."""
+    if _HAS_PYTTSX3:
+        worker = get_worker()
+        worker.ready.wait(timeout=float(os.getenv("TTS_INIT_TIMEOUT_SEC", "10")))
+        if worker.voice_id:
+            return str(worker.voice_id)
+    return os.getenv("PYTTSX3_VOICE", "")
+
+
+def worker_stats() -> dict:
+    if _worker is None:
+        return {"running": False}
+    return {
+        "running": _worker.is_alive(),
+        "voice": _worker.voice_id,
+        "queued": _worker.jobs.qsize(),
+        "max_queue": _worker.jobs.maxsize,
+    }
+
 def _estimate_duration_secs(text: str, wpm: int = 160) -> float:
     words = max(1, len(text.split()))
     minutes = words / max(80, wpm)
@@ -30,124 +167,126 @@ def _make_dummy_visemes(text: str, duration: float) -> List[Dict]:
         i += 1
     return vis
 
-def _run_rhubarb(wav_path: str) -> List[Dict]:
-    import subprocess
+def _temp_wav() -> str:
     import tempfile
-    import json
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
+        return f.name
+
 
-    rhubarb_path = os.getenv("RHUBARB_PATH", "rhubarb")  # Use PATH by default
-    # Resolve Windows-specific cases: if a folder is provided, append rhubarb.exe
+def _remove_quietly(path: str):
     try:
-        rp = rhubarb_path.strip().strip('"').strip("'")
-        if os.path.isdir(rp):
-            candidate = os.path.join(rp, "rhubarb.exe")
-            if os.path.isfile(candidate):
-                rhubarb_path = candidate
-        else:
-            # If file without extension but .exe exists next to it, use that
-            root, ext = os.path.splitext(rp)
-            if ext == "" and os.path.isfile(root + ".exe"):
-                rhubarb_path = root + ".exe"
+        os.remove(path)
     except Exception:
         pass
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as f:
-            out_json = f.name
-        cmd = [rhubarb_path, "-f", "json", "-o", out_json, wav_path]
-        print(f"[Rhubarb] Resolved path: {rhubarb_path}")
-        print(f"[Rhubarb] Running command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=float(os.getenv("RHUBARB_TIMEOUT_SEC", "20")))
-        with open(out_json, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        cues = data.get("mouthCues") or []
-        print(f"[Rhubarb] Successfully generated {len(cues)} viseme cues.")
-        cleaned = []
-        for c in cues:
-            try:
-                cleaned.append({
-                    "start": float(c.get("start",0.0)),
-                    "end": float(c.get("end",0.0)),
-                    "value": str(c.get("value","X"))
-                })
-            except Exception:
-                continue
-        return cleaned
-    except FileNotFoundError:
-        print(f"[Rhubarb] ERROR: Rhubarb executable not found. RHUBARB_PATH='{rhubarb_path}'. Set RHUBARB_PATH to full path of rhubarb.exe or ensure it's in PATH.")
-        return []
-    except subprocess.TimeoutExpired:
-        print("[Rhubarb] ERROR: Rhubarb timed out. Increase RHUBARB_TIMEOUT_SEC or check the executable path and WAV file.")
-        return []
-    except subprocess.CalledProcessError as e:
-        print(f"[Rhubarb] ERROR: Rhubarb process failed with exit code {e.returncode}.")
-        print(f"[Rhubarb] STDOUT: {e.stdout}")
-        print(f"[Rhubarb] STDERR: {e.stderr}")
-        return []
-    except Exception as e:
-        print(f"[Rhubarb] ERROR: An unexpected error occurred while running Rhubarb: {e}")
-        return []
-    finally:
-        if 'out_json' in locals() and os.path.exists(out_json):
-            os.remove(out_json)
 
+def _viseme_retry_due(key: str) -> bool:
+    """False while a key whose Rhubarb run produced no cues is backing off (or being retried)."""
+    entry = _viseme_backoff.get(key)
+    return entry is None or time.monotonic() >= entry[1]
+
+
+def _record_viseme_result(key: str, cues):
+    if cues:
+        _viseme_backoff.delete(key)
+        return
+    failures = (_viseme_backoff.get(key) or (0, 0.0))[0] + 1
+    delay = min(float(os.getenv("RHUBARB_RETRY_MAX_SEC", "3600")),
+                float(os.getenv("RHUBARB_RETRY_SEC", "60")) * 2 ** (failures - 1))
+    _viseme_backoff.set(key, (failures, time.monotonic() + delay))
 
-def synthesize_tts(text: str):
+
+def _lipsync(key: str, text: str, audio_bytes: bytes, tmp_wav: str, async_visemes: bool, cached: bool = False) -> Dict:
+    """Run Rhubarb on tmp_wav (which it then owns) and cache the audio with its cues."""
+    def cache_result(cues):
+        # Audio is cached even without cues; visemes=None marks them as absent so a
+        # later hit retries Rhubarb (after a backoff) instead of pinning an empty list
+        if cues:
+            get_cache().put(key, audio_bytes, cues)
+        elif audio_bytes and not cached:
+            get_cache().put(key, audio_bytes, None)
+        _record_viseme_result(key, cues)
+        _pending_audio.delete(key)
+
+    # Concurrent hits must not start more runs for this key until this one finishes
+    failures = (_viseme_backoff.get(key) or (0, 0.0))[0]
+    _viseme_backoff.set(key, (failures, time.monotonic() + float(os.getenv("RHUBARB_TIMEOUT_SEC", "20")) + 5))
+    # Serve the audio by key while Rhubarb is still running
+    _pending_audio.set(key, audio_bytes)
+    lipsync_job = lipsync.submit(tmp_wav, on_done=cache_result)
+    if async_visemes:
+        return {"audio": audio_bytes, "mime": "audio/wav", "visemes": [], "text": text, "key": key,
+                "addressable": True, "viseme_job": lipsync.register_job(lipsync_job, job_id=key)}
+    visemes = lipsync_job.result()
+    return {"audio": audio_bytes, "mime": "audio/wav", "visemes": visemes, "text": text, "key": key,
+            "addressable": cached_audio(key) is not None}
+
+
+def synthesize(text: str, async_visemes: bool = False) -> Dict:
+    """
+    Synthesize `text` and its viseme cues. Returns raw audio bytes:
+    {"audio": bytes, "mime": str, "visemes": [...], "text": str, "key": str,
+     "addressable": bool}; `addressable` is True when cached_audio(key) can serve
+    the audio afterwards (it is False for the silent fallback, which is not cached).
+    With async_visemes=True the audio is returned as soon as it is synthesized, with
+    empty visemes and a `viseme_job` id to poll through lipsync.get_job().
+    """
     if not text:
-        return {"audio_b64": "", "mime": "audio/wav", "visemes": [], "text": text}
-    
-    print(f"[TTS] Processing text: '{text}'")
+        key = cache_key("", os.getenv("PYTTSX3_VOICE", ""), TTS_ENGINE_VERSION)
+        return {"audio": b"", "mime": "audio/wav", "visemes": [], "text": text, "key": key, "addressable": False}
+    key = cache_key(text, _voice_id(), TTS_ENGINE_VERSION)
+
+    cached = get_cache().get(key)
+    metrics.inc("cache_requests", cache="tts", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        audio_bytes, visemes = cached
+        if visemes is not None:
+            return {"audio": audio_bytes, "mime": "audio/wav", "visemes": visemes, "text": text, "key": key,
+                    "addressable": True}
+        # Audio cached without cues (Rhubarb failed or was unavailable): serve it with empty
+        # visemes while the key backs off, then retry lip-sync only
+        if not _viseme_retry_due(key):
+            return {"audio": audio_bytes, "mime": "audio/wav", "visemes": [], "text": text, "key": key,
+                    "addressable": True}
+        try:
+            tmp_wav = _temp_wav()
+            with open(tmp_wav, 'wb') as f:
+                f.write(audio_bytes)
+        except OSError as e:
+            print(f"[TTS] Could not stage cached audio for Rhubarb: {e}")
+            return {"audio": audio_bytes, "mime": "audio/wav", "visemes": [], "text": text, "key": key,
+                    "addressable": True}
+        return _lipsync(key, text, audio_bytes, tmp_wav, async_visemes, cached=True)
 
     # 1) pyttsx3
     if _HAS_PYTTSX3:
         try:
-            import tempfile
-            engine = pyttsx3.init()
-            voice_name = os.getenv("PYTTSX3_VOICE")
-            voices = engine.getProperty('voices') or []
-            selected_id = None
-            if voice_name:
-                for v in voices:
-                    vn = (v.name or '').lower()
-                    vid = (getattr(v, 'id', '') or '').lower()
-                    if voice_name.lower() in vn or voice_name.lower() in vid:
-                        selected_id = v.id
-                        break
-            if not selected_id:
-                # Heuristics to prefer common female voices on Windows SAPI5 and others
-                female_hints = [
-                    'female', 'zira', 'jenny', 'aria', 'susan', 'heather', 'eva', 'salli', 'kimberly', 'michelle', 'amy', 'emma'
-                ]
-                for hint in female_hints:
-                    for v in voices:
-                        vn = (v.name or '').lower()
-                        vid = (getattr(v, 'id', '') or '').lower()
-                        if hint in vn or hint in vid:
-                            selected_id = v.id
-                            break
-                    if selected_id:
-                        break
-            if selected_id:
-                engine.setProperty('voice', selected_id)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-                tmp_wav = f.name
-            engine.save_to_file(text, tmp_wav)
-            engine.runAndWait()
-            with open(tmp_wav,'rb') as f:
-                audio_bytes = f.read()
-            visemes = _run_rhubarb(tmp_wav)
-            print(f"[TTS] Generated {len(visemes)} visemes for pyttsx3 audio")
+            tmp_wav = _temp_wav()
+            job = None
             try:
-                os.remove(tmp_wav)
-            except Exception:
-                pass
-            audio_b64 = base64.b64encode(audio_bytes).decode('utf-8')
-            return {"audio_b64": audio_b64, "mime": "audio/wav", "visemes": visemes, "text": text}
+                with metrics.span("tts.synth"):
+                    job = get_worker().submit(text, tmp_wav)
+                    job.result(timeout=float(os.getenv("TTS_SYNTH_TIMEOUT_SEC", "30")))
+                with open(tmp_wav,'rb') as f:
+                    audio_bytes = f.read()
+            except BaseException:
+                if job is not None and not job.cancel():
+                    # Already running: the worker would write tmp_wav after we removed it,
+                    # so remove it once the job finishes (immediately if it already has)
+                    job.add_done_callback(lambda _: _remove_quietly(tmp_wav))
+                else:
+                    _remove_quietly(tmp_wav)
+                raise
+            return _lipsync(key, text, audio_bytes, tmp_wav, async_visemes)
+        except TtsBusy:
+            metrics.inc("tts_rejected")
+            raise
         except Exception as e:
             print(f"[pyttsx3] Failed: {e}")
             pass
 
     # 2) Silent fallback
+    metrics.inc("tts_fallbacks")
     print("[TTS] Warning: All TTS engines failed. Generating silent fallback audio.")
     import numpy as np
     sr = 22050
@@ -156,7 +295,93 @@ def synthesize_tts(text: str):
     buf = io.BytesIO()
     sf.write(buf, wav, sr, format="WAV")
     audio_bytes = buf.getvalue()
-    audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
     visemes = _make_dummy_visemes(text, duration)
     print(f"[TTS] Using silent fallback with {len(visemes)} dummy visemes")
-    return {"audio_b64": audio_b64, "mime": "audio/wav", "visemes": visemes, "text": text}
\ No newline at end of file
+    return {"audio": audio_bytes, "mime": "audio/wav", "visemes": visemes, "text": text, "key": key,
+            "addressable": False}
+
+
+def synthesize_tts(text: str, async_visemes: bool = False):
+    """JSON-friendly variant of synthesize() with the audio base64-encoded in `audio_b64`."""
+    result = synthesize(text, async_visemes=async_visemes)
+    out = {
+        "audio_b64": base64.b64encode(result["audio"]).decode("utf-8") if result["audio"] else "",
+        "mime": result["mime"],
+        "visemes": result["visemes"],
+        "text": result["text"],
+    }
+    if "viseme_job" in result:
+        out["viseme_job"] = result["viseme_job"]
+    return out
+
+
+# Compressed encodings offered by the streaming endpoints: format -> (ffmpeg args, mime)
+AUDIO_FORMATS = {
+    "wav": (None, "audio/wav"),
+    "ogg": (["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"], "audio/ogg"),
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3"], "audio/mpeg"),
+}
+_transcoded = LRUCache(int(os.getenv("TTS_TRANSCODE_CACHE_SIZE", "256")))
+# Cache keys whose Rhubarb runs produced no cues: key -> (failures, monotonic time of next retry)
+_viseme_backoff = LRUCache(int(os.getenv("TTS_VISEME_BACKOFF_SIZE", "4096")), ttl=86400)
+# Audio whose visemes are still being computed, by cache key
+_pending_audio = LRUCache(int(os.getenv("TTS_PENDING_AUDIO_SIZE", "64")),
+                          ttl=float(os.getenv("RHUBARB_JOB_TTL_SEC", "300")))
+
+
+def encode_audio(key: str, wav_bytes: bytes, fmt: str):
+    """
+    Return (audio_bytes, mime) in the requested format, transcoding WAV through a piped
+    ffmpeg process. Falls back to WAV when ffmpeg is unavailable or fails.
+    """
+    args, mime = AUDIO_FORMATS.get(fmt) or AUDIO_FORMATS["wav"]
+    ffmpeg = shutil.which("ffmpeg")
+    if args is None or not ffmpeg or not wav_bytes:
+        return wav_bytes, AUDIO_FORMATS["wav"][1]
+    cached = _transcoded.get((key, fmt))
+    if cached is not None:
+        return cached, mime
+    cmd = [ffmpeg, "-nostdin", "-loglevel", "error", "-i", "pipe:0"] + args + ["pipe:1"]
+    try:
+        proc = subprocess.run(cmd, input=wav_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
+        if proc.returncode != 0 or not proc.stdout:
+            raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip())
+    except Exception as e:
+        print(f"[TTS] Transcode to {fmt} failed, sending WAV: {e}")
+        return wav_bytes, AUDIO_FORMATS["wav"][1]
+    _transcoded.set((key, fmt), proc.stdout)
+    return proc.stdout, mime
+
+
+def cached_audio(key: str):
+    """Return (wav_bytes, visemes) for a cache key, or None; visemes is None when Rhubarb produced none."""
+    cached = get_cache().get(key)
+    if cached is None:
+        audio = _pending_audio.get(key)
+        if audio is not None:
+            return audio, []
+    return cached
+
+
+def precompute(texts: List[str]):
+    """Synthesize fixed phrases (interview questions, stock feedback) into the cache in the background."""
+    retries = int(os.getenv("TTS_PRECOMPUTE_RETRIES", "5"))
+
+    def run():
+        for text in texts:
+            for attempt in range(retries + 1):
+                try:
+                    synthesize_tts(text)
+                    break
+                except TtsBusy:
+                    # Live traffic has the queue; back off and retry the same phrase
+                    if attempt == retries:
+                        print(f"[TTS] Precompute gave up on '{text}': worker stayed busy")
+                        break
+                    time.sleep(min(30.0, 2 ** attempt))
+                except Exception as e:
+                    print(f"[TTS] Precompute failed for '{text}': {e}")
+                    break
+    t = threading.Thread(target=run, name="tts-precompute", daemon=True)
+    t.start()
+    return t
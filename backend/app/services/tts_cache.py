@@ -0,0 +1,159 @@
+# Content-addressed cache for synthesized speech and its viseme cues.
+# Entries are keyed by (text, voice, engine version). A byte-bounded in-memory
+# tier sits in front of a size-bounded on-disk tier.
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(text: str, voice: str, engine_version: str) -> str:
+    raw = "\x1f".join([engine_version or "", voice or "", text or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TtsCache:
+    def __init__(self, mem_bytes: int, disk_dir: str = None, disk_bytes: int = 0):
+        self.mem_bytes = mem_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._mem = OrderedDict()
+        self._mem_size = 0
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self.counters = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                         "mem_evictions": 0, "disk_evictions": 0}
+
+    # --- memory tier -------------------------------------------------------
+
+    def _mem_put(self, key: str, entry):
+        size = len(entry[0])
+        if size > self.mem_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_size -= len(old[0])
+            self._mem[key] = entry
+            self._mem_size += size
+            while self._mem_size > self.mem_bytes:
+                _, (audio, _) = self._mem.popitem(last=False)
+                self._mem_size -= len(audio)
+                self.counters["mem_evictions"] += 1
+
+    # --- disk tier ---------------------------------------------------------
+
+    def _paths(self, key: str):
+        return os.path.join(self.disk_dir, key + ".wav"), os.path.join(self.disk_dir, key + ".json")
+
+    def _disk_get(self, key: str):
+        if not self.disk_dir:
+            return None
+        wav_path, json_path = self._paths(key)
+        try:
+            with open(wav_path, "rb") as f:
+                audio = f.read()
+            with open(json_path, "r", encoding="utf-8") as f:
+                visemes = json.load(f)
+            # Bump mtime so eviction is least-recently-used
+            os.utime(wav_path)
+            return audio, visemes
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, audio: bytes, visemes):
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            wav_path, json_path = self._paths(key)
+            # Write the viseme sidecar first: a .wav without its .json is never served
+            for path, data, mode in ((json_path, json.dumps(visemes), "w"), (wav_path, audio, "wb")):
+                fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".part")
+                with os.fdopen(fd, mode) as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        except OSError as e:
+            print(f"[TTS-CACHE] Disk write failed: {e}")
+            return
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(audio)
+        self._disk_evict()
+
+    def _disk_evict(self):
+        with self._lock:
+            if self._disk_size is not None and self._disk_size <= self.disk_bytes:
+                return
+            try:
+                entries = []
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith(".wav"):
+                        st = os.stat(os.path.join(self.disk_dir, name))
+                        entries.append((st.st_mtime, st.st_size, name[:-4]))
+            except OSError:
+                return
+            total = sum(e[1] for e in entries)
+            entries.sort()
+            for _, size, key in entries:
+                if total <= self.disk_bytes:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                self.counters["disk_evictions"] += 1
+            self._disk_size = total
+
+    # --- public API --------------------------------------------------------
+
+    def get(self, key: str):
+        """Return (audio_bytes, visemes) or None."""
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.counters["mem_hits"] += 1
+                return entry
+        entry = self._disk_get(key)
+        if entry is not None:
+            with self._lock:
+                self.counters["disk_hits"] += 1
+            self._mem_put(key, entry)
+            return entry
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, audio: bytes, visemes):
+        with self._lock:
+            self.counters["stores"] += 1
+        self._mem_put(key, (audio, visemes))
+        self._disk_put(key, audio, visemes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, mem_entries=len(self._mem), mem_bytes=self._mem_size,
+                        disk_bytes=self._disk_size)
+
+
+_cache = None
+
+
+def get_cache() -> TtsCache:
+    global _cache
+    if _cache is None:
+        disk_dir = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "avatar_tts_cache"))
+        if os.getenv("TTS_CACHE_DISK", "1") != "1":
+            disk_dir = None
+        _cache = TtsCache(
+            mem_bytes=int(float(os.getenv("TTS_CACHE_MEM_MB", "64")) * 1024 * 1024),
+            disk_dir=disk_dir,
+            disk_bytes=int(float(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024),
+        )
+    return _cache
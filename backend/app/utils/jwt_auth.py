@@ -1,9 +1,31 @@
 import os
+import json
+import time
+import hashlib
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 from ..db.mongo import get_db
+from .cache import LRUCache
+from . import metrics
+
+# Optional shared user cache for multi-worker deployments (REDIS_URL)
+try:
+    import redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+# User documents almost never change during a session; keep them briefly per process
+_user_cache = LRUCache(int(os.getenv('AUTH_USER_CACHE_SIZE', '10000')),
+                       ttl=float(os.getenv('AUTH_USER_CACHE_TTL_SEC', '60')))
+# Verified token payloads, keyed by a hash of the bearer token
+_token_cache = LRUCache(int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000')),
+                        ttl=float(os.getenv('AUTH_TOKEN_CACHE_TTL_SEC', '300')))
+# Fields never needed by routes; kept out of every cache tier
+_USER_PROJECTION = {'_id': 0, 'password_hash': 0}
+_redis = None
 
 
 def get_jwt_secret():
@@ -34,6 +56,72 @@ def decode_jwt_token(token):
         return None
 
 
+def _verify_token_cached(token):
+    """decode_jwt_token() with a short-lived cache of successfully verified tokens."""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        if payload.get('exp', 0) > time.time():
+            return payload
+        _token_cache.delete(key)
+    payload = decode_jwt_token(token)
+    if payload:
+        _token_cache.set(key, payload)
+    return payload
+
+
+def _get_redis():
+    global _redis
+    url = os.getenv('REDIS_URL')
+    if _redis is None and _HAS_REDIS and url:
+        _redis = redis.Redis.from_url(url, socket_timeout=0.2)
+    return _redis
+
+
+def _load_user(user_id):
+    """Fetch a user document through the process cache, the shared cache, then Mongo."""
+    if not user_id:
+        return None
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    r = _get_redis()
+    shared_key = f"auth:user:{user_id}"
+    if r is not None:
+        try:
+            raw = r.get(shared_key)
+            if raw:
+                user = json.loads(raw)
+                _user_cache.set(user_id, user)
+                return user
+        except Exception as e:
+            print(f"[AUTH] Shared user cache read failed: {e}")
+
+    db = get_db()
+    user = db.users.find_one({'user_id': user_id}, _USER_PROJECTION)
+    if user is None:
+        return None
+    _user_cache.set(user_id, user)
+    if r is not None:
+        try:
+            r.setex(shared_key, int(_user_cache.ttl or 60), json.dumps(user, default=str))
+        except Exception as e:
+            print(f"[AUTH] Shared user cache write failed: {e}")
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a user from every cache tier; call after changing the users document."""
+    _user_cache.delete(user_id)
+    r = _get_redis()
+    if r is not None:
+        try:
+            r.delete(f"auth:user:{user_id}")
+        except Exception as e:
+            print(f"[AUTH] Shared user cache invalidation failed: {e}")
+
+
 def get_current_user():
     """Extract current user from JWT token in Authorization header"""
     auth_header = request.headers.get('Authorization', '')
@@ -43,14 +131,13 @@ def get_current_user():
     if not token:
         return None
     
-    payload = decode_jwt_token(token)
-    if not payload:
-        return None
-    
-    # Verify user exists in database
-    db = get_db()
-    user = db.users.find_one({'user_id': payload.get('user_id')})
-    return user
+    with metrics.span("auth"):
+        payload = _verify_token_cached(token)
+        if not payload:
+            return None
+
+        # Verify user exists (cached; see _load_user)
+        return _load_user(payload.get('user_id'))
 
 
 def require_auth(f):
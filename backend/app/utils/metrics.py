@@ -0,0 +1,146 @@
+# In-process metrics and per-request stage timing.
+# span("stt.decode") times a block into a latency histogram. While a request is
+# being traced (see begin_request) the span is also appended to that request's
+# timings, which can be returned as a Server-Timing header. Counters track
+# fallbacks and cache hits. render() produces the Prometheus text format served
+# at /metrics; no client library is needed.
+
+import os
+import re
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+PREFIX = os.getenv("METRICS_PREFIX", "langcoach")
+# Latency buckets in seconds, wide enough for Whisper and remote LLM calls
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}    # (name, labels) -> float
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record one latency observation into histogram `name`."""
+    key = (name, _labels(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        h[bisect.bisect_left(BUCKETS, seconds)] += 1
+        h[-1] += seconds
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Increment counter `name`."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into the stage_seconds histogram and the current request."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+
+def record(stage: str, seconds: float):
+    observe("stage_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        # list.append is atomic, so stages running on worker threads can share the list
+        timings.append((stage, seconds))
+
+
+def begin_request():
+    """Start collecting spans for the current request; returns a token for end_request."""
+    return _request_timings.set([])
+
+
+def end_request(token) -> list:
+    """Stop collecting spans and return [(stage, seconds)] for the request."""
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def wrap(fn):
+    """Bind fn to the caller's context so spans recorded on a pool thread reach its request."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def server_timing(timings) -> str:
+    """Format spans as a Server-Timing header value; repeated stages are summed."""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{re.sub(r'[^A-Za-z0-9_.-]', '_', stage)};dur={seconds * 1000:.1f}"
+                     for stage, seconds in totals.items())
+
+
+def _fmt_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _flatten(prefix: str, value, out: list):
+    if isinstance(value, (bool, int, float)):
+        out.append((prefix, float(value)))
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else str(k), v, out)
+
+
+def render(gauges: dict = None) -> str:
+    """
+    Prometheus text exposition of all histograms and counters. `gauges` is a nested
+    dict of component stats (as served by /health); numeric leaves are exported as
+    <prefix>_component{component="...",stat="..."}.
+    """
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    for name in sorted({n for n, _ in histograms}):
+        metric = f"{PREFIX}_{name}"
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_fmt_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += h[len(BUCKETS)]
+            lines.append(f"{metric}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{metric}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+            lines.append(f"{metric}_count{_fmt_labels(labels)} {cumulative}")
+    for name in sorted({n for n, _ in counters}):
+        metric = f"{PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_fmt_labels(labels)} {value:g}")
+    if gauges:
+        metric = f"{PREFIX}_component"
+        lines.append(f"# TYPE {metric} gauge")
+        for component, stats in gauges.items():
+            flat = []
+            _flatten("", stats, flat)
+            for stat, value in flat:
+                lines.append(f"{metric}{_fmt_labels([('component', component), ('stat', stat)])} {value:g}")
+    return "\n".join(lines) + "\n"
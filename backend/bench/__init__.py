@@ -0,0 +1,9 @@
+# Offline benchmarks for the backend.
+# Remote services (Gemini, the embedding API, Ollama) are replaced by local
+# stand-ins with configurable latency and error rates, and Mongo can be replaced
+# by mongomock, so results depend only on the code under test and are comparable
+# across commits:
+#
+#   python -m bench.micro  [--out results.json] [--compare baseline.json]
+#   python -m bench.load   [--users 50] [--duration 60] [--out load.json]
+#   python -m bench.moderation [--terms 5000] [--lexicon FILE] [--out mod.json]
@@ -0,0 +1,74 @@
+# Benchmark inputs: interview questions with learner answers, and audio clips.
+# Clips are synthesized deterministically (voiced harmonics with syllable-rate
+# amplitude modulation and noise) so runs are reproducible without binary files;
+# set BENCH_AUDIO_DIR to a folder of real .wav/.webm/.ogg recordings to use those.
+
+import io
+import os
+import glob
+
+import numpy as np
+import soundfile as sf
+
+QUESTIONS = [
+    "Tell me about yourself.",
+    "Why do you want to work at our company?",
+    "Describe a challenge you faced at work and how you handled it.",
+    "What are your greatest strengths?",
+    "Where do you see yourself in five years?",
+    "Tell me about a time you worked in a team.",
+]
+
+ANSWERS = [
+    "I am student and like to learn new things every day",
+    "My name is Priya and I am working as software engineer since three years",
+    "I want to join your company because it have good culture and many opportunity",
+    "Last year our project was late so I talk with the team and we make new plan",
+    "My strength is I am very hard working and I never give up when problem come",
+    "In five years I see myself leading a small team and helping others grow",
+    "We was working on a mobile app and I was responsible for testing the features",
+    "I think communication is important, so I always explain my ideas clearly to everyone",
+    "Honestly I am not sure, maybe I will do masters or start my own business",
+    "When I was in college I organized a coding event with more than two hundred students",
+]
+
+# Long transcripts for scan-heavy stages (moderation, pronunciation)
+LONG_ANSWER = " ".join(ANSWERS * 20)
+
+
+def transcript_pairs(n: int):
+    """n deterministic (question, answer) pairs cycling through the fixture set."""
+    return [(QUESTIONS[i % len(QUESTIONS)], ANSWERS[i % len(ANSWERS)]) for i in range(n)]
+
+
+def synth_clip(seconds: float, seed: int = 0, sr: int = 16000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 110 + 40 * rng.random()
+    voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+    # ~4 syllables per second with short pauses between words
+    envelope = np.clip(np.sin(2 * np.pi * (3.5 + rng.random()) * t), 0, None) ** 2
+    audio = 0.2 * voiced * envelope + 0.005 * rng.standard_normal(t.size)
+    return audio.astype(np.float32)
+
+
+def wav_bytes(samples: np.ndarray, sr: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, samples, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def audio_clips(count: int = 4, seconds=(3.0, 6.0, 10.0)):
+    """[(name, bytes)] of recordings from BENCH_AUDIO_DIR, or synthesized WAV clips."""
+    folder = os.getenv("BENCH_AUDIO_DIR")
+    if folder:
+        paths = sorted(p for ext in ("wav", "webm", "ogg", "mp3", "flac")
+                       for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+        clips = []
+        for path in paths[:count]:
+            with open(path, "rb") as f:
+                clips.append((os.path.basename(path), f.read()))
+        if clips:
+            return clips
+    return [(f"synth_{seconds[i % len(seconds)]:.0f}s_{i}.wav", wav_bytes(synth_clip(seconds[i % len(seconds)], seed=i)))
+            for i in range(count)]
@@ -0,0 +1,144 @@
+# Load generator for /api/check, /api/tts and /api/session/end.
+# By default the app is served in-process (werkzeug, threaded) against the
+# stand-ins from bench.stubs; --url drives an already running server instead.
+# Each virtual user signs up, then loops: start a session, answer
+# --answers questions through /api/check (every --tts-every answer also fetches
+# /api/tts), and end the session.
+#
+#   python -m bench.load --users 50 --duration 60 --out load.json
+#   python -m bench.load --provider llama --ollama 1500:6000:0.05 --audio
+
+import sys
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import stubs, stats, fixtures
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def call(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            resp = fn()
+        except requests.RequestException:
+            with self._lock:
+                self.errors[name] += 1
+                self.statuses[name]["exception"] += 1
+            return None
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.statuses[name][str(resp.status_code)] += 1
+            if resp.status_code < 400:
+                self.latencies[name].append(elapsed)
+            else:
+                self.errors[name] += 1
+        return resp
+
+
+def _serve_in_process(host="127.0.0.1"):
+    from werkzeug.serving import make_server
+    from app.main import app
+    server = make_server(host, 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def _virtual_user(base, rec: Recorder, stop_at: float, args, seed: int):
+    rng = random.Random(seed)
+    http = requests.Session()
+    email = f"bench-{uuid.uuid4().hex[:10]}@example.com"
+    resp = rec.call("auth/signup", lambda: http.post(f"{base}/api/auth/signup",
+                                                     json={"email": email, "password": "bench-pass"}, timeout=30))
+    if resp is None or resp.status_code != 200:
+        return
+    http.headers["Authorization"] = f"Bearer {resp.json()['token']}"
+    clips = fixtures.audio_clips(3) if args.audio else None
+
+    while time.monotonic() < stop_at:
+        resp = rec.call("session/start", lambda: http.post(f"{base}/api/session/start", json={}, timeout=30))
+        if resp is None or resp.status_code != 200:
+            time.sleep(0.5)
+            continue
+        session_id = resp.json()["session_id"]
+        for i in range(args.answers):
+            if time.monotonic() >= stop_at:
+                break
+            question, answer = rng.choice(fixtures.QUESTIONS), rng.choice(fixtures.ANSWERS)
+            form = {"session_id": session_id, "question": question}
+            files = None
+            if clips:
+                name, data = clips[rng.randrange(len(clips))]
+                files = {"audio": (name, data, "audio/wav")}
+            else:
+                form["transcript"] = answer
+            rec.call("check", lambda: http.post(f"{base}/api/check", data=form, files=files, timeout=120))
+            if args.tts_every and (i + 1) % args.tts_every == 0:
+                rec.call("tts", lambda: http.post(f"{base}/api/tts", json={"text": answer}, timeout=120))
+            if args.think_ms:
+                time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000.0)
+        rec.call("session/end", lambda: http.post(f"{base}/api/session/end",
+                                                  json={"session_id": session_id}, timeout=60))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description="Concurrent API load generator.")
+    stubs.add_arguments(parser)
+    parser.add_argument("--url", help="target a running server instead of serving the app in-process")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which users are started")
+    parser.add_argument("--answers", type=int, default=5, help="/check calls per session")
+    parser.add_argument("--tts-every", type=int, default=2, help="call /tts after every Nth answer (0 = never)")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between answers")
+    parser.add_argument("--audio", action="store_true", help="send audio clips instead of transcripts")
+    parser.add_argument("--out", help="write a JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        stubs.install_from_args(args)
+        server, base = _serve_in_process()
+    print(f"[BENCH] {args.users} users for {args.duration:.0f}s against {base}")
+
+    rec = Recorder()
+    start = time.monotonic()
+    stop_at = start + args.ramp + args.duration
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="vuser") as pool:
+        for n in range(args.users):
+            pool.submit(_virtual_user, base, rec, stop_at, args, args.seed + n)
+            time.sleep(args.ramp / max(1, args.users))
+    elapsed = time.monotonic() - start
+    if server is not None:
+        server.shutdown()
+
+    results = {}
+    for name in sorted(set(rec.latencies) | set(rec.errors)):
+        results[name] = stats.summarize(rec.latencies[name], elapsed, rec.errors[name])
+        results[name]["statuses"] = dict(rec.statuses[name])
+    stats.print_table(results)
+    report = stats.make_report("load", results, vars(args))
+    if args.out:
+        stats.save(args.out, report)
+    if args.compare:
+        stats.compare(args.compare, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
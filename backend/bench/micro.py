@@ -0,0 +1,132 @@
+# Micro-benchmarks for the individual scoring and media stages.
+#
+#   python -m bench.micro                         # all benchmarks
+#   python -m bench.micro --only semantic_score,is_allowed --iterations 500
+#   python -m bench.micro --out after.json --compare before.json
+
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from . import stubs, stats, fixtures
+from .stubs import fake_analysis
+
+
+def _measure(fn, inputs, iterations: int, warmup: int):
+    """Call fn over inputs (cycled) and return (latencies, errors, elapsed)."""
+    for i in range(warmup):
+        try:
+            fn(inputs[i % len(inputs)])
+        except Exception:
+            pass
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            fn(inputs[i % len(inputs)])
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    return latencies, errors, time.perf_counter() - start
+
+
+def _bench_is_allowed():
+    from app.services.moderation import is_allowed
+    inputs = [a for _, a in fixtures.transcript_pairs(10)] + [fixtures.LONG_ANSWER]
+    return is_allowed, inputs
+
+
+def _bench_pronunciation():
+    from app.services.aligner import pronunciation_score
+    inputs = [(a, fake_analysis(a)["correction"]) for _, a in fixtures.transcript_pairs(10)]
+    return (lambda pair: pronunciation_score(*pair)), inputs
+
+
+def _bench_semantic():
+    from app.services.semantic import semantic_score
+    return (lambda pair: semantic_score(*pair)), fixtures.transcript_pairs(30)
+
+
+def _bench_transcribe():
+    from app.services.stt import transcribe_audio, warm_up
+    warm_up()
+    clips = fixtures.audio_clips(3)
+    return (lambda clip: transcribe_audio(io.BytesIO(clip[1]))), clips
+
+
+def _bench_synthesize():
+    from app.services.tts import synthesize_tts, warm_up
+    warm_up()
+    # Distinct text per call so the TTS cache does not serve every iteration
+    counter = iter(range(10 ** 9))
+    texts = [a for _, a in fixtures.transcript_pairs(10)]
+    return (lambda text: synthesize_tts(f"{text} ({next(counter)})")), texts
+
+
+def _bench_rhubarb():
+    from app.services.lipsync import run_rhubarb, _resolve_rhubarb
+    path = _resolve_rhubarb()
+    if not (os.path.isfile(path) or shutil.which(path)):
+        raise RuntimeError("Rhubarb executable not found (set RHUBARB_PATH)")
+    folder = tempfile.mkdtemp(prefix="bench-rhubarb-")
+    paths = []
+    for i, seconds in enumerate((2.0, 4.0)):
+        path = os.path.join(folder, f"clip{i}.wav")
+        with open(path, "wb") as f:
+            f.write(fixtures.wav_bytes(fixtures.synth_clip(seconds, seed=i)))
+        paths.append(path)
+    return run_rhubarb, paths
+
+
+BENCHMARKS = {
+    "is_allowed": (_bench_is_allowed, 2000),
+    "pronunciation_score": (_bench_pronunciation, 2000),
+    "semantic_score": (_bench_semantic, 100),
+    "transcribe_audio": (_bench_transcribe, 10),
+    "synthesize_tts": (_bench_synthesize, 10),
+    "run_rhubarb": (_bench_rhubarb, 10),
+}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench.micro", description="Per-stage micro-benchmarks.")
+    stubs.add_arguments(parser)
+    parser.add_argument("--only", help="comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--iterations", type=int, help="override the per-benchmark iteration count")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--out", help="write a JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args(argv)
+    stubs.install_from_args(args)
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+        setup, default_iterations = BENCHMARKS[name]
+        try:
+            fn, inputs = setup()
+        except Exception as e:
+            print(f"[BENCH] Skipping {name}: {e}")
+            continue
+        latencies, errors, elapsed = _measure(fn, inputs, args.iterations or default_iterations, args.warmup)
+        results[name] = stats.summarize(latencies, elapsed, errors)
+
+    stats.print_table(results)
+    report = stats.make_report("micro", results, vars(args))
+    if args.out:
+        stats.save(args.out, report)
+    if args.compare:
+        stats.compare(args.compare, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,93 @@
+# Moderation throughput on short answers and long transcripts, with the built-in
+# word list and with a large lexicon (synthetic by default, or --lexicon FILE).
+# `token_set` is the previous split-and-intersect filter, kept as a reference.
+#
+#   python -m bench.moderation
+#   python -m bench.moderation --terms 20000 --iterations 500 --out mod.json
+
+import sys
+import time
+import random
+import argparse
+
+from . import stats, fixtures
+from app.services.moderation import Moderator, BANNED, load_lexicon
+
+
+def _token_set(text: str) -> bool:
+    tokens = {t.strip('.,!?').lower() for t in text.split()}
+    return not (tokens & BANNED)
+
+
+def synthetic_lexicon(count: int, seed: int = 0):
+    """count pseudo-words (4-9 letters), a tenth of them also as two-word phrases and stems."""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(count)]
+    tenth = words[:max(1, count // 10)]
+    return sorted(BANNED) + words + [f"{a} {b}" for a, b in zip(tenth, reversed(tenth))] + [w + "*" for w in tenth]
+
+
+def _measure(fn, inputs, iterations: int):
+    latencies, chars = [], 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+        chars += sum(map(len, item)) if isinstance(item, list) else len(item)
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed, chars
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench.moderation", description="Moderation throughput.")
+    parser.add_argument("--terms", type=int, default=5000, help="size of the synthetic lexicon")
+    parser.add_argument("--lexicon", help="lexicon file to use instead of the synthetic one")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=100, help="answers per is_allowed_many call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write a JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    builtin = Moderator(sorted(BANNED))
+    large = Moderator(load_lexicon(args.lexicon) if args.lexicon else synthetic_lexicon(args.terms, args.seed))
+    print(f"[BENCH] Compiled {len(large)} terms in {time.perf_counter() - t0:.2f}s")
+
+    short = [a for _, a in fixtures.transcript_pairs(len(fixtures.ANSWERS))]
+    long = [fixtures.LONG_ANSWER]
+    batches = [[short[(i + j) % len(short)] for j in range(args.batch)] for i in range(len(short))]
+    cases = {
+        "token_set[short]": (_token_set, short, args.iterations),
+        "token_set[long]": (_token_set, long, max(1, args.iterations // 20)),
+        "is_allowed[builtin,short]": (builtin.is_allowed, short, args.iterations),
+        "is_allowed[builtin,long]": (builtin.is_allowed, long, max(1, args.iterations // 20)),
+        "is_allowed[large,short]": (large.is_allowed, short, args.iterations),
+        "is_allowed[large,long]": (large.is_allowed, long, max(1, args.iterations // 20)),
+        "scan[large,long]": (large.scan, long, max(1, args.iterations // 20)),
+        "is_allowed_many[large]": (lambda texts: [large.is_allowed(t) for t in texts], batches,
+                                   max(1, args.iterations // args.batch)),
+    }
+
+    results = {}
+    for name, (fn, inputs, iterations) in cases.items():
+        latencies, elapsed, chars = _measure(fn, inputs, iterations)
+        results[name] = stats.summarize(latencies, elapsed)
+        results[name]["chars_per_s"] = round(chars / elapsed) if elapsed else 0
+
+    stats.print_table(results)
+    for name, r in results.items():
+        print(f"{name:<32} {r['chars_per_s'] / 1e6:>8.2f} M chars/s")
+    report = stats.make_report("moderation", results, vars(args))
+    if args.out:
+        stats.save(args.out, report)
+    if args.compare:
+        stats.compare(args.compare, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
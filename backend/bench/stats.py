@@ -0,0 +1,74 @@
+# Latency summaries and JSON reports that can be diffed between commits.
+
+import os
+import sys
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+
+def summarize(latencies, elapsed: float = None, errors: int = 0) -> dict:
+    """Summarize per-call latencies (seconds) as milliseconds percentiles plus throughput."""
+    arr = np.asarray(latencies, dtype=np.float64) * 1000.0
+    out = {"count": int(arr.size), "errors": int(errors)}
+    if arr.size:
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        out.update(p50_ms=round(float(p50), 3), p95_ms=round(float(p95), 3), p99_ms=round(float(p99), 3),
+                   mean_ms=round(float(arr.mean()), 3), max_ms=round(float(arr.max()), 3))
+    if elapsed:
+        out["throughput_per_s"] = round(arr.size / elapsed, 2)
+    return out
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def make_report(kind: str, results: dict, config: dict) -> dict:
+    return {
+        "kind": kind,
+        "commit": _git_rev(),
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+
+
+def print_table(results: dict):
+    print(f"{'benchmark':<32} {'n':>7} {'err':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<32} {r.get('count', 0):>7} {r.get('errors', 0):>5} {r.get('p50_ms', 0):>10.3f} "
+              f"{r.get('p95_ms', 0):>10.3f} {r.get('p99_ms', 0):>10.3f} {r.get('throughput_per_s', 0):>10.1f}")
+
+
+def save(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {path}")
+
+
+def compare(baseline_path: str, report: dict):
+    """Print p50/p95/p99 changes against a previously saved report."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit') or '?'}):")
+    for name, r in report["results"].items():
+        b = baseline.get("results", {}).get(name)
+        if not b:
+            print(f"{name:<32} (new)")
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if b.get(key) and r.get(key) is not None:
+                parts.append(f"{key[:3]} {100.0 * (r[key] - b[key]) / b[key]:+.1f}%")
+        print(f"{name:<32} {'  '.join(parts)}")
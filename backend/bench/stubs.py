@@ -0,0 +1,213 @@
+# Local stand-ins for the remote services the backend calls.
+# Each stand-in draws its latency from a log-normal distribution fitted to a
+# median and p99, and fails with a configurable probability. Specs are written
+# "median_ms:p99_ms:error_rate", e.g. "800:3000:0.02".
+
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+try:
+    import mongomock  # type: ignore
+    _HAS_MONGOMOCK = True
+except Exception:
+    _HAS_MONGOMOCK = False
+
+
+class LatencyModel:
+    def __init__(self, median_ms: float, p99_ms: float = None, error_rate: float = 0.0, seed: int = 0):
+        self.median = max(0.0, median_ms) / 1000.0
+        p99 = (p99_ms if p99_ms is not None else median_ms) / 1000.0
+        # z(0.99) = 2.326; sigma = 0 gives a constant latency
+        self.sigma = math.log(p99 / self.median) / 2.326 if self.median > 0 and p99 > self.median else 0.0
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        parts = [float(p) for p in (spec or "0").split(":")]
+        median = parts[0]
+        p99 = parts[1] if len(parts) > 1 else median
+        errors = parts[2] if len(parts) > 2 else 0.0
+        return cls(median, p99, errors, seed)
+
+    def sample(self):
+        """Return (delay_seconds, should_fail)."""
+        with self._lock:
+            delay = self.median * math.exp(self.sigma * self._rng.gauss(0, 1)) if self.median else 0.0
+            fail = self._rng.random() < self.error_rate
+        return delay, fail
+
+    def wait(self) -> bool:
+        """Sleep for one sampled latency; True when the call should fail."""
+        delay, fail = self.sample()
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+def fake_analysis(text: str) -> dict:
+    """Deterministic grammar analysis shaped like a model response."""
+    correction = (text or "").replace("I am student", "I am a student").replace("and like", "and I like").strip()
+    if correction and not correction.endswith((".", "!", "?")):
+        correction += "."
+    correction = correction[:1].upper() + correction[1:]
+    digest = int(hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:6], 16)
+    mistakes = [] if correction == text else ["punctuation"]
+    return {"correction": correction, "score": 60 + digest % 40, "fluency": 55 + digest % 45, "mistakes": mistakes}
+
+
+def _prompt_text(prompt: str, marker: str) -> str:
+    start = prompt.rfind(marker)
+    text = prompt[start + len(marker):] if start >= 0 else prompt
+    return text.split("\nOutput:")[0].strip()
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Stands in for google.generativeai.GenerativeModel in app.services.grammar."""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    def generate_content(self, prompt, request_options=None):
+        if self.latency.wait():
+            raise RuntimeError("stub gemini: injected failure")
+        return _Response(json.dumps(fake_analysis(_prompt_text(prompt, "Original: "))))
+
+
+class FakeGenai:
+    """Stands in for the google.generativeai module used by app.services.embeddings."""
+
+    def __init__(self, latency: LatencyModel, dim: int = 768):
+        self.latency = latency
+        self.dim = dim
+
+    def configure(self, **kwargs):
+        pass
+
+    def _vector(self, text: str):
+        # Bag of hashed words, so related texts get similar vectors
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in (text or "").lower().split():
+            h = int(hashlib.md5(word.strip(".,!?").encode("utf-8")).hexdigest()[:8], 16)
+            vec[h % self.dim] += 1.0
+        return vec.tolist()
+
+    def embed_content(self, model=None, content=None, **kwargs):
+        if self.latency.wait():
+            raise RuntimeError("stub embeddings: injected failure")
+        if isinstance(content, str):
+            return {"embedding": self._vector(content)}
+        return {"embedding": [self._vector(t) for t in content]}
+
+
+def start_ollama(latency: LatencyModel, host: str = "127.0.0.1", port: int = 0):
+    """
+    Serve a minimal Ollama /api/generate (streaming NDJSON or single JSON) on a
+    background thread. Returns (server, url); call server.shutdown() to stop.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if latency.wait():
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            answer = json.dumps(fake_analysis(_prompt_text(body.get("prompt", ""), "Answer: ")))
+            if body.get("stream", True):
+                chunks = [answer[i:i + 8] for i in range(0, len(answer), 8)]
+                lines = [json.dumps({"response": c, "done": False}) for c in chunks]
+                lines.append(json.dumps({"response": "", "done": True}))
+                payload = ("\n".join(lines) + "\n").encode("utf-8")
+                content_type = "application/x-ndjson"
+            else:
+                payload = json.dumps({"response": answer, "done": True}).encode("utf-8")
+                content_type = "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/generate"
+
+
+def install(provider: str = "gemini", gemini: str = "800:3000:0", embed: str = "120:400:0",
+            ollama: str = "1500:5000:0", mongo: str = "mock", seed: int = 0) -> dict:
+    """
+    Point the app at the stand-ins. Must run before the app is created.
+    provider: "gemini", "llama" or "none" (heuristics only).
+    mongo: "mock" uses mongomock when installed; anything else keeps MONGODB_URI.
+    Returns handles to the started stand-ins.
+    """
+    handles = {}
+    os.environ["MONGO_ENSURE_INDEXES"] = "0"
+    # Empty rather than unset so load_dotenv() cannot bring values back from .env
+    os.environ["REDIS_URL"] = ""
+
+    if provider == "gemini":
+        os.environ["GOOGLE_API_KEY"] = "bench-stub"
+        os.environ["GRAMMAR_PROVIDERS"] = "gemini"
+    elif provider == "llama":
+        os.environ["GOOGLE_API_KEY"] = ""
+        os.environ["FORCE_GEMINI"] = "0"
+        os.environ["LLAMA_MODE"] = "1"
+        os.environ["GRAMMAR_PROVIDERS"] = "llama"
+        server, url = start_ollama(LatencyModel.parse(ollama, seed + 1))
+        os.environ["LLAMA_URL"] = url
+        handles["ollama"] = server
+    else:
+        os.environ["GOOGLE_API_KEY"] = ""
+        os.environ["LLAMA_MODE"] = "0"
+        os.environ["GRAMMAR_PROVIDERS"] = ""
+
+    if mongo == "mock":
+        if not _HAS_MONGOMOCK:
+            raise RuntimeError("mongomock is not installed (pip install -r bench/requirements.txt) "
+                               "or pass --mongo real to use MONGODB_URI")
+        from app.db import mongo as app_mongo
+        app_mongo._client = mongomock.MongoClient()
+
+    from app.services import grammar, embeddings
+    if provider == "gemini":
+        grammar._gen_model = FakeGeminiModel(LatencyModel.parse(gemini, seed + 2))
+    embeddings.genai = FakeGenai(LatencyModel.parse(embed, seed + 3))
+    return handles
+
+
+def add_arguments(parser):
+    """Stand-in options shared by the benchmark CLIs."""
+    parser.add_argument("--provider", choices=("gemini", "llama", "none"), default="gemini")
+    parser.add_argument("--gemini", default="800:3000:0", help="median_ms:p99_ms:error_rate")
+    parser.add_argument("--embed", default="120:400:0", help="median_ms:p99_ms:error_rate")
+    parser.add_argument("--ollama", default="1500:5000:0", help="median_ms:p99_ms:error_rate")
+    parser.add_argument("--mongo", choices=("mock", "real"), default="mock")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def install_from_args(args) -> dict:
+    return install(provider=args.provider, gemini=args.gemini, embed=args.embed, ollama=args.ollama,
+                   mongo=args.mongo, seed=args.seed)